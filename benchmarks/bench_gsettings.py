@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''gsettings_helpers benchmark suite.
+
+Compiles `benchmarks/schemas` into a private directory and runs with `GSETTINGS_BACKEND=memory`,
+so it touches neither the session nor user settings. For every key type and value size it measures:
+  - conversion throughput (`ValueProcessor.process` + `GVariant.build`, values per second)
+  - per-write latency (`GsettingsWrapper.write`) and per-read latency (`GsettingsWrapper.read`)
+  - Python memory peak of the conversion (tracemalloc) and serialized value size
+
+Results are saved as JSON to compare them across commits.
+
+Run from the project root: `python3 benchmarks/bench_gsettings.py [--max-size N] [--output FILE] [--compare OLD_FILE]`
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SCHEMA_ID = 'org.shipilovds.bench'
+SIZES = (1, 10, 100, 1000, 10000, 100000)
+MIN_DURATION = 0.2  # seconds to repeat every measurement for
+MIN_REPEATS = 3
+
+
+def scalar(value):
+    '''Value generator for scalar keys (size is ignored).'''
+    return lambda size, variant: value if variant == 0 else type(value)(value * 2 if not isinstance(value, bool) else not value)
+
+
+# key name: (type string, value generator, is sized)
+KEYS = {
+    'scalar-bool': ('b', scalar(True), False),
+    'scalar-int': ('i', scalar(42), False),
+    'scalar-double': ('d', scalar(0.5), False),
+    'scalar-string': ('s', scalar('value'), False),
+    'tuple': ('(ss)', lambda size, variant: f'(xkb, us{variant})', False),
+    'array-int': ('ai', lambda size, variant: list(range(variant, size + variant)), True),
+    'array-string': ('as', lambda size, variant: [f'item{index + variant}' for index in range(size)], True),
+    'array-tuple': ('a(ss)', lambda size, variant: [f'(xkb, us{index + variant})' for index in range(size)], True),
+    'dict': ('a{ss}', lambda size, variant: {f'key{index}': f'value{index + variant}' for index in range(size)}, True),
+    'dict-variant': ('a{sv}', lambda size, variant: {f'key{index}': index + variant for index in range(size)}, True),
+}
+
+
+def prepare_environment():
+    '''Compiles test schemas into a private directory and isolates GSettings (must be done before GIO import).
+
+    Returns:
+        str: Private schema directory (remove it when done)
+    '''
+    schema_dir = tempfile.mkdtemp(prefix='gsettings-bench-')
+    for file_name in os.listdir(os.path.join(BENCH_DIR, 'schemas')):
+        shutil.copy(os.path.join(BENCH_DIR, 'schemas', file_name), schema_dir)
+    subprocess.run(['glib-compile-schemas', schema_dir], check=True)
+    os.environ['GSETTINGS_SCHEMA_DIR'] = schema_dir
+    os.environ['GSETTINGS_BACKEND'] = 'memory'
+
+    return schema_dir
+
+
+def measure(func):
+    '''Runs function repeatedly (at least `MIN_REPEATS` times and `MIN_DURATION` seconds).
+
+    Returns:
+        dict: Median and min wall time (seconds) and number of runs
+    '''
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < MIN_REPEATS or time.perf_counter() - started < MIN_DURATION:
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return {'median': statistics.median(timings), 'min': min(timings), 'runs': len(timings)}
+
+
+def bench_key(helpers, key, type_string, generator, size):
+    '''Measures one key with one value size.'''
+    values = [generator(size, 0), generator(size, 1)]
+    convert = lambda: helpers.GVariant.build(helpers.ValueProcessor.process(values[0], type_string), type_string)  # noqa: E731
+    conversion = measure(convert)
+
+    tracemalloc.start()
+    variant = convert()
+    memory_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    gsettings = helpers.GsettingsWrapper(SCHEMA_ID, None, key)
+    state = {'write': 0}
+
+    def write():
+        state['write'] += 1
+        gsettings.write(values[state['write'] % 2])
+
+    write_latency = measure(write)
+    read_latency = measure(gsettings.read)
+
+    return {
+        'key': key,
+        'type': type_string,
+        'size': size,
+        'conversion': dict(conversion, values_per_second=size / conversion['median']),
+        'write': write_latency,
+        'read': read_latency,
+        'memory': {'python_peak_bytes': memory_peak, 'serialized_bytes': variant.get_size()},
+    }
+
+
+def git_revision():
+    '''Returns current commit of the project (or `None`).'''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, old_results):
+    '''Prints median ratios (old / new, >1 means faster now) against older results.'''
+    old = {(item['key'], item['size']): item for item in old_results['results']}
+    print(f'\nCompared with {old_results.get("revision") or "previous run"} (old/new, >1 is faster now):')
+    for item in results['results']:
+        previous = old.get((item['key'], item['size']))
+        if previous is None:
+            continue
+        ratios = '  '.join(f'{phase} x{previous[phase]["median"] / item[phase]["median"]:.2f}' for phase in ('conversion', 'write', 'read'))
+        print(f'  {item["key"]:<14} {item["size"]:>7}  {ratios}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gsettings_helpers benchmark suite')
+    parser.add_argument('--max-size', type=int, default=SIZES[-1], help='biggest value size (elements)')
+    parser.add_argument('--output', default='bench-gsettings.json', help='JSON file to save the results to')
+    parser.add_argument('--compare', help='JSON file with older results to compare with')
+    args = parser.parse_args()
+
+    schema_dir = prepare_environment()
+    try:
+        sys.path.insert(0, ROOT_DIR)
+        from ansible_collections.shipilovds.workstation.plugins.module_utils import gsettings_helpers as helpers
+        from gi.repository import GLib
+
+        results = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'glib': '.'.join(str(part) for part in (GLib.MAJOR_VERSION, GLib.MINOR_VERSION, GLib.MICRO_VERSION)),
+            'results': [],
+        }
+        print(f'{"key":<14} {"size":>7} {"values/s":>12} {"write ms":>10} {"read ms":>10} {"py peak KiB":>12}')
+        for key, (type_string, generator, sized) in KEYS.items():
+            for size in (SIZES if sized else SIZES[:1]):
+                if size > args.max_size:
+                    break
+                item = bench_key(helpers, key, type_string, generator, size)
+                results['results'].append(item)
+                print(f'{key:<14} {size:>7} {item["conversion"]["values_per_second"]:>12.0f} '
+                      f'{item["write"]["median"] * 1000:>10.3f} {item["read"]["median"] * 1000:>10.3f} '
+                      f'{item["memory"]["python_peak_bytes"] / 1024:>12.1f}')
+    finally:
+        shutil.rmtree(schema_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'\nResults are saved to {args.output}')
+    if args.compare:
+        with open(args.compare, 'r') as old_file:
+            compare(results, json.load(old_file))
+
+
+if __name__ == '__main__':
+    main()
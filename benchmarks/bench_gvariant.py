@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''GLib.Variant construction benchmark.
+
+Compares `GVariant.build` (compiled serializer) with per-item Variant construction
+(the way `GVariant.get_variant` used to work) on a big `a(ss)` value.
+
+Run from the project root: `python3 benchmarks/bench_gvariant.py [items]`
+'''
+
+from gi.repository import GLib
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GVariant
+
+
+def build_per_item(value):
+    '''Builds `a(ss)` value item by item: one Variant per string, per tuple and for the array.'''
+    item_type = GLib.VariantType.new('(ss)')
+    items = [GLib.Variant.new_tuple(GLib.Variant.new_string(first), GLib.Variant.new_string(second)) for first, second in value]
+    return GLib.Variant.new_array(item_type, items)
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    value = [(f'xkb{index}', f'us{index}') for index in range(items)]
+    assert GVariant.build(value, 'a(ss)').equal(build_per_item(value))
+
+    candidates = {
+        'per-item Variant objects': lambda: build_per_item(value),
+        'PyGObject GLib.Variant()': lambda: GLib.Variant('a(ss)', value),
+        'GVariant.build': lambda: GVariant.build(value, 'a(ss)'),
+    }
+    results = {}
+    for name, func in candidates.items():
+        results[name] = min(timeit.repeat(func, number=5, repeat=5)) / 5
+
+    baseline = results['per-item Variant objects']
+    print(f'a(ss) with {items} items:')
+    for name, seconds in results.items():
+        print(f'  {name:<28} {seconds * 1000:9.2f} ms  x{baseline / seconds:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''Modules import-time benchmark.
+
+Every task execution starts a fresh interpreter and imports the module, so import cost is paid
+on every task of every host. Each module is imported in a new process (`--runs` times) and for every one it reports:
+  - import wall time (median and min), with `ansible.module_utils.basic` (shared by all modules) as a baseline
+  - whether GI and PyYAML have been loaded by the import (both should be loaded lazily, if at all)
+
+Results are saved as JSON to compare them across commits.
+
+Run from the project root: `python3 benchmarks/bench_import.py [--runs N] [--output FILE] [--compare OLD_FILE]`
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+PACKAGE = 'ansible_collections.shipilovds.workstation.plugins'
+TARGETS = (
+    'ansible.module_utils.basic',
+    f'{PACKAGE}.modules.gnome_extension',
+    f'{PACKAGE}.modules.gsettings',
+    f'{PACKAGE}.modules.gsettings_facts',
+    f'{PACKAGE}.modules.gsettings_schemas',
+)
+WATCHED_MODULES = ('gi', 'yaml')
+PROBE = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+
+def probe(target):
+    '''Imports the target in a new interpreter.
+
+    Returns:
+        dict: Import wall time (`seconds`) and watched modules that have been `loaded`
+    '''
+    process = subprocess.run(
+        [sys.executable, '-c', PROBE, target] + list(WATCHED_MODULES),
+        cwd=ROOT_DIR, env=dict(os.environ, PYTHONPATH=ROOT_DIR),
+        capture_output=True, text=True, check=True,
+    )
+
+    return json.loads(process.stdout)
+
+
+def bench_target(target, runs):
+    '''Measures one target (the first, bytecode-compiling, run is not accounted).'''
+    probe(target)
+    samples = [probe(target) for _ in range(runs)]
+    timings = [sample['seconds'] for sample in samples]
+
+    return {
+        'target': target,
+        'import': {'median': statistics.median(timings), 'min': min(timings), 'runs': runs},
+        'loaded': samples[-1]['loaded'],
+    }
+
+
+def git_revision():
+    '''Returns current commit of the project (or `None`).'''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, old_results):
+    '''Prints median ratios (old / new, >1 means faster now) against older results.'''
+    old = {item['target']: item for item in old_results['results']}
+    print(f'\nCompared with {old_results.get("revision") or "previous run"} (old/new, >1 is faster now):')
+    for item in results['results']:
+        previous = old.get(item['target'])
+        if previous is None:
+            continue
+        print(f'  {item["target"].rsplit(".", 1)[-1]:<20} x{previous["import"]["median"] / item["import"]["median"]:.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Modules import-time benchmark')
+    parser.add_argument('--runs', type=int, default=20, help='imports of every module')
+    parser.add_argument('--output', default='bench-import.json', help='JSON file to save the results to')
+    parser.add_argument('--compare', help='JSON file with older results to compare with')
+    args = parser.parse_args()
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'results': [],
+    }
+    print(f'{"module":<20} {"median ms":>10} {"min ms":>10} {"over basic ms":>14}  loaded')
+    baseline = None
+    for target in TARGETS:
+        item = bench_target(target, args.runs)
+        results['results'].append(item)
+        if baseline is None:
+            baseline = item['import']['median']
+        print(f'{target.rsplit(".", 1)[-1]:<20} {item["import"]["median"] * 1000:>10.2f} {item["import"]["min"] * 1000:>10.2f} '
+              f'{(item["import"]["median"] - baseline) * 1000:>14.2f}  {", ".join(item["loaded"]) or "-"}')
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'\nResults are saved to {args.output}')
+    if args.compare:
+        with open(args.compare, 'r') as old_file:
+            compare(results, json.load(old_file))
+
+
+if __name__ == '__main__':
+    main()
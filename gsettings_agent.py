@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''Gsettings drift-enforcement agent.
+
+Long-running process which keeps managed keys at their desired values.
+It subscribes to `changed` signals of the managed schemas and re-asserts drifted keys
+with debounced, batched writes (one `GsettingsTransaction` per burst of changes). There is no polling:
+the desired-state file is watched with Gio.FileMonitor and reloaded when Ansible deploys a new one.
+
+Desired-state file is JSON shaped like `gnome_gsettings` role variable (and `settings` option of gsettings module).
+
+It is not a part of the collection: python package installs it as `gsettings-agent` console script.
+
+Run: `gsettings-agent --state ~/.config/gsettings-agent/desired-state.json`
+'''
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gi_helpers import Gio, GLib
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import extension_schema_dirs
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsCache, GsettingsTransaction, GsettingsWrapper, iterate_settings
+import argparse
+import json
+import logging
+import signal
+
+
+DEBOUNCE_INTERVAL = 500  # ms to wait for more changes before re-asserting
+RELOAD_EVENTS = ('CHANGES_DONE_HINT', 'CREATED', 'MOVED_IN', 'RENAMED')
+
+logger = logging.getLogger('gsettings-agent')
+
+
+class ManagedKey():
+    '''Managed key with its desired value.
+
+    Args:
+        gsettings (GsettingsWrapper): Key
+        desired (GLib.Variant): Desired value
+
+    Attributes:
+        gsettings (GsettingsWrapper): Key
+        desired (GLib.Variant): Desired value
+        drifts (int): Number of detected drifts
+    '''
+    def __init__(self, gsettings, desired):
+        self.gsettings = gsettings
+        self.desired = desired
+        self.drifts = 0
+
+    @property
+    def name(self):
+        '''Human readable key name'''
+        gsettings = self.gsettings
+        return f'{gsettings.schema_id}:{gsettings.schema_path}:{gsettings.schema_key}' if gsettings.schema_path else f'{gsettings.schema_id}:{gsettings.schema_key}'
+
+    def has_drifted(self):
+        '''Reads current value and compares it with the desired one.'''
+        self.gsettings.value = self.gsettings.read()
+        return not self.gsettings.equals(self.desired)
+
+
+class GsettingsAgent():
+    '''Keeps managed keys at their desired values.
+
+    Changes are collected by `changed` signals of Gio.Settings (one handler per schema and path)
+    and re-asserted `debounce` ms after the last one, so a burst of changes costs one write.
+    Own writes emit signals too - they are ignored because the values are already the desired ones.
+
+    Args:
+        debounce (int): Milliseconds to wait for more changes before re-asserting
+
+    Attributes:
+        keys (dict): Managed keys (`ManagedKey`) by (schema ID, schema path, key)
+        pending (set): Keys waiting for re-assertion
+    '''
+    def __init__(self, debounce=DEBOUNCE_INTERVAL):
+        self.debounce = debounce
+        self.keys = {}
+        self.pending = set()
+        self._handlers = []
+        self._flush_source = None
+        self._monitor = None
+        self._reload_source = None
+
+    def load(self, settings):
+        '''Replaces managed keys with keys from `settings` mapping and re-asserts drifted ones immediately.
+
+        Keys which cannot be managed (unknown schema or key, wrong value) are logged and skipped.
+        If `settings` mapping is malformed, current keys are kept (and still enforced).
+
+        Args:
+            settings (dict): Schemas with optional `path` and `keys` (see `iterate_settings`)
+
+        Raises:
+            SchemaException: If settings mapping is malformed.
+        '''
+        # schemas might have changed (e.g. an extension has been updated)
+        GsettingsCache.invalidate()
+        GsettingsCache.schema_dirs = extension_schema_dirs()
+        keys = {}
+        for schema_id, schema_path, schema_key, schema_value in iterate_settings(settings):
+            try:
+                gsettings = GsettingsWrapper(schema_id, schema_path, schema_key)
+                keys[(schema_id, schema_path, schema_key)] = ManagedKey(gsettings, gsettings.get_variant(schema_value))
+            except Exception as ex:
+                logger.error('Key %s.%s is not managed: %s', schema_id, schema_key, ex)
+        self._disconnect()
+        self.keys = keys
+        for schema_id, schema_path in {(schema_id, schema_path) for schema_id, schema_path, _ in self.keys}:
+            settings_obj = GsettingsCache.get_settings(schema_id, schema_path)
+            handler = settings_obj.connect('changed', self._on_changed, schema_id, schema_path)
+            self._handlers.append((settings_obj, handler))
+        logger.info('Managing %d keys', len(self.keys))
+        self.pending = set(self.keys)
+        self.flush()
+
+    def load_file(self, path):
+        '''Loads desired state from JSON file. Keeps current state if the file is broken.
+
+        Returns:
+            bool: `True` if the state has been loaded
+        '''
+        try:
+            with open(path, 'r') as state_file:
+                settings = json.load(state_file)
+            if not isinstance(settings, dict):
+                raise ValueError('desired state must be a mapping of schemas')
+            self.load(settings)
+        except Exception as ex:
+            logger.error('Cannot load desired state from %s: %s', path, ex)
+            return False
+
+        return True
+
+    def watch_file(self, path):
+        '''Reloads desired state whenever the file is changed (or replaced).'''
+        self._monitor = Gio.File.new_for_path(path).monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        events = {getattr(Gio.FileMonitorEvent, event) for event in RELOAD_EVENTS}
+
+        def on_file_changed(monitor, file_obj, other_file, event):
+            if event in events and self._reload_source is None:
+                self._reload_source = GLib.timeout_add(self.debounce, self._reload, path)
+
+        self._monitor.connect('changed', on_file_changed)
+
+    def _reload(self, path):
+        self._reload_source = None
+        logger.info('Desired state file %s has changed', path)
+        self.load_file(path)
+
+        return GLib.SOURCE_REMOVE
+
+    def _disconnect(self):
+        for settings_obj, handler in self._handlers:
+            settings_obj.disconnect(handler)
+        self._handlers = []
+        if self._flush_source is not None:
+            GLib.source_remove(self._flush_source)
+            self._flush_source = None
+
+    def _on_changed(self, settings_obj, schema_key, schema_id, schema_path):
+        managed_key = self.keys.get((schema_id, schema_path, schema_key))
+        if managed_key is None:
+            return
+        self.pending.add((schema_id, schema_path, schema_key))
+        if self._flush_source is not None:
+            GLib.source_remove(self._flush_source)
+        self._flush_source = GLib.timeout_add(self.debounce, self._on_timeout)
+
+    def _on_timeout(self):
+        self._flush_source = None
+        self.flush()
+
+        return GLib.SOURCE_REMOVE
+
+    def flush(self):
+        '''Re-asserts pending keys which have drifted (in one transaction).
+
+        Returns:
+            list: Re-asserted keys (`ManagedKey`)
+        '''
+        pending, self.pending = self.pending, set()
+        drifted = []
+        transaction = GsettingsTransaction()
+        for cache_key in sorted(pending, key=lambda cache_key: (cache_key[0], cache_key[1] or '', cache_key[2])):
+            managed_key = self.keys.get(cache_key)
+            if managed_key is None or not managed_key.has_drifted():
+                continue
+            managed_key.drifts += 1
+            logger.warning('Drift of %s: %s (desired: %s)', managed_key.name, managed_key.gsettings.value.print_(False), managed_key.desired.print_(False))
+            try:
+                transaction.stage(managed_key.gsettings, managed_key.desired)
+                drifted.append(managed_key)
+            except Exception as ex:
+                logger.error('Cannot re-assert %s: %s', managed_key.name, ex)
+        if not drifted:
+            return []
+        try:
+            transaction.commit()
+        except Exception as ex:
+            logger.error('Cannot re-assert %d keys: %s', len(drifted), ex)
+            return []
+        logger.info('Re-asserted %d keys', len(drifted))
+
+        return drifted
+
+    def stop(self):
+        '''Stops watching the keys and the desired-state file.'''
+        self._disconnect()
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        if self._reload_source is not None:
+            GLib.source_remove(self._reload_source)
+            self._reload_source = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Keeps gsettings keys at their desired values')
+    parser.add_argument('--state', required=True, help='desired-state JSON file (shaped like gnome_gsettings role variable)')
+    parser.add_argument('--debounce', type=int, default=DEBOUNCE_INTERVAL, help='milliseconds to wait for more changes before re-asserting')
+    parser.add_argument('--verbose', action='store_true', help='log every re-assertion and reload')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s: %(message)s')
+
+    agent = GsettingsAgent(args.debounce)
+    agent.load_file(args.state)
+    agent.watch_file(args.state)
+    loop = GLib.MainLoop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, loop.quit)
+    loop.run()
+    agent.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 #!/usr/bin/python
 
+import argparse
 import re
 import importlib
 import sys
@@ -13,7 +14,8 @@ from jinja2 import Environment, FileSystemLoader
 MODULES_PATH = 'plugins/modules'
 DOCS_PATH = 'docs'
 TEMPLATE_FILE = 'helpers/docs_template.j2'
-args = []
+ARGS_SPEC_FIELDS = ('type', 'required', 'default', 'choices', 'elements', 'aliases', 'no_log')
+ARGS_SPEC_BLOCK = re.compile(r'^# BEGIN ARGS_SPEC\n.*?^# END ARGS_SPEC\n', re.MULTILINE | re.DOTALL)
 
 
 class MyYAML(YAML):
@@ -54,6 +56,62 @@ def import_var_as_yaml(module, var, yml):
     return yml.load(content)
 
 
+def build_args_spec(options):
+    """
+    Turns 'options' block of DOCUMENTATION into AnsibleModule argument spec
+    (drops description and other doc-only fields, 'suboptions' become 'options')
+    """
+    spec = {}
+    for name, option in options.items():
+        spec[name] = {field: option[field] for field in ARGS_SPEC_FIELDS if field in option}
+        if 'suboptions' in option:
+            spec[name]['options'] = build_args_spec(option['suboptions'])
+    return spec
+
+
+def render_args_spec(spec, indent=4):
+    """
+    Renders argument spec as python code (one option per line)
+    """
+    lines = ['{']
+    for name, option in spec.items():
+        fields = ', '.join(
+            f"{field!r}: {render_args_spec(value, indent + 4) if field == 'options' else repr(value)}"
+            for field, value in option.items()
+        )
+        lines.append(f"{' ' * indent}{name!r}: {{{fields}}},")
+    lines.append(' ' * (indent - 4) + '}')
+    return '\n'.join(lines)
+
+
+def update_args_spec(module, check=False):
+    """
+    Keeps static ARGS_SPEC of the module in sync with its DOCUMENTATION.
+    Modules do not parse yaml at import time, so the spec is generated here
+    (between '# BEGIN ARGS_SPEC' and '# END ARGS_SPEC' lines).
+    Returns True if the spec was (or, in check mode, has to be) updated.
+    """
+    module_file = join(MODULES_PATH, f'{module}.py')
+    with open(module_file, 'r') as source:
+        content = source.read()
+    if ARGS_SPEC_BLOCK.search(content) is None:
+        raise SystemExit(f'{module_file}: ARGS_SPEC block (# BEGIN ARGS_SPEC ... # END ARGS_SPEC) is missing')
+    options = import_var_as_yaml(module, 'DOCUMENTATION', YAML(typ='safe')).get('options') or {}
+    block = (
+        '# BEGIN ARGS_SPEC\n'
+        '# Generated from DOCUMENTATION options by helpers/generate_md_docs.py (make docs). Do not edit by hand.\n'
+        f'ARGS_SPEC = {render_args_spec(build_args_spec(options))}\n'
+        '# END ARGS_SPEC\n'
+    )
+    updated = ARGS_SPEC_BLOCK.sub(lambda match: block, content, count=1)
+    if updated == content:
+        return False
+    if not check:
+        with open(module_file, 'w') as source:
+            source.write(updated)
+    return True
+
+
 def add_empty_line(string):
     """
     To make ansible tasks in 'examples' separated by empty line
@@ -61,10 +119,20 @@ def add_empty_line(string):
     return string.replace('\n- ', '\n\n- ')
 
 
+parser = argparse.ArgumentParser(description='Generate modules documentation and argument specs')
+parser.add_argument('--check', action='store_true', help='only check that ARGS_SPEC of every module is up to date')
+cli_args = parser.parse_args()
+
 templateLoader = FileSystemLoader(searchpath="./")
 templateEnv = Environment(loader=templateLoader)
 template = templateEnv.get_template(TEMPLATE_FILE)
 
+stale = [module for module in get_modules_list() if update_args_spec(module, cli_args.check)]
+if cli_args.check:
+    if stale:
+        sys.exit(f"ARGS_SPEC is out of date in: {', '.join(stale)}. Run 'make docs'.")
+    sys.exit(0)
+
 for module in get_modules_list():
     yml = MyYAML()  # Use round-trip settings. But now we need to pass it everywhere.
     module_documentation = import_var_as_yaml(module, 'DOCUMENTATION', yml)
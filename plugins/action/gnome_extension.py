@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Make coding more python3-ish, this is required for contributions to Ansible
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils.common.text.converters import to_text
+from ansible.module_utils.urls import open_url
+from ansible.plugins.action import ActionBase
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import BUNDLE_CACHE_DIR, HASH_CHUNK_SIZE, BundleCache
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import copy
+import fcntl
+import hashlib
+import os
+import tempfile
+
+BUNDLE_URL_SCHEMES = ('http://', 'https://', 'ftp://')
+CONTROLLER_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'shipilovds.workstation', 'extension-bundles')
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT = 60
+
+
+class BundleFetcher():
+    '''Controller side cache of extension bundles.
+
+    Bundles are downloaded once and stored by their sha256 (see `BundleCache`).
+    URL to sha256 mapping is kept too, so bundles without expected hash are not downloaded again
+    (extensions.gnome.org bundle URLs are versioned, so their content never changes).
+    Ansible runs hosts in separate worker processes - downloads of the same URL are serialized with a file lock.
+
+    Args:
+        path (:obj:`str`, optional): Cache directory (`CONTROLLER_CACHE_DIR` by default)
+
+    Attributes:
+        cache (BundleCache): Bundles storage
+    '''
+    def __init__(self, path=None):
+        self.cache = BundleCache(path or CONTROLLER_CACHE_DIR)
+        self._urls_dir = os.path.join(self.cache.path, 'urls')
+
+    def _download(self, url):
+        '''Downloads the bundle into the cache (hash is calculated while downloading).
+
+        Returns:
+            str: Bundle sha256
+        '''
+        checksum = hashlib.sha256()
+        fd, tmp_file = tempfile.mkstemp(dir=self.cache.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as bundle, closing(open_url(url, timeout=DOWNLOAD_TIMEOUT)) as response:
+                for chunk in iter(lambda: response.read(HASH_CHUNK_SIZE), b''):
+                    checksum.update(chunk)
+                    bundle.write(chunk)
+            os.replace(tmp_file, self.cache.get_path(checksum.hexdigest()))
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+        return checksum.hexdigest()
+
+    def fetch(self, url, sha256=None):
+        '''Returns the bundle from the cache. Downloads it only if the cache lacks it.
+
+        Args:
+            url (str): Bundle URL
+            sha256 (:obj:`str`, optional): Expected bundle hash
+
+        Raises:
+            ValueError: If bundle hash does not match.
+
+        Returns:
+            str: Bundle sha256
+        '''
+        if sha256 and sha256 in self.cache:
+            return sha256.lower()
+        os.makedirs(self._urls_dir, exist_ok=True)
+        url_file = os.path.join(self._urls_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+        with open(f'{url_file}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            known = None
+            if os.path.isfile(url_file):
+                with open(url_file, 'r') as known_file:
+                    known = known_file.read().strip()
+            if known is None or known not in self.cache or (sha256 and known != sha256.lower()):
+                # nothing is known or the bundle has been changed (expected hash is the source of truth)
+                known = self._download(url)
+                with open(url_file, 'w') as known_file:
+                    known_file.write(known)
+        if sha256 and known != sha256.lower():
+            raise ValueError(f'Bundle \'{url}\' sha256 mismatch: expected {sha256}, got {known}')
+
+        return known
+
+    def fetch_all(self, urls):
+        '''Fetches bundles in parallel.
+
+        Args:
+            urls (dict): Expected sha256 (or `None`) by URL
+
+        Returns:
+            tuple: (sha256 by URL, error message by URL)
+        '''
+        fetched, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = {url: executor.submit(self.fetch, url, sha256) for url, sha256 in urls.items()}
+        for url, future in futures.items():
+            try:
+                fetched[url] = future.result()
+            except Exception as ex:
+                errors[url] = to_text(ex)
+
+        return fetched, errors
+
+
+class ActionModule(ActionBase):
+    '''Fetch-once companion of `gnome_extension` module.
+
+    URL bundles are downloaded on the controller (once for all the hosts) and transferred
+    to the host only if its `bundle_cache` lacks them. Module gets the local path and `sha256` then.
+    '''
+    TRANSFERS_FILES = True
+
+    def _remote_bundles(self, bundle_cache, task_vars):
+        '''Returns file names of the bundles which are already in the host cache (in one module run).'''
+        result = self._execute_module(
+            module_name='ansible.legacy.find',
+            module_args={'paths': [bundle_cache], 'patterns': ['*.zip'], 'file_type': 'file'},
+            task_vars=task_vars,
+        )
+
+        return {os.path.basename(found['path']) for found in result.get('files', [])}
+
+    def _fetch_bundles(self, items, module_args, task_vars):
+        '''Replaces bundle URLs of the items with host paths.'''
+        urls = {}
+        for item in items:
+            urls.setdefault(item.get('src') or item.get('url'), item.get('sha256'))
+        fetcher = BundleFetcher()
+        fetched, errors = fetcher.fetch_all(urls)
+        if errors:
+            raise AnsibleActionFail(f'Failed to fetch {len(errors)} of {len(urls)} extension bundles', result={'errors': errors})
+
+        shell = self._connection._shell
+        bundle_cache = self._remote_expand_user(module_args.get('bundle_cache') or BUNDLE_CACHE_DIR)
+        module_args['bundle_cache'] = bundle_cache
+        remote_bundles = self._remote_bundles(bundle_cache, task_vars)
+        transferred = {}
+        for item in items:
+            sha256 = fetched[item.pop('url', None) or item['src']]
+            item['sha256'] = sha256
+            file_name = os.path.basename(fetcher.cache.get_path(sha256))
+            if file_name in remote_bundles:
+                item['src'] = shell.join_path(bundle_cache, file_name)
+            elif self._task.check_mode:
+                # nothing will be installed - no need to transfer anything
+                item['src'] = fetcher.cache.get_path(sha256)
+            else:
+                if sha256 not in transferred:
+                    transferred[sha256] = shell.join_path(shell.tmpdir, file_name)
+                    self._transfer_file(fetcher.cache.get_path(sha256), transferred[sha256])
+                item['src'] = transferred[sha256]
+        if transferred:
+            # fix file permissions when the copy is done as a different user
+            self._fixup_perms2([shell.tmpdir] + list(transferred.values()))
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+
+        super(ActionModule, self).run(tmp, task_vars)
+        del tmp  # tmp no longer has any effect
+
+        module_args = copy.deepcopy(self._task.args)
+        if module_args.get('extensions') is not None:
+            items = [item for item in module_args['extensions'] if isinstance(item, dict)]
+        else:
+            items = [module_args]
+        items = [
+            item for item in items
+            if item.get('state', 'present') == 'present' and str(item.get('src') or item.get('url') or '').startswith(BUNDLE_URL_SCHEMES)
+        ]
+        try:
+            if items:
+                self._fetch_bundles(items, module_args, task_vars)
+
+            return self._execute_module(module_name='shipilovds.workstation.gnome_extension', module_args=module_args, task_vars=task_vars)
+        finally:
+            self._remove_tmp_path(self._connection._shell.tmpdir)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Make coding more python3-ish, this is required for contributions to Ansible
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+from collections.abc import Mapping
+import fnmatch
+
+
+class ActionModule(ActionBase):
+    '''Batching companion of `gsettings` module.
+
+    The whole `settings` structure (like `gnome_gsettings` role variable) is converged by one remote module run.
+    Per-key results are expanded back into loop-like `results` (with `item` and `ansible_loop_var`),
+    so registered variables look the same as they did for the `include_tasks` + `loop` pattern.
+    In multi-user mode the same is done for `results` of every item of `users`.
+    Single key tasks are passed to the module as is.
+    '''
+    def _values(self, settings):
+        '''Returns desired values by (schema, path or path pattern, key).'''
+        values = {}
+        for schema_id, schema in settings.items():
+            if not isinstance(schema, Mapping) or not isinstance(schema.get('keys'), Mapping):
+                raise AnsibleActionFail(f'Schema \'{schema_id}\' must be a mapping with \'keys\' mapping (and optional \'path\' or \'children_of\')')
+            path = schema.get('path')
+            if schema.get('children_of') is not None:
+                path = schema['children_of'].rstrip('/') + '/*/'
+            for key, value in schema['keys'].items():
+                values[(schema_id, path, key)] = value
+
+        return values
+
+    @staticmethod
+    def _lookup(values, schema_id, path, key):
+        '''Finds desired value of the key (its path might be expanded from a pattern).'''
+        if (schema_id, path, key) in values:
+            return values[(schema_id, path, key)]
+        for (value_schema_id, pattern, value_key), value in values.items():
+            if value_schema_id == schema_id and value_key == key and pattern is not None and path is not None and fnmatch.fnmatchcase(path, pattern):
+                return value
+
+        return None
+
+    @staticmethod
+    def _loop_result(key_result, value):
+        '''Makes a per-key result look like a result of looped single key task.'''
+        item = {'schema': key_result['schema'], 'path': key_result['path'], 'key': key_result['key'], 'value': value}
+        loop_result = dict(key_result, item=item, ansible_loop_var='item')
+        loop_result['invocation'] = {'module_args': {name: field for name, field in item.items() if field is not None}}
+
+        return loop_result
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp  # tmp no longer has any effect
+
+        settings = self._task.args.get('settings')
+        if settings is None:
+            result.update(self._execute_module(module_name='shipilovds.workstation.gsettings', task_vars=task_vars))
+            return result
+        if not isinstance(settings, Mapping):
+            raise AnsibleActionFail('\'settings\' must be a mapping of schemas')
+
+        values = self._values(settings)
+        result.update(self._execute_module(module_name='shipilovds.workstation.gsettings', task_vars=task_vars))
+        # drift report has no per-key results
+        for user_result in result.get('users') or []:
+            if 'results' in user_result:
+                user_result['results'] = self._loop_results(values, user_result['results'])
+        if 'results' in result:
+            result['results'] = self._loop_results(values, result['results'])
+
+        return result
+
+    def _loop_results(self, values, key_results):
+        '''Expands per-key results of the module into loop-like items.'''
+        return [
+            self._loop_result(key_result, self._lookup(values, key_result['schema'], key_result['path'], key_result['key']))
+            for key_result in key_results
+        ]
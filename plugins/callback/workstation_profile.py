@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Make coding more python3-ish, this is required for contributions to Ansible
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+DOCUMENTATION = r'''
+---
+name: workstation_profile
+type: aggregate
+short_description: Sums up per-phase timings of workstation modules
+description:
+  - Collects 'profile' field of 'shipilovds.workstation' module results (see 'profile' option of gsettings and gnome_extension modules)
+  - Prints wall and CPU time of every phase per host at the end of the playbook
+  - Looped tasks are accounted too (every item with 'profile' field)
+version_added: '1.1.0'
+requirements:
+  - enable in configuration (callbacks_enabled = shipilovds.workstation.workstation_profile)
+  - profiling enabled in the modules ('profile' option or SHIPILOVDS_WORKSTATION_PROFILE environment variable)
+author:
+    - Denis Shipilov (@shipilovds)
+'''
+
+
+from ansible.plugins.callback import CallbackBase
+
+
+TOTAL_PHASE = 'module run'
+
+
+class CallbackModule(CallbackBase):
+    '''Aggregates module profiles by host and phase.'''
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'shipilovds.workstation.workstation_profile'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.hosts = {}
+
+    def _add(self, host, name, wall, cpu, calls):
+        phase = self.hosts.setdefault(host, {}).setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        phase['wall'] += wall
+        phase['cpu'] += cpu
+        phase['calls'] += calls
+
+    def _account(self, host, task_result):
+        '''Adds profile of a module result (or of its loop items).'''
+        profile = task_result.get('profile')
+        if isinstance(profile, dict):
+            self._add(host, TOTAL_PHASE, profile.get('wall', 0.0), profile.get('cpu', 0.0), 1)
+            for name, phase in profile.get('phases', {}).items():
+                self._add(host, name, phase.get('wall', 0.0), phase.get('cpu', 0.0), phase.get('calls', 0))
+            return
+        for item in task_result.get('results') or []:
+            if isinstance(item, dict) and 'results' not in item:
+                self._account(host, item)
+
+    def v2_runner_on_ok(self, result):
+        self._account(result._host.get_name(), result._result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._account(result._host.get_name(), result._result)
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.hosts:
+            return
+        self._display.banner('WORKSTATION PROFILE')
+        for host in sorted(self.hosts):
+            self._display.display(f'{host}:')
+            self._display.display(f'  {"phase":<20} {"calls":>8} {"wall, s":>10} {"cpu, s":>10}')
+            phases = sorted(self.hosts[host].items(), key=lambda phase: phase[1]['wall'], reverse=True)
+            for name, phase in phases:
+                self._display.display(f'  {name:<20} {phase["calls"]:>8} {phase["wall"]:>10.4f} {phase["cpu"]:>10.4f}')
@@ -0,0 +1,648 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gi_helpers import GLib
+import os
+import pwd
+import struct
+import sys
+
+
+DCONF_USER_DIR = '~/.config/dconf/'
+DCONF_SYSTEM_DB_DIR = '/etc/dconf/db/'
+DCONF_PROFILE_DIR = '/etc/dconf/profile/'
+GVDB_SIGNATURE = (0x72615647, 0x746e6169)  # 'GVariant'
+GVDB_HEADER_SIZE = 24
+GVDB_HASH_ITEM_SIZE = 24
+GVDB_BLOOM_SHIFT = 5
+GVDB_NO_PARENT = 0xffffffff
+DCONF_DB_MODE = 0o644
+
+
+class GvdbException(Exception):
+    '''Custom exception for corrupted or unsupported GVDB files'''
+    pass
+
+
+class GvdbTable():
+    '''Read-only GVDB hash table (the format of dconf database files).
+
+    Only lookups and iteration are implemented - it is all we need to read the settings (see `GvdbBuilder` for writing).
+    Format description: https://gitlab.gnome.org/GNOME/gvdb/-/blob/main/gvdb/gvdb-format.h
+
+    Args:
+        data (bytes): Whole GVDB file content
+        start (int): Hash table start offset
+        end (int): Hash table end offset
+        byteorder (str): `struct` byte order character (`<` or `>`)
+
+    Attributes:
+        data (bytes): Whole GVDB file content
+        byteorder (str): `struct` byte order character
+    '''
+    def __init__(self, data, start, end, byteorder):
+        self.data = data
+        self.byteorder = byteorder
+        self._items = []
+        self._buckets = ()
+        self._bloom_words = ()
+        self._bloom_shift = 0
+        self._parse(start, end)
+
+    @classmethod
+    def from_file(cls, file_path):
+        '''Reads root hash table from GVDB file.
+
+        Args:
+            file_path (str): GVDB file path
+
+        Raises:
+            GvdbException: If file is not a GVDB file.
+
+        Returns:
+            GvdbTable
+        '''
+        with open(file_path, 'rb') as db_file:
+            data = db_file.read()
+
+        return cls.from_bytes(data, file_path)
+
+    @classmethod
+    def from_bytes(cls, data, name='<bytes>'):
+        '''Reads root hash table from GVDB data.
+
+        Args:
+            data (bytes): Whole GVDB file content
+            name (:obj:`str`, optional): Data source name for error messages
+
+        Raises:
+            GvdbException: If data is not GVDB data.
+
+        Returns:
+            GvdbTable
+        '''
+        if len(data) < GVDB_HEADER_SIZE:
+            raise GvdbException(f'File \'{name}\' is too small to be a GVDB file')
+        for byteorder in ('<', '>'):
+            signature = struct.unpack_from(f'{byteorder}II', data, 0)
+            if signature == GVDB_SIGNATURE:
+                start, end = struct.unpack_from(f'{byteorder}II', data, 16)
+                return cls(data, start, end, byteorder)
+
+        raise GvdbException(f'File \'{name}\' is not a GVDB file')
+
+    @staticmethod
+    def hash_key(key):
+        '''GVDB key hash (djb2 over signed chars, 32 bit).'''
+        hash_value = 5381
+        for char in key.encode('utf-8'):
+            if char > 127:
+                char -= 256
+            hash_value = (hash_value * 33 + char) & 0xffffffff
+
+        return hash_value
+
+    def _parse(self, start, end):
+        '''Parses hash table header, bloom filter, buckets and items.'''
+        if start == end == 0:
+            return
+        if start + 8 > end or end > len(self.data):
+            raise GvdbException('Hash table pointer is out of file bounds')
+        bloom_header, n_buckets = struct.unpack_from(f'{self.byteorder}II', self.data, start)
+        n_bloom_words = bloom_header & ((1 << 27) - 1)
+        self._bloom_shift = bloom_header >> 27
+        offset = start + 8
+        self._bloom_words = struct.unpack_from(f'{self.byteorder}{n_bloom_words}I', self.data, offset)
+        offset += n_bloom_words * 4
+        self._buckets = struct.unpack_from(f'{self.byteorder}{n_buckets}I', self.data, offset)
+        offset += n_buckets * 4
+        n_items = (end - offset) // GVDB_HASH_ITEM_SIZE
+        item_format = f'{self.byteorder}IIIHccII'
+        for index in range(n_items):
+            self._items.append(struct.unpack_from(item_format, self.data, offset + index * GVDB_HASH_ITEM_SIZE))
+
+    def _item_key(self, item):
+        '''Returns item key (own part only, without parents).'''
+        _, _, key_start, key_size, _, _, _, _ = item
+        return self.data[key_start:key_start + key_size].decode('utf-8')
+
+    def _item_full_key(self, item):
+        '''Returns full item key (with all the parents).'''
+        key = self._item_key(item)
+        parent = item[1]
+        while parent != GVDB_NO_PARENT:
+            if parent >= len(self._items):
+                raise GvdbException('Item parent is out of range')
+            item = self._items[parent]
+            key = self._item_key(item) + key
+            parent = item[1]
+
+        return key
+
+    def _bloom_filter(self, hash_value):
+        '''Returns `False` if key is definitely not in the table.'''
+        if not self._bloom_words:
+            return True
+        word = (hash_value // 32) % len(self._bloom_words)
+        mask = (1 << (hash_value & 31)) | (1 << ((hash_value >> self._bloom_shift) & 31))
+
+        return self._bloom_words[word] & mask == mask
+
+    def _lookup(self, key, item_type):
+        '''Finds hash table item by key and type.
+
+        Returns:
+            tuple: Raw hash item or `None`
+        '''
+        if not self._buckets or not self._items:
+            return None
+        hash_value = self.hash_key(key)
+        if not self._bloom_filter(hash_value):
+            return None
+        bucket = hash_value % len(self._buckets)
+        itemno = self._buckets[bucket]
+        if bucket == len(self._buckets) - 1:
+            lastno = len(self._items)
+        else:
+            lastno = min(self._buckets[bucket + 1], len(self._items))
+        for item in self._items[itemno:lastno]:
+            if item[0] == hash_value and item[4] == item_type and self._item_full_key(item) == key:
+                return item
+
+        return None
+
+    def get_value(self, key):
+        '''Returns value stored with the key.
+
+        Args:
+            key (str): Full key (e.g. `/org/gnome/shell/enabled-extensions`)
+
+        Returns:
+            GLib.Variant: Value or `None` if there is no such key
+        '''
+        item = self._lookup(key, b'v')
+        if item is None:
+            return None
+
+        return self._item_value(item)
+
+    def _item_value(self, item):
+        '''Unboxes value of `v` item.'''
+        value_start, value_end = item[6], item[7]
+        data = GLib.Bytes.new(self.data[value_start:value_end])
+        variant = GLib.Variant.new_from_bytes(GLib.VariantType.new('v'), data, False)
+        if self.byteorder != '<':
+            variant = variant.byteswap()
+
+        return variant.get_variant()
+
+    def get_table(self, key):
+        '''Returns nested hash table (e.g. `.locks` of system databases).
+
+        Args:
+            key (str): Table key
+
+        Returns:
+            GvdbTable: Nested table or `None` if there is no such table
+        '''
+        item = self._lookup(key, b'H')
+        if item is None:
+            return None
+
+        return GvdbTable(self.data, item[6], item[7], self.byteorder)
+
+    def has_value(self, key):
+        '''Checks if the key is in the table.'''
+        return self._lookup(key, b'v') is not None
+
+    def list(self, key):
+        '''Lists children of the directory (`L` item).
+
+        Args:
+            key (str): Directory key (e.g. `/org/gnome/desktop/notifications/application/`)
+
+        Returns:
+            list: Child names (directories end with `/`) or `None` if there is no such directory
+        '''
+        item = self._lookup(key, b'L')
+        if item is None:
+            return None
+        start, end = item[6], item[7]
+        if start > end or end > len(self.data) or (end - start) % 4:
+            raise GvdbException(f'List of \'{key}\' is out of file bounds')
+        children = []
+        for index in struct.unpack_from(f'{self.byteorder}{(end - start) // 4}I', self.data, start):
+            if index >= len(self._items):
+                raise GvdbException('List item is out of range')
+            children.append(self._item_key(self._items[index]))
+
+        return children
+
+    def values(self):
+        '''Iterates over all values of the table.
+
+        Yields:
+            tuple: (full key, GLib.Variant)
+        '''
+        for item in self._items:
+            if item[4] == b'v':
+                yield self._item_full_key(item), self._item_value(item)
+
+    def tables(self):
+        '''Iterates over nested hash tables (e.g. `.locks` of system databases).
+
+        Yields:
+            tuple: (key, GvdbTable)
+        '''
+        for item in self._items:
+            if item[4] == b'H':
+                yield self._item_full_key(item), GvdbTable(self.data, item[6], item[7], self.byteorder)
+
+
+class GvdbBuilder():
+    '''GVDB hash table builder (the format of dconf database files).
+
+    Lays the file out the same way as `gvdb-builder.c` of dconf does: one bucket per item, no bloom filter,
+    items keep only their own part of the key and refer to the parent directory (`L` item listing its children).
+    Items are laid out in insertion order within a bucket, so the same input always gives the same bytes.
+    Data is little-endian (values are byteswapped on big-endian hosts), readers handle both byte orders.
+
+    Attributes:
+        items (dict): Items by key. Every item is a dict with `value` (GLib.Variant), `table` (GvdbBuilder),
+            `parent` (key) and `children` (keys) fields.
+    '''
+    def __init__(self):
+        self.items = {}
+
+    def _item(self, key):
+        '''Returns item of the key (creates an empty one if there is no such item).'''
+        item = self.items.get(key)
+        if item is None:
+            item = {'value': None, 'table': None, 'parent': None, 'children': []}
+            self.items[key] = item
+
+        return item
+
+    def _set_parent(self, key):
+        '''Links the key to its parent directory (creating missing directories up to `/`).'''
+        if key == '/':
+            return
+        end = len(key) - 1 if key.endswith('/') else len(key)
+        parent_key = key[:key.rindex('/', 0, end) + 1]
+        if parent_key not in self.items:
+            self._item(parent_key)
+            self._set_parent(parent_key)
+        self.items[key]['parent'] = parent_key
+        self.items[parent_key]['children'].append(key)
+
+    def set_value(self, key, value, parents=False):
+        '''Sets value of the key.
+
+        Args:
+            key (str): Full key (e.g. `/org/gnome/shell/enabled-extensions`)
+            value (GLib.Variant): Value
+            parents (bool): Create parent directories like dconf does (needed for `dconf list`)
+        '''
+        is_new = key not in self.items
+        self._item(key)['value'] = value
+        if parents and is_new and key.startswith('/'):
+            self._set_parent(key)
+
+    def set_table(self, key, table):
+        '''Sets nested hash table (e.g. `.locks`).
+
+        Args:
+            key (str): Table key
+            table (GvdbBuilder): Nested table
+        '''
+        self._item(key)['table'] = table
+
+    @staticmethod
+    def _allocate(data, alignment, size):
+        '''Appends zeroed aligned chunk to the data and returns its offset.'''
+        data.extend(bytes(-len(data) % alignment))
+        offset = len(data)
+        data.extend(bytes(size))
+
+        return offset
+
+    def _write_table(self, data):
+        '''Writes the table (and its nested tables and values) into the data.
+
+        Returns:
+            tuple: Table start and end offsets
+        '''
+        n_buckets = len(self.items)
+        hashes = {key: GvdbTable.hash_key(key) for key in self.items}
+        buckets = [[] for _ in range(n_buckets)]
+        for key, hash_value in hashes.items():
+            buckets[hash_value % n_buckets].append(key)
+        ordered = [key for bucket in buckets for key in bucket]
+        indices = {key: index for index, key in enumerate(ordered)}
+        start = self._allocate(data, 4, 8 + n_buckets * 4 + len(ordered) * GVDB_HASH_ITEM_SIZE)
+        struct.pack_into('<II', data, start, GVDB_BLOOM_SHIFT << 27, n_buckets)
+        first_item = 0
+        for bucket_index, bucket in enumerate(buckets):
+            struct.pack_into('<I', data, start + 8 + bucket_index * 4, first_item)
+            first_item += len(bucket)
+        items_start = start + 8 + n_buckets * 4
+        for index, key in enumerate(ordered):
+            item = self.items[key]
+            if item['parent'] is None:
+                parent, own_key = GVDB_NO_PARENT, key
+            else:
+                parent, own_key = indices[item['parent']], key[len(item['parent']):]
+            own_key = own_key.encode('utf-8')
+            key_start = self._allocate(data, 1, len(own_key))
+            data[key_start:key_start + len(own_key)] = own_key
+            if item['value'] is not None:
+                variant = GLib.Variant('v', item['value']).get_normal_form()
+                if sys.byteorder != 'little':
+                    variant = variant.byteswap()
+                value = variant.get_data_as_bytes().get_data()
+                item_type, value_start = b'v', self._allocate(data, 8, len(value))
+                data[value_start:value_start + len(value)] = value
+                value_end = value_start + len(value)
+            elif item['table'] is not None:
+                item_type = b'H'
+                value_start, value_end = item['table']._write_table(data)
+            elif item['children']:
+                item_type, value_start = b'L', self._allocate(data, 4, len(item['children']) * 4)
+                struct.pack_into(f'<{len(item["children"])}I', data, value_start, *(indices[child] for child in item['children']))
+                value_end = value_start + len(item['children']) * 4
+            else:
+                item_type, value_start, value_end = b'\0', 0, 0
+            struct.pack_into('<IIIHccII', data, items_start + index * GVDB_HASH_ITEM_SIZE,
+                             hashes[key], parent, key_start, len(own_key), item_type, b'\0', value_start, value_end)
+
+        return start, items_start + len(ordered) * GVDB_HASH_ITEM_SIZE
+
+    def serialize(self):
+        '''Returns the whole GVDB file content.
+
+        Returns:
+            bytes
+        '''
+        data = bytearray(GVDB_HEADER_SIZE)
+        start, end = self._write_table(data)
+        struct.pack_into('<IIIIII', data, 0, GVDB_SIGNATURE[0], GVDB_SIGNATURE[1], 0, 0, start, end)
+
+        return bytes(data)
+
+
+class DconfDatabase():
+    '''Session-free dconf reader.
+
+    Reads dconf database files directly (user database and system databases from dconf profile),
+    so there is no need in session D-Bus, GIO backend or dconf service.
+    Resolves values and locks the same way as dconf engine does.
+
+    Args:
+        profile (:obj:`str`, optional): dconf profile name or path. `DCONF_PROFILE` env or `user` by default
+        user (:obj:`str`, optional): Read user database of this user (current user by default)
+
+    Attributes:
+        sources (list): Databases as (GvdbTable, locks GvdbTable) tuples. User database goes first.
+    '''
+    def __init__(self, profile=None, user=None):
+        self.sources = []
+        for db_type, db_path in self.db_paths(profile, user):
+            try:
+                table = GvdbTable.from_file(db_path)
+            except FileNotFoundError:
+                # It means that nothing has been written into database yet
+                table = None
+            locks = table.get_table('.locks') if table is not None and db_type == 'system-db' else None
+            self.sources.append((table, locks))
+
+    @classmethod
+    def db_paths(cls, profile=None, user=None):
+        '''Returns database files of dconf profile (without reading them).
+
+        Args:
+            profile (:obj:`str`, optional): dconf profile name or path. `DCONF_PROFILE` env or `user` by default
+            user (:obj:`str`, optional): Owner of user databases (current user by default)
+
+        Returns:
+            list: (db type, db file path) tuples. User database goes first.
+        '''
+        paths = []
+        for db_type, db_name in cls._read_profile(profile or os.environ.get('DCONF_PROFILE', 'user')):
+            if db_type == 'user-db':
+                paths.append((db_type, os.path.join(cls._user_dir(user), db_name)))
+            else:
+                paths.append((db_type, os.path.join(DCONF_SYSTEM_DB_DIR, db_name)))
+
+        return paths
+
+    @staticmethod
+    def is_available():
+        '''Checks if dconf is the GSettings backend (database files contain actual settings).'''
+        return os.environ.get('GSETTINGS_BACKEND') in (None, '', 'dconf')
+
+    @staticmethod
+    def _user_dir(user=None):
+        '''Returns directory of user databases.'''
+        if user is not None:
+            return os.path.join(pwd.getpwnam(user).pw_dir, DCONF_USER_DIR[2:])
+        config_home = os.environ.get('XDG_CONFIG_HOME')
+        if config_home:
+            return os.path.join(config_home, 'dconf')
+
+        return os.path.expanduser(DCONF_USER_DIR)
+
+    @staticmethod
+    def _read_profile(profile):
+        '''Parses dconf profile.
+
+        Without profile file dconf uses just the user database.
+
+        Returns:
+            list: (db type, db name) tuples
+        '''
+        profile_path = profile if os.path.isabs(profile) else os.path.join(DCONF_PROFILE_DIR, profile)
+        try:
+            with open(profile_path, 'r') as profile_file:
+                lines = profile_file.read().splitlines()
+        except FileNotFoundError:
+            return [('user-db', 'user')]
+        databases = []
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if line.startswith(('user-db:', 'system-db:')):
+                databases.append(tuple(line.split(':', 1)))
+
+        return databases
+
+    def _lock_level(self, key):
+        '''Returns index of the database which locks the key (0 if it is not locked).'''
+        for index in range(len(self.sources) - 1, 0, -1):
+            locks = self.sources[index][1]
+            if locks is not None and locks.has_value(key):
+                return index
+
+        return 0
+
+    def is_locked(self, key):
+        '''Checks if the key is locked by system database (cannot be changed by user).'''
+        return self._lock_level(key) > 0
+
+    def list(self, directory):
+        '''Lists the directory like `dconf list` does (children from all databases).
+
+        Args:
+            directory (str): Directory path (e.g. `/org/gnome/desktop/notifications/application/`)
+
+        Returns:
+            list: Sorted child names (directories end with `/`)
+        '''
+        children = set()
+        for table, _ in self.sources:
+            if table is not None:
+                children.update(table.list(directory) or ())
+
+        return sorted(children)
+
+    def read(self, key):
+        '''Reads the value of the key.
+
+        Args:
+            key (str): Full key (e.g. `/org/gnome/shell/enabled-extensions`)
+
+        Returns:
+            GLib.Variant: Value or `None` if the key is not set in any database (schema default is used then)
+        '''
+        for table, _ in self.sources[self._lock_level(key):]:
+            if table is not None:
+                value = table.get_value(key)
+                if value is not None:
+                    return value
+
+        return None
+
+
+class DconfWriter(DconfDatabase):
+    '''Offline dconf database writer.
+
+    Writes keys straight into the first database of dconf profile (the one dconf writes to),
+    so there is no need in user session, D-Bus or dconf service (e.g. for image builds or before the first login).
+    Writes are collected and land in the database file with one atomic replace on `commit`.
+    Everything else in the file (other keys, nested tables like `.locks`) is kept.
+    Reads take staged writes into account, locks of system databases are respected.
+
+    The user should not be logged in: running dconf service does not notice the new file and might overwrite it.
+
+    Args:
+        profile (:obj:`str`, optional): dconf profile name or path. `DCONF_PROFILE` env or `user` by default
+        user (:obj:`str`, optional): Write user database of this user (current user by default).
+            New files and directories are given to the user.
+
+    Attributes:
+        db_type (str): Type of the database to write to (`user-db` or `system-db`)
+        db_path (str): Database file to write to
+        changes (dict): Staged values (GLib.Variant) by full key
+    '''
+    def __init__(self, profile=None, user=None):
+        super().__init__(profile, user)
+        db_paths = self.db_paths(profile, user)
+        if not db_paths:
+            raise GvdbException(f'dconf profile \'{profile}\' has no databases')
+        self.db_type, self.db_path = db_paths[0]
+        self.user = user
+        self.changes = {}
+
+    def read(self, key):
+        '''Reads the value of the key (staged value if there is one, see `DconfDatabase.read`).'''
+        if key in self.changes:
+            return self.changes[key]
+
+        return super().read(key)
+
+    def write(self, key, value):
+        '''Stages value of the key.
+
+        Args:
+            key (str): Full key (e.g. `/org/gnome/shell/enabled-extensions`)
+            value (GLib.Variant): Value
+        '''
+        self.changes[key] = value
+
+    def _owner(self):
+        '''Returns (uid, gid) to give new files to, or `None` to keep the current ones.'''
+        if self.user is None or os.geteuid() != 0:
+            return None
+        user = pwd.getpwnam(self.user)
+
+        return user.pw_uid, user.pw_gid
+
+    def _make_dirs(self, owner):
+        '''Creates missing parent directories of the database file (but not the home directory of the user).'''
+        if self.db_type == 'user-db':
+            home = pwd.getpwnam(self.user).pw_dir if self.user is not None else os.path.expanduser('~')
+            if not os.path.isdir(home):
+                raise FileNotFoundError(f'Home directory \'{home}\' does not exist')
+        missing = []
+        directory = os.path.dirname(self.db_path)
+        while directory and not os.path.isdir(directory):
+            missing.append(directory)
+            directory = os.path.dirname(directory)
+        for directory in reversed(missing):
+            os.mkdir(directory, 0o700)
+            if owner is not None:
+                os.chown(directory, *owner)
+
+    def commit(self):
+        '''Writes all staged values into the database file.
+
+        The file is re-read right before the write, so changes made since the writer was created are kept.
+
+        Raises:
+            GvdbException: If the current file is not a GVDB file (it is not overwritten then).
+        '''
+        changes, self.changes = self.changes, {}
+        if not changes:
+            return
+        try:
+            table = GvdbTable.from_file(self.db_path)
+        except FileNotFoundError:
+            table = None
+        builder = GvdbBuilder()
+        values = dict(table.values()) if table is not None else {}
+        values.update(changes)
+        for key in sorted(values):
+            builder.set_value(key, values[key], parents=True)
+        for key, nested in (table.tables() if table is not None else ()):
+            nested_builder = GvdbBuilder()
+            for nested_key, value in nested.values():
+                nested_builder.set_value(nested_key, value)
+            builder.set_table(key, nested_builder)
+        data = builder.serialize()
+
+        owner = self._owner()
+        try:
+            stat = os.stat(self.db_path)
+            mode = stat.st_mode & 0o7777
+            if owner is not None:
+                owner = (stat.st_uid, stat.st_gid)
+        except FileNotFoundError:
+            mode = DCONF_DB_MODE
+            self._make_dirs(owner)
+        tmp_path = f'{self.db_path}.{os.getpid()}.tmp'
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+            with os.fdopen(fd, 'wb') as db_file:
+                db_file.write(data)
+                db_file.flush()
+                os.fsync(db_file.fileno())
+            os.chmod(tmp_path, mode)
+            if owner is not None:
+                os.chown(tmp_path, *owner)
+            os.replace(tmp_path, self.db_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        table = GvdbTable.from_bytes(data, self.db_path)
+        self.sources[0] = (table, table.get_table('.locks') if self.db_type == 'system-db' else None)
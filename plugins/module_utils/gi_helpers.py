@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import importlib
+
+
+class LazyModule():
+    '''Proxy of `gi.repository` namespace which is imported on first attribute access.
+
+    Loading GI and its typelibs is the most expensive part of module startup, and many tasks
+    (e.g. checking if an extension directory exists) never touch GIO at all.
+    Accessed attributes are cached in the proxy, so repeated lookups cost the same as for the real module.
+
+    Args:
+        namespace (str): GI namespace (`Gio`, `GLib`, ...)
+    '''
+    def __init__(self, namespace):
+        self.__dict__['_namespace'] = namespace
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, name):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(f'gi.repository.{self._namespace}')
+            self.__dict__['_module'] = module
+        value = getattr(module, name)
+        self.__dict__[name] = value
+
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Cannot set \'{name}\' attribute of lazy \'{self._namespace}\' module')
+
+    @property
+    def is_loaded(self):
+        '''`True` if the namespace has been imported already'''
+        return self.__dict__['_module'] is not None
+
+
+Gio = LazyModule('Gio')
+GLib = LazyModule('GLib')
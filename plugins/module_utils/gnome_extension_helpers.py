@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+
+GNOME_EXTENSION_DIRS = ['/usr/share/gnome-shell/extensions/', '~/.local/share/gnome-shell/extensions/']
+EXTENSION_METADATA_FILE = 'metadata.json'
+EXTENSION_SCHEMAS_DIR = 'schemas'
+COMPILED_SCHEMAS_FILE = 'gschemas.compiled'
+EXTENSION_METADATA_FIELDS = ('name', 'version', 'shell-version', 'settings-schema')
+BUNDLE_CACHE_DIR = '~/.cache/gnome-shell-extension-bundles/'
+HASH_CHUNK_SIZE = 1024 * 1024
+STAGING_DIR = '.extensions-staging'  # next to the extensions directory (on the same filesystem)
+INDEX_VERSION = 2  # bump it when indexing rules change, so persisted indexes are rebuilt
+
+
+def file_sha256(file_path):
+    '''Calculates sha256 of the file (reads it by chunks).'''
+    checksum = hashlib.sha256()
+    with open(file_path, 'rb') as src:
+        for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
+
+
+def extension_schema_dirs(dirs=None):
+    '''Finds compiled schema directories of installed extensions.
+
+    Args:
+        dirs (:obj:`list`, optional): Extension directories (`GNOME_EXTENSION_DIRS` by default)
+
+    Returns:
+        list: `<extension>/schemas` directories with compiled schemas. System extensions go first,
+            so user ones take precedence when the directories are chained.
+    '''
+    schema_dirs = []
+    for extensions_dir in dirs or GNOME_EXTENSION_DIRS:
+        extensions_dir = os.path.expanduser(extensions_dir)
+        try:
+            names = sorted(os.listdir(extensions_dir))
+        except OSError:
+            continue
+        for name in names:
+            schema_dir = os.path.join(extensions_dir, name, EXTENSION_SCHEMAS_DIR)
+            if os.path.isfile(os.path.join(schema_dir, COMPILED_SCHEMAS_FILE)):
+                schema_dirs.append(schema_dir)
+
+    return schema_dirs
+
+
+class ExtensionIndex():
+    '''Index of installed Gnome Shell Extensions.
+
+    Extensions are indexed by uuid (directory name) with some fields of their `metadata.json`.
+    Like Gnome Shell, only directories with `metadata.json` whose `uuid` matches the directory name are extensions
+    (hidden directories are skipped).
+    Extension directory is rescanned only if its mtime has changed (extension was installed or removed).
+    Index might be persisted into a small JSON file, so the next module run does not need to parse anything.
+    If the same extension is installed in a few directories - the last one wins (user extensions override system ones).
+
+    Args:
+        dirs (:obj:`list`, optional): Extension directories (`GNOME_EXTENSION_DIRS` by default)
+        cache_file (:obj:`str`, optional): JSON file to persist the index
+
+    Attributes:
+        extensions (dict): Extension metadata (`path`, `name`, `version`, `shell-version`, `settings-schema`) by uuid
+    '''
+    def __init__(self, dirs=None, cache_file=None):
+        self.dirs = [os.path.expanduser(src) for src in (dirs or GNOME_EXTENSION_DIRS)]
+        self.cache_file = os.path.expanduser(cache_file) if cache_file else None
+        self.extensions = {}
+        self._dirs_state = self._load_cache()
+        self.refresh()
+
+    def __contains__(self, uuid):
+        return uuid in self.extensions
+
+    def get(self, uuid):
+        '''Returns metadata of installed extension (or `None` if it is not installed).'''
+        return self.extensions.get(uuid)
+
+    def _load_cache(self):
+        '''Loads persisted index state (directory mtimes and their extensions).'''
+        if self.cache_file is None:
+            return {}
+        try:
+            with open(self.cache_file, 'r') as cache:
+                state = json.load(cache)
+        except (OSError, ValueError):
+            return {}
+
+        return state if isinstance(state, dict) else {}
+
+    @staticmethod
+    def read_metadata(path, uuid=None):
+        '''Reads interesting fields of extension `metadata.json`.
+
+        Args:
+            path (str): Extension directory
+            uuid (:obj:`str`, optional): Expected extension uuid (directory name by default)
+
+        Returns:
+            dict: Metadata fields with `path`, or `None` if there is no readable metadata or its uuid does not match
+        '''
+        try:
+            with open(os.path.join(path, EXTENSION_METADATA_FILE), 'r') as metadata_file:
+                content = json.load(metadata_file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(content, dict) or content.get('uuid') != (uuid or os.path.basename(path.rstrip('/'))):
+            return None
+        metadata = {'path': path}
+        for field in EXTENSION_METADATA_FIELDS:
+            if field in content:
+                metadata[field] = content[field]
+
+        return metadata
+
+    def _scan_dir(self, src):
+        '''Reads all extensions of the directory.'''
+        extensions = {}
+        with os.scandir(src) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_dir():
+                    continue
+                metadata = self.read_metadata(entry.path, entry.name)
+                if metadata is not None:
+                    extensions[entry.name] = metadata
+
+        return extensions
+
+    def refresh(self):
+        '''Updates the index. Rescans only the directories whose mtime has changed.
+
+        Returns:
+            bool: `True` if anything was rescanned
+        '''
+        rescanned = False
+        for src in self.dirs:
+            try:
+                mtime = os.stat(src).st_mtime_ns
+            except FileNotFoundError:
+                # It means that local user extensions does not exist yet
+                self._dirs_state.pop(src, None)
+                continue
+            dir_state = self._dirs_state.get(src)
+            if not isinstance(dir_state, dict) or dir_state.get('mtime') != mtime or dir_state.get('version') != INDEX_VERSION:
+                self._dirs_state[src] = {'mtime': mtime, 'version': INDEX_VERSION, 'extensions': self._scan_dir(src)}
+                rescanned = True
+        self.extensions = {}
+        for src in self.dirs:
+            self.extensions.update(self._dirs_state.get(src, {}).get('extensions', {}))
+        if rescanned:
+            try:
+                self.save()
+            except OSError:
+                # the index is just a cache - it is fine to rebuild it next time
+                pass
+
+        return rescanned
+
+    def update(self, uuid):
+        '''Re-reads a single extension (after its installation or removal) without rescanning directories.
+
+        Persisted directory state is not changed, so the next run rescans changed directories anyway.
+
+        Args:
+            uuid (str): Extension name (uuid)
+        '''
+        self.extensions.pop(uuid, None)
+        if uuid.startswith('.'):
+            return
+        for src in self.dirs:
+            path = os.path.join(src, uuid)
+            metadata = self.read_metadata(path, uuid) if os.path.isdir(path) else None
+            if metadata is not None:
+                self.extensions[uuid] = metadata
+
+    def save(self):
+        '''Persists the index into the cache file (if it is set).'''
+        if self.cache_file is None:
+            return
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f'{self.cache_file}.tmp'
+        with open(tmp_file, 'w') as cache:
+            json.dump(self._dirs_state, cache)
+        os.replace(tmp_file, self.cache_file)
+
+
+class BundleCache():
+    '''Content-addressed storage of extension bundles (zip files are stored as `<sha256>.zip`).
+
+    Bundle is stored once and is never downloaded or copied again while the cache has it.
+
+    Args:
+        path (:obj:`str`, optional): Cache directory (`BUNDLE_CACHE_DIR` by default)
+
+    Attributes:
+        path (str): Cache directory
+    '''
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or BUNDLE_CACHE_DIR)
+
+    def __contains__(self, sha256):
+        return os.path.isfile(self.get_path(sha256))
+
+    def get_path(self, sha256):
+        '''Returns the path of the bundle with this hash (it might not exist).'''
+        return os.path.join(self.path, f'{sha256.lower()}.zip')
+
+    def store(self, src, sha256):
+        '''Puts the bundle into the cache (if it is not there yet).
+
+        Args:
+            src (str): Bundle path
+            sha256 (str): Expected bundle hash
+
+        Raises:
+            ValueError: If bundle hash does not match.
+
+        Returns:
+            str: Path of the cached bundle
+        '''
+        cached_path = self.get_path(sha256)
+        src = os.path.expanduser(src)
+        if os.path.abspath(src) != cached_path and sha256 in self:
+            return cached_path
+        actual = file_sha256(src)
+        if actual != sha256.lower():
+            raise ValueError(f'Bundle \'{src}\' sha256 mismatch: expected {sha256}, got {actual}')
+        if os.path.abspath(src) != cached_path:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_file = f'{cached_path}.tmp'
+            shutil.copyfile(src, tmp_file)
+            os.replace(tmp_file, cached_path)
+
+        return cached_path
+
+
+class ExtensionInstallException(Exception):
+    '''Custom exception for failed extension installation or removal.
+
+    Args:
+        msg (str): Error message
+        reason (str): Short machine-readable reason
+
+    Attributes:
+        reason (str): `bad-bundle`, `bad-metadata`, `uuid-mismatch`, `not-installed` or `system-extension`
+    '''
+    def __init__(self, msg, reason):
+        super().__init__(msg)
+        self.reason = reason
+
+
+class ExtensionInstaller():
+    '''In-process Gnome Shell Extension installer (does what `gnome-extensions install/uninstall` does).
+
+    Bundle is streamed from the zip file into a staging directory next to the extensions directory
+    (`STAGING_DIR`, so Gnome Shell never sees it) and then renamed into place, so the extension directory
+    is never half-written. Replaced and removed extensions are moved into the staging directory before removal.
+    Leftovers of interrupted runs are removed by the next run.
+
+    Args:
+        path (:obj:`str`, optional): User extensions directory (the last of `GNOME_EXTENSION_DIRS` by default)
+
+    Attributes:
+        path (str): User extensions directory
+        staging (str): Staging directory
+    '''
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or GNOME_EXTENSION_DIRS[-1])
+        self.staging = os.path.join(os.path.dirname(os.path.normpath(self.path)), STAGING_DIR)
+        self._cleaned = False
+
+    def _staging_dir(self, prefix):
+        '''Creates a staging directory (removes leftovers of the previous runs first).'''
+        os.makedirs(self.staging, exist_ok=True)
+        if not self._cleaned:
+            self.cleanup()
+        return tempfile.mkdtemp(prefix=f'{os.getpid()}.{prefix}.', dir=self.staging)
+
+    def cleanup(self):
+        '''Removes leftovers of interrupted runs (staging directories of processes which are not running anymore).'''
+        self._cleaned = True
+        try:
+            names = os.listdir(self.staging)
+        except FileNotFoundError:
+            return
+        for name in names:
+            pid = name.split('.', 1)[0]
+            if pid.isdigit() and int(pid) != os.getpid() and self._is_running(int(pid)):
+                continue
+            shutil.rmtree(os.path.join(self.staging, name), ignore_errors=True)
+
+    @staticmethod
+    def _is_running(pid):
+        '''Checks if the process exists.'''
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # it is running, but belongs to another user
+            pass
+
+        return True
+
+    @staticmethod
+    def validate_metadata(content, uuid=None):
+        '''Validates `metadata.json` content.
+
+        Args:
+            content (bytes): `metadata.json` content
+            uuid (:obj:`str`, optional): Expected extension uuid
+
+        Raises:
+            ExtensionInstallException: If metadata is invalid or does not match `uuid`.
+
+        Returns:
+            dict: Metadata
+        '''
+        try:
+            metadata = json.loads(content)
+        except ValueError as ex:
+            raise ExtensionInstallException(f'\'{EXTENSION_METADATA_FILE}\' is not a valid JSON: {ex}', 'bad-metadata')
+        if not isinstance(metadata, dict):
+            raise ExtensionInstallException(f'\'{EXTENSION_METADATA_FILE}\' must contain an object', 'bad-metadata')
+        for field in ('uuid', 'name', 'description', 'shell-version'):
+            if field not in metadata:
+                raise ExtensionInstallException(f'\'{EXTENSION_METADATA_FILE}\' has no \'{field}\' field', 'bad-metadata')
+        bundle_uuid = metadata['uuid']
+        if not isinstance(bundle_uuid, str) or not bundle_uuid or bundle_uuid in ('.', '..') or '/' in bundle_uuid:
+            raise ExtensionInstallException(f'Invalid extension uuid: {bundle_uuid!r}', 'bad-metadata')
+        if uuid is not None and bundle_uuid != uuid:
+            raise ExtensionInstallException(f'Bundle contains \'{bundle_uuid}\' extension instead of \'{uuid}\'', 'uuid-mismatch')
+
+        return metadata
+
+    @staticmethod
+    def _extract(bundle, target):
+        '''Streams bundle members into the target directory (rejects paths outside of it).'''
+        for member in bundle.infolist():
+            path = os.path.realpath(os.path.join(target, member.filename))
+            if os.path.commonpath([target, path]) != target:
+                raise ExtensionInstallException(f'Bundle member \'{member.filename}\' is outside of extension directory', 'bad-bundle')
+            if member.is_dir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with bundle.open(member) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+    def install(self, src, uuid=None, force=False):
+        '''Installs the extension from the bundle.
+
+        Args:
+            src (str): Bundle (zip file) path
+            uuid (:obj:`str`, optional): Expected extension uuid
+            force (bool): Replace already installed extension
+
+        Raises:
+            ExtensionInstallException: If bundle or its metadata is invalid.
+
+        Returns:
+            str: Extension directory or `None` if extension exists and `force` is not set
+        '''
+        try:
+            bundle = zipfile.ZipFile(os.path.expanduser(src))
+        except (OSError, zipfile.BadZipFile) as ex:
+            raise ExtensionInstallException(f'Cannot open bundle \'{src}\': {ex}', 'bad-bundle')
+        with bundle:
+            try:
+                content = bundle.read(EXTENSION_METADATA_FILE)
+            except KeyError:
+                raise ExtensionInstallException(f'Bundle has no \'{EXTENSION_METADATA_FILE}\'', 'bad-bundle')
+            metadata = self.validate_metadata(content, uuid)
+            target = os.path.join(self.path, metadata['uuid'])
+            if os.path.exists(target) and not force:
+                return None
+            os.makedirs(self.path, exist_ok=True)
+            tmp_dir = self._staging_dir(metadata['uuid'])
+            try:
+                os.chmod(tmp_dir, 0o755)
+                self._extract(bundle, os.path.realpath(tmp_dir))
+                self._replace(tmp_dir, target)
+            except BaseException:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+
+        return target
+
+    def _replace(self, src, target):
+        '''Renames the directory into place (old one is moved aside and removed afterwards).
+
+        The swap is not atomic: it takes two renames and the extension directory is missing between them.
+        If the second rename fails, the old directory is renamed back.
+        '''
+        if not os.path.exists(target):
+            os.rename(src, target)
+            return
+        old_dir = self._staging_dir(f'{os.path.basename(target)}.old')
+        old_path = os.path.join(old_dir, 'extension')
+        try:
+            os.rename(target, old_path)
+        except BaseException:
+            shutil.rmtree(old_dir, ignore_errors=True)
+            raise
+        try:
+            os.rename(src, target)
+        except BaseException:
+            os.rename(old_path, target)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            raise
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def uninstall(self, uuid):
+        '''Removes the extension directory.
+
+        Args:
+            uuid (str): Extension uuid
+
+        Raises:
+            ExtensionInstallException: If extension is not installed or it is a system extension.
+        '''
+        target = os.path.join(self.path, uuid)
+        if '/' in uuid or uuid in ('', '.', '..') or not os.path.isdir(target):
+            for src in GNOME_EXTENSION_DIRS[:-1]:
+                if uuid and os.path.isdir(os.path.join(src, uuid)):
+                    raise ExtensionInstallException(f'\'{uuid}\' is a system extension and cannot be removed', 'system-extension')
+            raise ExtensionInstallException(f'Extension \'{uuid}\' is not installed', 'not-installed')
+        # move aside first - the extension disappears atomically even if removal is interrupted
+        old_dir = self._staging_dir(f'{uuid}.old')
+        os.rename(target, os.path.join(old_dir, 'extension'))
+        shutil.rmtree(old_dir)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gi_helpers import Gio, GLib
+import os
+
+
+SHELL_BUS_NAME = 'org.gnome.Shell'
+SHELL_OBJECT_PATH = '/org/gnome/Shell'
+SHELL_EXTENSIONS_INTERFACE = 'org.gnome.Shell.Extensions'
+DBUS_TIMEOUT = 10000  # ms
+INSTALL_TIMEOUT = 120000  # ms, user has to confirm the installation
+EXTENSION_STATE_ENABLED = 1
+
+
+class ShellExtensionsBus():
+    '''Client of running Gnome Shell `org.gnome.Shell.Extensions` D-Bus interface.
+
+    Changes made through it take effect immediately (no session restart is needed).
+    The shell keeps `enabled-extensions` and `disabled-extensions` gsettings lists in sync by itself.
+
+    Args:
+        connection (Gio.DBusConnection): Session bus connection
+
+    Attributes:
+        connection (Gio.DBusConnection): Session bus connection
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+
+    @staticmethod
+    def _session_bus_address():
+        '''Returns session bus address or `None` (never autolaunches a bus).'''
+        address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+        if address:
+            return address
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+        if runtime_dir and os.path.exists(os.path.join(runtime_dir, 'bus')):
+            return f'unix:path={os.path.join(runtime_dir, "bus")}'
+
+        return None
+
+    @classmethod
+    def connect(cls):
+        '''Connects to the session bus.
+
+        Returns:
+            ShellExtensionsBus: Client or `None` if there is no session bus or Gnome Shell is not running on it
+        '''
+        address = cls._session_bus_address()
+        if address is None:
+            return None
+        flags = Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+        try:
+            connection = Gio.DBusConnection.new_for_address_sync(address, flags, None, None)
+            has_owner = connection.call_sync(
+                'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'NameHasOwner',
+                GLib.Variant('(s)', (SHELL_BUS_NAME,)), GLib.VariantType.new('(b)'),
+                Gio.DBusCallFlags.NONE, DBUS_TIMEOUT, None,
+            ).unpack()[0]
+        except GLib.Error:
+            return None
+
+        return cls(connection) if has_owner else None
+
+    def _call(self, method, parameters, reply_type, timeout=DBUS_TIMEOUT):
+        '''Calls the method of Gnome Shell extensions interface.
+
+        Raises:
+            GLib.Error: If the call has failed.
+
+        Returns:
+            tuple: Unpacked reply
+        '''
+        reply = self.connection.call_sync(
+            SHELL_BUS_NAME, SHELL_OBJECT_PATH, SHELL_EXTENSIONS_INTERFACE, method,
+            parameters, GLib.VariantType.new(reply_type), Gio.DBusCallFlags.NONE, timeout, None,
+        )
+
+        return reply.unpack()
+
+    def list_extensions(self):
+        '''Returns extensions known to the shell.
+
+        Returns:
+            dict: Extension info (`state`, `type`, `enabled`, ...) by uuid
+        '''
+        return self._call('ListExtensions', None, '(a{sa{sv}})')[0]
+
+    def enable_extension(self, uuid):
+        '''Enables the extension. Returns `True` on success.'''
+        return self._call('EnableExtension', GLib.Variant('(s)', (uuid,)), '(b)')[0]
+
+    def disable_extension(self, uuid):
+        '''Disables the extension. Returns `True` on success.'''
+        return self._call('DisableExtension', GLib.Variant('(s)', (uuid,)), '(b)')[0]
+
+    def install_remote_extension(self, uuid):
+        '''Installs the extension from extensions.gnome.org (the shell asks user for confirmation).
+
+        Returns:
+            str: `successful` or `cancelled`
+        '''
+        return self._call('InstallRemoteExtension', GLib.Variant('(s)', (uuid,)), '(s)', INSTALL_TIMEOUT)[0]
+
+    def uninstall_extension(self, uuid):
+        '''Uninstalls the extension. Returns `True` on success.'''
+        return self._call('UninstallExtension', GLib.Variant('(s)', (uuid,)), '(b)')[0]
+
+    @staticmethod
+    def is_enabled(info):
+        '''Checks if extension is enabled by its info from `list_extensions`.'''
+        if 'enabled' in info:
+            return bool(info['enabled'])
+
+        return info.get('state') == EXTENSION_STATE_ENABLED
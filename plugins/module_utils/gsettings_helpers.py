@@ -3,276 +3,572 @@
 # Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
 # GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from gi.repository import Gio, GLib
+from ansible_collections.shipilovds.workstation.plugins.module_utils.dconf_helpers import DconfDatabase
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gi_helpers import Gio, GLib
+from ansible_collections.shipilovds.workstation.plugins.module_utils.profile_helpers import PROFILER
+import fnmatch
+import os
 import re
+import struct
+import sys
+
+
+PATH_WILDCARDS = '*?['
+COMPILED_SCHEMAS_FILE = 'gschemas.compiled'
+
+
+class TypeString():
+    '''Class with static methods that helps to walk through GLib.Variant type strings.
+
+    Type strings are described here: https://docs.gtk.org/glib/gvariant-format-strings.html
+    '''
+
+    BASIC_TYPES = 'bynqiuxthdsogv'
+    INTEGER_TYPES = 'ynqiuxth'
+    STRING_TYPES = 'sog'
+
+    @staticmethod
+    def get_end(type_string, start=0):
+        '''Finds the end of a single complete type.
+
+        Args:
+            type_string (str): GLib.Variant type string
+            start (int): Index where the type starts
+
+        Raises:
+            ValueException: If type string is incorrect.
+
+        Returns:
+            int: Index right after the type
+        '''
+        position = start
+        while position < len(type_string) and type_string[position] in 'am':
+            position += 1
+        if position >= len(type_string):
+            raise ValueException(f'Incorrect type string: {type_string}')
+        char = type_string[position]
+        if char in TypeString.BASIC_TYPES:
+            return position + 1
+        if char in '({':
+            closing = ')' if char == '(' else '}'
+            position += 1
+            while position < len(type_string) and type_string[position] != closing:
+                position = TypeString.get_end(type_string, position)
+            if position >= len(type_string):
+                raise ValueException(f'Incorrect type string: {type_string}')
+            return position + 1
+
+        raise ValueException(f'Unsupported type string: {type_string}')
+
+    @staticmethod
+    def get_members(type_string):
+        '''Splits tuple or dict entry type string into its member types.
+
+        Args:
+            type_string (str): Tuple (`(...)`) or dict entry (`{..}`) type string
+
+        Returns:
+            list: Member type strings
+        '''
+        members = []
+        position = 1
+        while position < len(type_string) - 1:
+            end = TypeString.get_end(type_string, position)
+            members.append(type_string[position:end])
+            position = end
+
+        return members
 
 
 class ValueProcessor():
-    '''Class with static methods that helps to convert string object to the type they are really belong to.
+    '''Class with static methods that helps to convert values to the type the Gsettings key expects.
 
     The reason of such strange action is simple:
     Ansible (yaml) does not support tuple in comfortable way of usage.
     Also it doesn't support float type. And sometimes `'true'` really means `True`.
-    It creates some troubles, so I decided to make it simple.
+
+    Conversion is driven by the key type string (e.g. `a(ss)`, `a{sv}`, `(iii)`).
+    Converter function is compiled once per type string and cached (see `get_converter`).
+    Values that cannot be converted are returned as is (`GVariant` will complain about their type).
     '''
 
-    @classmethod
-    def is_float(cls, obj):
-        try:
-            float(obj)
-            return True
-        except Exception:
-            return False
+    INT_PATTERN = re.compile(r'\s*[+-]?\d+\s*')
+    FLOAT_PATTERN = re.compile(r'\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*')
+    BOOL_STRINGS = {'true': True, 'false': False}
 
-    @classmethod
-    def is_int(cls, obj):
-        return obj.isdigit()
+    _converters = {}
 
-    @classmethod
-    def is_bool(cls, obj):
-        return obj.lower() in ('true', 'false')
+    @staticmethod
+    def to_bool(obj):
+        if isinstance(obj, str):
+            return ValueProcessor.BOOL_STRINGS.get(obj.strip().lower(), obj)
+        return obj
 
-    @classmethod
-    def to_bool(cls, string):
-        if string.lower() == 'true':
-            return True
-        elif string.lower() == 'false':
-            return False
+    @staticmethod
+    def to_int(obj):
+        if isinstance(obj, str) and ValueProcessor.INT_PATTERN.fullmatch(obj):
+            return int(obj)
+        return obj
 
     @staticmethod
-    def process_string(obj):
-        '''This method helps to find out if there is another type hidden in the string.
+    def to_float(obj):
+        if isinstance(obj, int) and not isinstance(obj, bool):
+            return float(obj)
+        if isinstance(obj, str) and ValueProcessor.FLOAT_PATTERN.fullmatch(obj):
+            return float(obj)
+        return obj
 
-        Whith this ansible module we can detect strings like this:
-        ```('xkb', 'us')``` as a tuple. This method helps us to do so.
-        Also it helps to detect int, float or boolean represented as string (ansible module args makes string from them)
+    @staticmethod
+    def to_str(obj):
+        if isinstance(obj, (int, float)) and not isinstance(obj, bool):
+            return str(obj)
+        return obj
+
+    @staticmethod
+    def parse_literal(string):
+        '''Parses tuple, list or dict represented as string.
+
+        Items may be quoted or not: `(xkb, us)` and `('xkb', 'us')` are both fine.
+        Nesting is not limited: `[('xkb', 'us'), ('xkb', 'ru')]`.
+        Items are returned as strings - converters take care about their types.
+        Malformed literals (e.g. unbalanced brackets or dict items without a value) are not parsed at all.
 
         Args:
-            obj (str): Sting which might be a tuple or int
+            string (str): String to parse
 
         Returns:
-            (int/float/bool/tuple/str): Depending on detected type
+            tuple/list/dict/str: Parsed value or the string itself if it is not a (well-formed) container
         '''
-        if ValueProcessor.is_int(obj):
-            return int(obj)
-        if ValueProcessor.is_float(obj):
-            return float(obj)
-        if ValueProcessor.is_bool(obj):
-            return ValueProcessor.to_bool(obj)
-        # let's find out if it is a tuple
-        # (it is always only 2 items inside the tuple here. so we will try to find them.)
-        find = re.fullmatch(r'\(\'?([a-z0-9.]+)\'?\,\s?\'?([a-z0-9.]+)\'?\)', obj)
-        if find is not None:
-            return (ValueProcessor.process_string(find.group(1)), ValueProcessor.process_string(find.group(2)))
+        stripped = string.strip()
+        if not stripped or stripped[0] not in '([{':
+            return string
+        try:
+            value, position = ValueProcessor._parse_literal_value(stripped, 0)
+        except ValueError:
+            return string
+        if position != len(stripped):
+            return string
+
+        return value
+
+    @staticmethod
+    def _parse_literal_value(string, position, terminators=',)]}'):
+        '''Parses one value of a literal. Returns the value and the position right after it.
+
+        Bare (unquoted) values end at one of `terminators` (`:` is one of them for dict keys only,
+        so values like `m17n:hi:inscript` are fine everywhere else).
+
+        Raises:
+            ValueError: If the literal is malformed.
+        '''
+        while position < len(string) and string[position].isspace():
+            position += 1
+        if position >= len(string):
+            raise ValueError('Unexpected end of literal')
+        char = string[position]
+        if char in '([{':
+            closing = {'(': ')', '[': ']', '{': '}'}[char]
+            items = []
+            position += 1
+            while True:
+                while position < len(string) and string[position].isspace():
+                    position += 1
+                if position >= len(string):
+                    raise ValueError('Unbalanced literal')
+                if string[position] == closing:
+                    position += 1
+                    break
+                if char == '{':
+                    key, position = ValueProcessor._parse_literal_value(string, position, ',)]}:')
+                    if position >= len(string) or string[position] != ':':
+                        raise ValueError('Dict item without a value')
+                    item_value, position = ValueProcessor._parse_literal_value(string, position + 1)
+                    items.append((key, item_value))
+                else:
+                    item, position = ValueProcessor._parse_literal_value(string, position)
+                    items.append(item)
+                if position < len(string) and string[position] == ',':
+                    position += 1
+                elif position >= len(string) or string[position] != closing:
+                    raise ValueError(f'Unexpected character at {position}')
+            if char == '(':
+                value = tuple(items)
+            elif char == '[':
+                value = items
+            else:
+                value = dict(items)
+        elif char in '\'"':
+            end = position + 1
+            chars = []
+            while end < len(string) and string[end] != char:
+                if string[end] == '\\' and end + 1 < len(string):
+                    end += 1
+                chars.append(string[end])
+                end += 1
+            if end >= len(string):
+                raise ValueError('Unterminated string')
+            value = ''.join(chars)
+            position = end + 1
         else:
-            return obj
+            end = position
+            while end < len(string) and string[end] not in terminators:
+                end += 1
+            value = string[position:end].strip()
+            position = end
+        while position < len(string) and string[position].isspace():
+            position += 1
+
+        return value, position
 
     @staticmethod
-    def process_list(obj):
-        '''This method helps us to detect the type of items in the list and place there the correct ones.
+    def get_converter(type_string):
+        '''Returns (cached) converter function for the type string.
 
         Args:
-            obj (list): List with undetected items
+            type_string (str): GLib.Variant type string
+
+        Raises:
+            ValueException: If type string is incorrect.
 
         Returns:
-            list: Might contain tuples or any other types
+            function: Converter that takes a value and returns converted value
         '''
-        new_list = []
-        for item in obj:
-            if isinstance(item, str):
-                # try to find another type presented as string
-                new_item = ValueProcessor.process_string(item)
-            else:
-                new_item = item
-            new_list.append(new_item)
+        converter = ValueProcessor._converters.get(type_string)
+        if converter is None:
+            converter = ValueProcessor._compile(type_string)
+            ValueProcessor._converters[type_string] = converter
 
-        return new_list
+        return converter
 
     @staticmethod
-    def process_unknown(obj):
-        '''Method that helps to determine the actual value type.
+    def _compile(type_string):
+        '''Builds converter function for the type string (see `get_converter`).'''
+        if TypeString.get_end(type_string) != len(type_string):
+            raise ValueException(f'Incorrect type string: {type_string}')
+        char = type_string[0]
+        if char == 'b':
+            return ValueProcessor.to_bool
+        if char in TypeString.INTEGER_TYPES:
+            return ValueProcessor.to_int
+        if char == 'd':
+            return ValueProcessor.to_float
+        if char in TypeString.STRING_TYPES:
+            return ValueProcessor.to_str
+        if char == 'v':
+            # there is no way to guess the type of variant contents
+            return lambda obj: obj
+        if char == 'm':
+            item_converter = ValueProcessor.get_converter(type_string[1:])
+            return lambda obj: None if obj is None else item_converter(obj)
+        if type_string.startswith('a{'):
+            key_type, value_type = TypeString.get_members(type_string[1:])
+            return ValueProcessor._compile_dict(ValueProcessor.get_converter(key_type), ValueProcessor.get_converter(value_type))
+        if char == 'a':
+            return ValueProcessor._compile_array(ValueProcessor.get_converter(type_string[1:]))
+
+        # tuple
+        converters = [ValueProcessor.get_converter(member) for member in TypeString.get_members(type_string)]
+        return ValueProcessor._compile_tuple(converters)
 
-        String is not always a string. We are going to process it.
-        For the lists we need to determine each item inside.
-        For any other type we do nothing.
+    @staticmethod
+    def _compile_array(item_converter):
+        def convert(obj):
+            if isinstance(obj, str):
+                obj = ValueProcessor.parse_literal(obj)
+            if isinstance(obj, (list, tuple)):
+                return [item_converter(item) for item in obj]
+            return obj
+        return convert
+
+    @staticmethod
+    def _compile_dict(key_converter, value_converter):
+        def convert(obj):
+            if isinstance(obj, str):
+                obj = ValueProcessor.parse_literal(obj)
+            if isinstance(obj, list) and all(isinstance(item, (list, tuple)) and len(item) == 2 for item in obj):
+                obj = dict(obj)
+            if isinstance(obj, dict):
+                return {key_converter(key): value_converter(value) for key, value in obj.items()}
+            return obj
+        return convert
+
+    @staticmethod
+    def _compile_tuple(converters):
+        def convert(obj):
+            if isinstance(obj, str):
+                obj = ValueProcessor.parse_literal(obj)
+            if isinstance(obj, (list, tuple)) and len(obj) == len(converters):
+                return tuple(converter(item) for converter, item in zip(converters, obj))
+            return obj
+        return convert
+
+    @staticmethod
+    def process(obj, type_string):
+        '''Converts value to the type expected by the type string.
 
         Args:
-            obj: Might be a list or eny other possible type
+            obj: Value as it comes from ansible
+            type_string (str): GLib.Variant type string of the key
 
         Returns:
-            Might be a list or tuple or eny other possible type
+            Converted value (might be a list, tuple, dict or any other type)
         '''
-        if isinstance(obj, list):
-            new_obj = ValueProcessor.process_list(obj)
-        elif isinstance(obj, str):
-            new_obj = ValueProcessor.process_string(obj)
-        else:
-            new_obj = obj
-
-        return new_obj
+        return ValueProcessor.get_converter(type_string)(obj)
 
 
 class GVariant():
     '''Class with static methods that helps to produce GLib.Variant
 
-    Main method that uses the others - `get_variant`
+    Main method - `build`. It takes a builder compiled for the type string (see `get_builder`)
+    and serializes the whole value into GVariant binary format in one pass.
+    GLib.Variant is created from these bytes by a single call - no intermediate Variant objects for the items.
+    Values are serialized little-endian (framing offsets are always little-endian) and byteswapped on big-endian hosts.
+    Serialization format: https://developer.gnome.org/documentation/specifications/gvariant-specification-1.0.html
     '''
 
-    VARIANTS = {
-        'G_VARIANT_TYPE_BOOLEAN': {'typestring': 'b', 'classname': 'bool'},
-        'G_VARIANT_TYPE_INT32':   {'typestring': 'i', 'classname': 'int'},
-        'G_VARIANT_TYPE_STRING':  {'typestring': 's', 'classname': 'str'},
-        'G_VARIANT_TYPE_TUPLE':   {'typestring': 'r', 'classname': 'tuple'},
-        'G_VARIANT_TYPE_ARRAY':   {'typestring': 'a', 'classname': 'list'},
-        'G_VARIANT_TYPE_DOUBLE':  {'typestring': 'd', 'classname': 'float'},
+    FIXED_TYPES = {
+        'b': {'format': '<?', 'classname': 'bool'},
+        'y': {'format': '<B', 'classname': 'int'},
+        'n': {'format': '<h', 'classname': 'int'},
+        'q': {'format': '<H', 'classname': 'int'},
+        'i': {'format': '<i', 'classname': 'int'},
+        'u': {'format': '<I', 'classname': 'int'},
+        'x': {'format': '<q', 'classname': 'int'},
+        't': {'format': '<Q', 'classname': 'int'},
+        'h': {'format': '<i', 'classname': 'int'},
+        'd': {'format': '<d', 'classname': 'float'},
     }
 
-    @staticmethod
-    def get_variant_list(value, value_type_string):
-        '''Creates list GLib.Variant and GLib.VariantType objects from value.
-
-        Values inside the list will also be processed (depending on their type) by the corresponding functions.
-        Result - GLib.Variant with 'list' type, with GLib.Variant items inside.
-
-        Args:
-            value (list): List value we need to process with each inner value
-            value_type_string (str): GLib.Variant type string
+    _builders = {}
 
-        Returns:
-            GLib.VariantType
-            GLib.Variant
-        '''
-        variants_list = []
-        result_type = GLib.VariantType.new(value_type_string)
-        child_value_type_string = value_type_string[1:]
-        child_type = GLib.VariantType.new(child_value_type_string)
-        for item in value:
-            _, item_variant = GVariant.get_variant(item, child_value_type_string)
-            variants_list.append(item_variant)
-        result_value = GLib.Variant.new_array(child_type, variants_list)
-        return result_type, result_value
+    @staticmethod
+    def _check_type(value, classname, type_string):
+        '''Raises ValueException if value is not an instance of `classname` type (bool is not an int here).'''
+        provided_type = type(value).__name__
+        if provided_type != classname:
+            raise ValueException(f'Provided value type ({provided_type}) does not match with expected type ({classname}). Expected type string: {type_string}')
 
     @staticmethod
-    def get_variant_tuple(value, value_type_string):
-        '''Creates tuple GLib.Variant and GLib.VariantType objects from value.
+    def _offset_size(body_size, offsets_count):
+        '''Calculates the size of framing offsets for a container.'''
+        for offset_size in (1, 2, 4):
+            if body_size + offset_size * offsets_count <= (1 << (8 * offset_size)) - 1:
+                return offset_size if body_size + offsets_count else 0
 
-        Values inside the tuple will also be processed (depending on their type) by the corresponding functions.
-        Result - GLib.Variant with 'tuple' type, with GLib.Variant items inside.
+        return 8
 
-        Args:
-            value (tuple): Tuple value we need to process
-            value_type_string (str): GLib.Variant type string
+    @staticmethod
+    def _frame(body, offsets):
+        '''Appends framing offsets to the container body.'''
+        offset_size = GVariant._offset_size(len(body), len(offsets))
+        if offset_size == 1:
+            return body + bytes(offsets)
+        return body + b''.join([offset.to_bytes(offset_size, 'little') for offset in offsets])
 
-        Returns:
-            GLib.VariantType
-            GLib.Variant
-        '''
-        types_list = []
-        variants_list = []
-        child_value_type_string = value_type_string[1:]
-        for index, item in enumerate(value):
-            item_type, item_variant = GVariant.get_variant(item, child_value_type_string[index])
-            types_list.append(item_type)
-            variants_list.append(item_variant)
-        result_type = GLib.VariantType.new_tuple(types_list)
-        result_value = GLib.Variant.new_tuple(*variants_list)
-        return result_type, result_value
+    @staticmethod
+    def _guess_type_string(value):
+        '''Guesses type string for the contents of `v` (variant) values.'''
+        if isinstance(value, GLib.Variant):
+            return value.get_type_string()
+        if isinstance(value, bool):
+            return 'b'
+        if isinstance(value, int):
+            return 'i' if -2 ** 31 <= value < 2 ** 31 else 'x'
+        if isinstance(value, float):
+            return 'd'
+        if isinstance(value, str):
+            return 's'
+        if isinstance(value, dict):
+            return 'a{sv}'
+        if isinstance(value, (list, tuple)) and value and all(isinstance(item, str) for item in value):
+            return 'as'
+        if isinstance(value, tuple):
+            return '(' + ''.join(GVariant._guess_type_string(item) for item in value) + ')'
+        if isinstance(value, list):
+            return 'av'
+
+        raise ValueException(f'Cannot guess variant type for value: {value}')
 
     @staticmethod
-    def get_variant_by_type(value, value_type):
-        '''Creates GLib.Variant and GLib.VariantType objects from value and value type
+    def get_builder(type_string):
+        '''Returns (cached) builder for the type string.
 
-        Value types are defined in `GVariant.VARIANTS` (Class manifest constant)
-        More info about it: https://lazka.github.io/pgi-docs/GLib-2.0/classes/VariantType.html#GLib.VariantType
+        Builder is a tuple: (alignment, fixed size or `None`, serialize function).
+        Serialize function takes a value and returns bytes in GVariant serialization format.
 
         Args:
-            value: Value we need to process
-            value_type (str): GLib.Variant type string
+            type_string (str): GLib.Variant type string
 
         Raises:
-            ValueException: If provided value type doesn't match with the expected type.
+            ValueException: If type string is incorrect or unsupported.
 
         Returns:
-            GLib.VariantType
-            GLib.Variant
+            tuple
         '''
-        provided_type = type(value).__name__
-        expected_type = GVariant.VARIANTS[value_type]['classname']
-        if provided_type != expected_type:
-            # if provided_type == 'dict' and expected_type == 'str':  # I saw such cases, so let it be...
-            #     value = str(value)
-            #     # TODO: I can't finish this processing right now. It needs more time.
-            # else:
-            raise ValueException(f'Provided value type ({provided_type}) does not match with expected type ({expected_type})')
-
-        result_type = GLib.VariantType.new(GVariant.VARIANTS[value_type]['typestring'])
-
-        if expected_type == 'bool':
-            result_value = GLib.Variant.new_boolean(value)
-        elif expected_type == 'int':
-            result_value = GLib.Variant.new_int32(value)
-        elif expected_type == 'float':
-            result_value = GLib.Variant.new_double(value)
-        elif expected_type == 'str':
-            result_value = GLib.Variant.new_string(value)
-        return result_type, result_value
+        builder = GVariant._builders.get(type_string)
+        if builder is None:
+            if TypeString.get_end(type_string) != len(type_string):
+                raise ValueException(f'Incorrect type string: {type_string}')
+            builder = GVariant._compile(type_string)
+            GVariant._builders[type_string] = builder
+
+        return builder
 
     @staticmethod
-    def get_simple_variant(value, value_type_string):
-        '''Creates GLib.Variant and GLib.VariantType objects from value and type string
+    def _compile(type_string):
+        '''Builds (alignment, fixed size, serialize function) for the type string.'''
+        char = type_string[0]
+        if char in GVariant.FIXED_TYPES:
+            return GVariant._compile_fixed(type_string)
+        if char in TypeString.STRING_TYPES:
+            return GVariant._compile_string(type_string)
+        if char == 'v':
+            return 8, None, GVariant._serialize_variant
+        if char == 'm':
+            return GVariant._compile_maybe(type_string)
+        if char == 'a':
+            return GVariant._compile_array(type_string)
+
+        return GVariant._compile_tuple(type_string)
 
-        Value type depends on `value_type_string`
+    @staticmethod
+    def _compile_fixed(type_string):
+        packer = struct.Struct(GVariant.FIXED_TYPES[type_string]['format'])
+        classname = GVariant.FIXED_TYPES[type_string]['classname']
+
+        def serialize(value):
+            GVariant._check_type(value, classname, type_string)
+            try:
+                return packer.pack(value)
+            except struct.error:
+                raise ValueException(f'Value {value} is out of range for type \'{type_string}\'')
+        return packer.size, packer.size, serialize
 
-        Args:
-            value: Value we need to process
-            value_type_string (str): GLib.Variant type string
+    @staticmethod
+    def _compile_string(type_string):
+        validate = {'o': GLib.Variant.is_object_path, 'g': GLib.Variant.is_signature}.get(type_string)
 
-        Raises:
-            ValueException: If value type is not supported by method logic.
+        def serialize(value):
+            if type(value) is not str:
+                GVariant._check_type(value, 'str', type_string)
+            if '\0' in value or (validate is not None and not validate(value)):
+                raise ValueException(f'Value \'{value}\' is not valid for type \'{type_string}\'')
+            return value.encode('utf-8', 'strict') + b'\0'
+        return 1, None, serialize
 
-        Returns:
-            GLib.VariantType
-            GLib.Variant
-        '''
-        provided_type = type(value).__name__
-        for data_type in GVariant.VARIANTS:
-            if GVariant.VARIANTS[data_type]['typestring'] == value_type_string:
-                return GVariant.get_variant_by_type(value, data_type)
+    @staticmethod
+    def _serialize_variant(value):
+        if isinstance(value, GLib.Variant):
+            value = value.get_normal_form()
+            if sys.byteorder != 'little':
+                value = value.byteswap()
+            return value.get_data_as_bytes().get_data() + b'\0' + value.get_type_string().encode()
+        type_string = GVariant._guess_type_string(value)
+        _, _, serialize = GVariant.get_builder(type_string)
+        return serialize(value) + b'\0' + type_string.encode()
 
-        # raise error if cannot find supported type string
-        raise ValueException(f'Unsupported value type. Given value: {value} Given value type: {provided_type} Expected type string: {value_type_string}')
+    @staticmethod
+    def _compile_maybe(type_string):
+        alignment, fixed_size, serialize_item = GVariant.get_builder(type_string[1:])
+        suffix = b'' if fixed_size is not None else b'\0'
+
+        def serialize(value):
+            if value is None:
+                return b''
+            return serialize_item(value) + suffix
+        return alignment, None, serialize
+
+    @staticmethod
+    def _compile_array(type_string):
+        item_type_string = type_string[1:]
+        alignment, fixed_size, serialize_item = GVariant.get_builder(item_type_string)
+        is_dict = item_type_string.startswith('{')
+
+        def serialize(value):
+            if is_dict and isinstance(value, dict):
+                value = value.items()
+            elif not isinstance(value, (list, tuple)):
+                raise ValueException(f'Provided value type ({type(value).__name__}) does not match with expected type (list). Expected type string: {type_string}')
+            if fixed_size is not None:
+                return b''.join([serialize_item(item) for item in value])
+            parts = []
+            size = 0
+            offsets = []
+            for item in value:
+                padding = -size % alignment
+                if padding:
+                    parts.append(b'\0' * padding)
+                    size += padding
+                data = serialize_item(item)
+                parts.append(data)
+                size += len(data)
+                offsets.append(size)
+            return GVariant._frame(b''.join(parts), offsets)
+        return alignment, None, serialize
+
+    @staticmethod
+    def _compile_tuple(type_string):
+        members = [GVariant.get_builder(member) for member in TypeString.get_members(type_string)]
+        alignment = max([member[0] for member in members], default=1)
+        fixed_size = None
+        if all(member[1] is not None for member in members):
+            # fixed size tuple: members are placed one by one with alignment (unit tuple takes 1 byte)
+            end = 0
+            for member_alignment, member_size, _ in members:
+                end += -end % member_alignment + member_size
+            fixed_size = end + -end % alignment if end else 1
+        last = len(members) - 1
+
+        def serialize(value):
+            if type(value) not in (list, tuple) or len(value) != len(members):
+                raise ValueException(f'Provided value ({value}) does not match with expected type string ({type_string})')
+            if not members:
+                return b'\0'
+            parts = []
+            size = 0
+            offsets = []
+            for index, (member_alignment, member_size, serialize_member) in enumerate(members):
+                padding = -size % member_alignment
+                if padding:
+                    parts.append(b'\0' * padding)
+                    size += padding
+                data = serialize_member(value[index])
+                parts.append(data)
+                size += len(data)
+                if member_size is None and index != last:
+                    offsets.append(size)
+            if fixed_size is not None:
+                parts.append(b'\0' * (fixed_size - size))
+                return b''.join(parts)
+            return GVariant._frame(b''.join(parts), offsets[::-1])
+        return alignment, fixed_size, serialize
 
     @staticmethod
-    def get_complex_variant(value, value_type_string):
-        '''Helps to get GLib.Variant and GLib.VariantType for complex data types.
+    def build(value, type_string):
+        '''Creates GLib.Variant from value in one call.
 
         Args:
-            value (list/tuple): Accepts value of any type (almost).
+            value: Value (already converted to the correct types, see `ValueProcessor`)
             value_type_string (str): GLib.Variant type string
 
         Raises:
-            ValueException: If value type is not supported by method logic.
+            ValueException: If value does not match with the type string.
 
         Returns:
-            GLib.VariantType
             GLib.Variant
         '''
-        provided_type = type(value).__name__
-        if provided_type == 'list':
-            result_type, result_value = GVariant.get_variant_list(value, value_type_string)
-        elif provided_type == 'tuple':
-            result_type, result_value = GVariant.get_variant_tuple(value, value_type_string)
-        else:
-            raise ValueException(f'Unsupported value type. Given value: {value} Given value type: {provided_type} Expected type string: {value_type_string}')
+        _, _, serialize = GVariant.get_builder(type_string)
+        data = GLib.Bytes.new(serialize(value))
+        variant = GLib.Variant.new_from_bytes(GLib.VariantType.new(type_string), data, False)
+        if sys.byteorder != 'little':
+            variant = variant.byteswap()
 
-        return result_type, result_value
+        return variant
 
     @staticmethod
     def get_variant(value, value_type_string):
         '''Creates GLib.Variant and GLib.VariantType objects from value.
 
-        Uses correcponding functions to process simple and complex data types
-
         Args:
             value: Accepts value of any type (almost).
             value_type_string (str): GLib.Variant type string
@@ -281,12 +577,7 @@ class GVariant():
             GLib.VariantType
             GLib.Variant
         '''
-        if len(value_type_string) > 1:
-            result_type, result_value = GVariant.get_complex_variant(value, value_type_string)
-        else:
-            result_type, result_value = GVariant.get_simple_variant(value, value_type_string)
-
-        return result_type, result_value
+        return GLib.VariantType.new(value_type_string), GVariant.build(value, value_type_string)
 
 
 class SchemaException(Exception):
@@ -299,29 +590,215 @@ class ValueException(Exception):
     pass
 
 
+class GsettingsCache():
+    '''Process-wide cache of Gio.SettingsSchema and Gio.Settings objects.
+
+    Schema lookups and Gio.Settings construction are not free, and the same schema
+    is usually opened many times during one module run (e.g. `org.gnome.shell` for every extension).
+    Objects are cached by (schema ID, schema directories) and by (schema ID, schema path, schema directories). Use `invalidate` to drop them.
+    Objects which come from a rebuilt schema source chain (see `get_source`) are dropped too.
+
+    Schemas are looked up in the default schema source with extra directories (e.g. `schemas` of extensions)
+    chained on top of it, so they do not have to be installed system-wide.
+
+    Attributes:
+        schema_dirs (list): Extra directories with compiled schemas (the last one takes precedence)
+    '''
+
+    schema_dirs = []
+    _schemas = {}
+    _settings = {}
+    _sources = {}
+
+    @classmethod
+    def get_source(cls, schema_dirs=None):
+        '''Returns schema source with extra directories chained on top of the default one.
+
+        Chains are cached by modification times of the compiled schemas, so a directory is reopened only when it changes.
+        Directories without compiled schemas are skipped.
+
+        Args:
+            schema_dirs (:obj:`list`, optional): Directories with compiled schemas (`schema_dirs` attribute by default)
+
+        Returns:
+            Gio.SettingsSchemaSource
+        '''
+        schema_dirs = tuple(cls.schema_dirs if schema_dirs is None else schema_dirs)
+        stamp = []
+        for schema_dir in schema_dirs:
+            try:
+                stamp.append((schema_dir, os.stat(os.path.join(schema_dir, COMPILED_SCHEMAS_FILE)).st_mtime_ns))
+            except OSError:
+                continue
+        source = Gio.SettingsSchemaSource.get_default()
+        if not stamp:
+            return source
+        cached_stamp, chain = cls._sources.get(schema_dirs, (None, None))
+        if cached_stamp != stamp:
+            if cached_stamp is not None:
+                # schemas of the old chain are stale now
+                cls._drop_chain(schema_dirs)
+            chain = source
+            for schema_dir, _ in stamp:
+                try:
+                    chain = Gio.SettingsSchemaSource.new_from_directory(schema_dir, chain, False)
+                except GLib.Error:
+                    # broken compiled schemas must not hide the other ones
+                    continue
+            cls._sources[schema_dirs] = (stamp, chain)
+
+        return chain
+
+    @classmethod
+    def get_schema(cls, schema_id, schema_dirs=None):
+        '''Returns (cached) Gio.SettingsSchema object.
+
+        Args:
+            schema_id (str): The ID of the schema
+            schema_dirs (:obj:`list`, optional): Extra schema directories (see `get_source`)
+
+        Raises:
+            SchemaException: If Gsettings schema does not exist.
+
+        Returns:
+            Gio.SettingsSchema
+        '''
+        cache_key = (schema_id, tuple(cls.schema_dirs if schema_dirs is None else schema_dirs))
+        schema_obj = cls._schemas.get(cache_key)
+        if schema_obj is None:
+            with PROFILER.phase('schema lookup'):
+                source = cls.get_source(cache_key[1])
+                schema_obj = source.lookup(schema_id, True) if source is not None else None
+            if schema_obj is None:
+                raise SchemaException(f'Schema \'{schema_id}\' does not exist')
+            cls._schemas[cache_key] = schema_obj
+
+        return schema_obj
+
+    @classmethod
+    def get_settings(cls, schema_id, schema_path, schema_dirs=None):
+        '''Returns (cached) Gio.Settings object.
+
+        Args:
+            schema_id (str): The ID of the schema
+            schema_path (:obj:`str`, optional): Schema path
+            schema_dirs (:obj:`list`, optional): Extra schema directories (see `get_source`)
+
+        Raises:
+            SchemaException: If Gsettings schema does not exist.
+
+        Returns:
+            Gio.Settings
+        '''
+        schema_dirs = tuple(cls.schema_dirs if schema_dirs is None else schema_dirs)
+        settings_obj = cls._settings.get((schema_id, schema_path, schema_dirs))
+        if settings_obj is None:
+            schema_obj = cls.get_schema(schema_id, schema_dirs)
+            with PROFILER.phase('settings init'):
+                backend = Gio.SettingsBackend.get_default()
+                settings_obj = Gio.Settings.new_full(schema_obj, backend, schema_path)
+            cls._settings[(schema_id, schema_path, schema_dirs)] = settings_obj
+
+        return settings_obj
+
+    @classmethod
+    def invalidate(cls, schema_id=None):
+        '''Drops cached objects.
+
+        Args:
+            schema_id (:obj:`str`, optional): Drop objects of this schema only (for all paths). Drops everything if `None`.
+        '''
+        if schema_id is None:
+            cls._schemas.clear()
+            cls._settings.clear()
+            cls._sources.clear()
+            return
+        for cache_key in [cache_key for cache_key in cls._schemas if cache_key[0] == schema_id]:
+            del cls._schemas[cache_key]
+        for cache_key in [cache_key for cache_key in cls._settings if cache_key[0] == schema_id]:
+            del cls._settings[cache_key]
+
+    @classmethod
+    def _drop_chain(cls, schema_dirs):
+        '''Drops schemas looked up in the chain of these directories (and settings made of them).'''
+        for cache_key in [cache_key for cache_key in cls._schemas if cache_key[1] == schema_dirs]:
+            del cls._schemas[cache_key]
+        for cache_key in [cache_key for cache_key in cls._settings if cache_key[2] == schema_dirs]:
+            del cls._settings[cache_key]
+
+
 class GsettingsWrapper():
     '''Class that helps to operate with Gsettings
 
+    Gio objects are taken from `GsettingsCache`, so it is cheap to create many wrappers for the same schema.
+    With `dconf_db` the value is read from dconf database files directly (without session D-Bus and GIO backend).
+    Gio.Settings object is not created at all until you write something.
+
     Args:
         schema_id (str): The ID of the schema
         schema_path (str): Schema path
         schema_key (str): Schema key to get the value for
+        dconf_db (:obj:`DconfDatabase`, optional): Session-free dconf reader
+        schema_dirs (:obj:`list`, optional): Extra schema directories (`GsettingsCache.schema_dirs` by default)
 
     Attributes:
         schema_id (str): The ID of the schema
         schema_path (str): Schema path
         schema_key (str): Schema key to get the value for
-        value (GLib.Variant): Schema value for `schema_key`
+        value (GLib.Variant): Schema value for `schema_key` (read on first access)
     '''
-    def __init__(self, schema_id, schema_path, schema_key):
+    def __init__(self, schema_id, schema_path, schema_key, dconf_db=None, schema_dirs=None):
         self.schema_id = schema_id
         self.schema_path = self._validate_schema_path(schema_path)
         self.schema_key = schema_key
+        self._schema_dirs = schema_dirs
         self._schema_obj = self._obtain_gio_settings_schema()
-        self._settings_obj = self._obtain_gio_settings()
-        self.value = self.read()
+        self._dconf_db = dconf_db
+        self._settings = None
+        self._value = None
+        self._key_obj = None
+        self._type_string = None
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = self.read()
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def _settings_obj(self):
+        if self._settings is None:
+            self._settings = self._obtain_gio_settings()
+        return self._settings
+
+    @property
+    def key_obj(self):
+        '''Gio.SettingsSchemaKey of the key (resolved once)'''
+        if self._key_obj is None:
+            self._key_obj = self._schema_obj.get_key(self.schema_key)
+        return self._key_obj
+
+    @property
+    def type_string(self):
+        '''GLib.Variant type string of the key (resolved once)'''
+        if self._type_string is None:
+            self._type_string = self.key_obj.get_value_type().dup_string()
+        return self._type_string
+
+    @property
+    def full_key(self):
+        '''Full dconf key of the value (schema path + key name)'''
+        schema_path = self.schema_path or self._schema_obj.get_path()
+        if schema_path is None:
+            raise SchemaException(f'Schema \'{self.schema_id}\' is relocatable. Schema path is required.')
+        return schema_path + self.schema_key
 
-    def _validate_schema_path(self, schema_path):
+    @staticmethod
+    def _validate_schema_path(schema_path):
         '''Method to validate schemas path
 
         Raises:
@@ -329,21 +806,35 @@ class GsettingsWrapper():
         '''
         if schema_path is None:
             return None
+        if any(char in schema_path for char in PATH_WILDCARDS):
+            raise SchemaException(f'Schema path \'{schema_path}\' is a pattern. Expand it first (see GsettingsWrapper.expand).')
         if re.match(r'(\/[a-z]+)+\/', schema_path) is None:
             raise SchemaException(f'Schema path \'{schema_path}\' is incorrect.')
         else:
             return schema_path
 
+    @classmethod
+    def expand(cls, schema_id, schema_path, schema_key, dconf_db=None):
+        '''Creates wrappers for every schema path matching the pattern (see `expand_schema_path`).
+
+        Args:
+            schema_id (str): The ID of the schema
+            schema_path (:obj:`str`, optional): Schema path or pattern (e.g. `/org/gnome/desktop/notifications/application/*/`)
+            schema_key (str): Schema key
+            dconf_db (:obj:`DconfDatabase`, optional): Session-free dconf reader (also used to list directories)
+
+        Returns:
+            list: GsettingsWrapper objects (empty if nothing matches)
+        '''
+        return [cls(schema_id, path, schema_key, dconf_db) for path in expand_schema_path(schema_id, schema_path, dconf_db)]
+
     def _obtain_gio_settings_schema(self):
         '''Method to get Gsettings schema object
 
         Raises:
             SchemaException: If Gsettings schema or schema key does not exist.
         '''
-        source = Gio.SettingsSchemaSource.get_default()
-        schema_obj = source.lookup(self.schema_id, False)
-        if schema_obj is None:
-            raise SchemaException(f'Schema \'{self.schema_id}\' does not exist')
+        schema_obj = GsettingsCache.get_schema(self.schema_id, self._schema_dirs)
         if not schema_obj.has_key(self.schema_key):
             raise SchemaException(f'Key \'{self.schema_key}\' does not exist')
 
@@ -351,19 +842,101 @@ class GsettingsWrapper():
 
     def _obtain_gio_settings(self):
         '''Method to get Gsettings object'''
-        backend = Gio.SettingsBackend.get_default()
-        return Gio.Settings.new_full(self._schema_obj, backend, self.schema_path)
+        return GsettingsCache.get_settings(self.schema_id, self.schema_path, self._schema_dirs)
 
     def read(self):
         '''Read value from Gsettings key.
 
-        Gets GLib.Variant from Gio.Settings.
+        Gets GLib.Variant from Gio.Settings (or from dconf database files if `dconf_db` is set).
         You can decompose it into a native Python object with `unpack()` method.
 
         Returns:
             GLib.Variant
         '''
-        return self._settings_obj.get_value(self.schema_key)
+        with PROFILER.phase('read'):
+            if self._dconf_db is not None:
+                return self._read_dconf_db()
+            return self._settings_obj.get_value(self.schema_key)
+
+    def _read_dconf_db(self):
+        '''Reads value from dconf database files. Falls back to the schema default.'''
+        key_obj = self.key_obj
+        value = self._dconf_db.read(self.full_key)
+        if value is None or not value.is_of_type(key_obj.get_value_type()):
+            # dconf ignores values of the wrong type too
+            return key_obj.get_default_value()
+        return value
+
+    def is_writable(self):
+        '''Checks if the key is writable (is not locked by system administrator).'''
+        if self._dconf_db is not None:
+            return not self._dconf_db.is_locked(self.full_key)
+        return self._settings_obj.is_writable(self.schema_key)
+
+    def to_variant(self, schema_value):
+        '''Converts value into GLib.Variant of the key type and checks the key range.
+
+        Args:
+            schema_value: gsettings value (GLib.Variant is taken as is)
+
+        Raises:
+            ValueException: If schema value does not match the key type or is out of the key range.
+
+        Returns:
+            GLib.Variant
+        '''
+        value_type_string = self.type_string
+        if isinstance(schema_value, GLib.Variant):
+            if schema_value.get_type_string() != value_type_string:
+                raise ValueException(f'Provided value type ({schema_value.get_type_string()}) does not match with expected type ({value_type_string})')
+            variant_value = schema_value
+        else:
+            with PROFILER.phase('coercion'):
+                new_value = ValueProcessor.process(schema_value, value_type_string)
+            with PROFILER.phase('gvariant build'):
+                variant_value = GVariant.build(new_value, value_type_string)
+        with PROFILER.phase('range check'):
+            in_range = self.key_obj.range_check(variant_value)
+        if not in_range:
+            raise ValueException(f'Cannot change value! Value is out of the key range. Value: {variant_value.print_(True)}')
+
+        return variant_value
+
+    def get_variant(self, schema_value):
+        '''Converts value into GLib.Variant of the key type and validates it.
+
+        Args:
+            schema_value: gsettings value (GLib.Variant is taken as is)
+
+        Raises:
+            ValueException: If schema value is not writable or is out of the key range.
+
+        Returns:
+            GLib.Variant
+        '''
+        if not self.is_writable():
+            raise ValueException('Value cannot be changed because it is not writable!')
+
+        return self.to_variant(schema_value)
+
+    def equals(self, variant_value):
+        '''Compares current value with GLib.Variant without unpacking them.
+
+        Values are compared by type and serialized data. Only dictionaries
+        (whose entries might be stored in any order) are unpacked if the data differs.
+
+        Args:
+            variant_value (GLib.Variant): Value to compare with
+
+        Returns:
+            bool
+        '''
+        if self.value.equal(variant_value):
+            return True
+        if '{' in self.type_string and self.value.get_type_string() == variant_value.get_type_string():
+            return self.value.unpack() == variant_value.unpack()
+
+        return False
 
     def write(self, schema_value):
         '''Writes value for Gsettings key.
@@ -374,15 +947,303 @@ class GsettingsWrapper():
         Raises:
             ValueException: If schema value is not writable or cannot be changed.
         '''
-        if not self._settings_obj.is_writable(self.schema_key):
-            raise ValueException('Value cannot be changed because it is not writable!')
-        new_value = ValueProcessor.process_unknown(schema_value)
-        value_type_string = self.value.get_type_string()
-        variant_type, variant_value = GVariant.get_variant(new_value, value_type_string)
+        variant_value = self.get_variant(schema_value)
         changed = self._settings_obj.set_value(self.schema_key, variant_value)
         if changed:
             self._settings_obj.sync()
             self._settings_obj.apply()
             self.value = variant_value
         else:
-            raise ValueException(f'Cannot change value! Check possible values or value type. Value: {new_value} Variant type: {variant_value.dup_string()}')
+            raise ValueException(f'Cannot change value! Check possible values or value type. Value: {variant_value.print_(True)}')
+
+
+class GsettingsTransaction():
+    '''Class that helps to write many Gsettings keys at once.
+
+    Writes are validated when staged. On `commit` they are set on delay-apply Gio.Settings objects
+    (one per schema and path), applied together and flushed to the backend with a single sync.
+    If any write is rejected - nothing is applied, and keys that were already applied get their previous values back
+    (keys which were at their defaults are reset, so they keep following the schema defaults).
+
+    Can be used as a context manager (commits on exit if there was no exception).
+
+    Attributes:
+        staged (list): Staged writes as (GsettingsWrapper, GLib.Variant) tuples
+    '''
+    def __init__(self):
+        self.staged = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def stage(self, gsettings, schema_value):
+        '''Validates and stages value for Gsettings key.
+
+        Args:
+            gsettings (GsettingsWrapper): Key to write
+            schema_value (str): gsettings value
+
+        Raises:
+            ValueException: If schema value is not writable or is out of the key range.
+        '''
+        self.staged.append((gsettings, gsettings.get_variant(schema_value)))
+
+    def _delayed_settings(self, writes):
+        '''Creates delay-apply Gio.Settings objects for every schema and path in `writes`.'''
+        delayed = {}
+        backend = Gio.SettingsBackend.get_default()
+        for gsettings, _ in writes:
+            cache_key = (gsettings.schema_id, gsettings.schema_path)
+            if cache_key not in delayed:
+                settings_obj = Gio.Settings.new_full(gsettings._schema_obj, backend, gsettings.schema_path)
+                settings_obj.delay()
+                delayed[cache_key] = settings_obj
+
+        return delayed
+
+    def _apply(self, writes):
+        '''Sets all values in delay-apply mode and applies them together.
+
+        Args:
+            writes (list): (GsettingsWrapper, GLib.Variant) tuples. Keys with `None` value are reset
+
+        Raises:
+            ValueException: If any value is rejected (nothing is applied in such case).
+        '''
+        delayed = self._delayed_settings(writes)
+        for gsettings, variant_value in writes:
+            settings_obj = delayed[(gsettings.schema_id, gsettings.schema_path)]
+            if variant_value is None:
+                settings_obj.reset(gsettings.schema_key)
+            elif not settings_obj.set_value(gsettings.schema_key, variant_value):
+                for settings_obj in delayed.values():
+                    settings_obj.revert()
+                raise ValueException(f'Cannot change value of \'{gsettings.schema_key}\' key (\'{gsettings.schema_id}\' schema)! Value: {variant_value.print_(True)}')
+        with PROFILER.phase('apply'):
+            for settings_obj in delayed.values():
+                settings_obj.apply()
+        with PROFILER.phase('sync'):
+            Gio.Settings.sync()
+
+    def commit(self):
+        '''Applies all staged writes.
+
+        Raises:
+            ValueException: If any write is rejected. Previous values are restored in such case.
+        '''
+        writes, self.staged = self.staged, []
+        if not writes:
+            return
+        previous = []
+        for gsettings, _ in writes:
+            if gsettings._settings_obj.get_user_value(gsettings.schema_key) is None:
+                # the key is at its default - reset it back instead of writing the default explicitly
+                previous.append((gsettings, None))
+            else:
+                previous.append((gsettings, gsettings.read()))
+        self._apply(writes)
+        rejected = [gsettings for gsettings, variant_value in writes if not gsettings.read().equal(variant_value)]
+        if rejected:
+            self._apply(previous)
+            keys = ', '.join(f'{gsettings.schema_id}.{gsettings.schema_key}' for gsettings in rejected)
+            raise ValueException(f'Backend rejected changes for keys: {keys}. Previous values are restored.')
+        for gsettings, variant_value in writes:
+            gsettings.value = variant_value
+
+
+class DconfTransaction(GsettingsTransaction):
+    '''Transaction which writes keys straight into dconf database file (offline, see `DconfWriter`).
+
+    Writes are validated against the schemas when staged, the same way as for `GsettingsTransaction`.
+    Nothing is written until `commit`, which rewrites the database file once for all the keys.
+    Wrappers should read from the same writer (`dconf_db` argument), so they see the target database.
+
+    Args:
+        writer (DconfWriter): Target database
+
+    Attributes:
+        staged (list): Staged writes as (GsettingsWrapper, GLib.Variant) tuples
+        writer (DconfWriter): Target database
+    '''
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+
+    def commit(self):
+        '''Writes all staged values into the database file.
+
+        Raises:
+            GvdbException: If the database file is corrupted (it is not overwritten then).
+        '''
+        writes, self.staged = self.staged, []
+        if not writes:
+            return
+        with PROFILER.phase('apply'):
+            for gsettings, variant_value in writes:
+                self.writer.write(gsettings.full_key, variant_value)
+        with PROFILER.phase('sync'):
+            self.writer.commit()
+        for gsettings, variant_value in writes:
+            gsettings.value = variant_value
+
+
+def path_pattern(schema_path=None, children_of=None):
+    '''Returns schema path pattern (`children_of` directory means all its children).
+
+    Raises:
+        SchemaException: If both `schema_path` and `children_of` are set.
+    '''
+    if children_of is None:
+        return schema_path
+    if schema_path is not None:
+        raise SchemaException('Schema path and \'children_of\' are mutually exclusive')
+
+    return children_of.rstrip('/') + '/*/'
+
+
+def _schema_children(schema_id, directory, dconf_db=None):
+    '''Returns child names from `<name>-children` key of the parent schema.
+
+    That is how Gnome keeps the list of relocatable schema instances:
+    `org.gnome.desktop.notifications` has `application-children` key for
+    `org.gnome.desktop.notifications.application` schemas at `/org/gnome/desktop/notifications/application/<child>/`.
+    '''
+    if '.' not in schema_id:
+        return []
+    parent_id, name = schema_id.rsplit('.', 1)
+    try:
+        parent_obj = GsettingsCache.get_schema(parent_id)
+    except SchemaException:
+        return []
+    children_key = f'{name}-children'
+    if parent_obj.get_path() is None or parent_obj.get_path() + name + '/' != directory or not parent_obj.has_key(children_key):
+        return []
+    if parent_obj.get_key(children_key).get_value_type().dup_string() != 'as':
+        return []
+
+    return GsettingsWrapper(parent_id, None, children_key, dconf_db).read().unpack()
+
+
+def expand_schema_path(schema_id, schema_path, dconf_db=None):
+    '''Expands schema path pattern into existing schema paths.
+
+    Wildcards (`*`, `?`, `[...]`) match whole path components, e.g. `/org/gnome/desktop/notifications/application/*/`.
+    Children of a directory are taken from dconf directory listing (like `dconf list` does, if dconf is the backend)
+    and from `<name>-children` key of the parent schema (e.g. `application-children`), if there is such a key.
+
+    Args:
+        schema_id (str): The ID of the schema
+        schema_path (:obj:`str`, optional): Schema path or pattern
+        dconf_db (:obj:`DconfDatabase`, optional): dconf database to list directories. Opened on demand if not set
+
+    Raises:
+        SchemaException: If the pattern is incorrect.
+
+    Returns:
+        list: Matching schema paths (sorted). Path without wildcards is returned as is (even if nothing is stored there)
+    '''
+    if schema_path is None or not any(char in schema_path for char in PATH_WILDCARDS):
+        return [schema_path]
+    if not schema_path.startswith('/') or not schema_path.endswith('/') or '//' in schema_path:
+        raise SchemaException(f'Schema path pattern \'{schema_path}\' is incorrect.')
+    if dconf_db is None and DconfDatabase.is_available():
+        dconf_db = DconfDatabase()
+    paths = ['/']
+    for component in schema_path.strip('/').split('/'):
+        if not any(char in component for char in PATH_WILDCARDS):
+            paths = [path + component + '/' for path in paths]
+            continue
+        expanded = []
+        for directory in paths:
+            children = set(_schema_children(schema_id, directory, dconf_db))
+            if dconf_db is not None:
+                children.update(child[:-1] for child in dconf_db.list(directory) if child.endswith('/'))
+            expanded.extend(directory + child + '/' for child in sorted(children) if fnmatch.fnmatchcase(child, component))
+        paths = expanded
+
+    return paths
+
+
+def iterate_settings(settings, dconf_db=None):
+    '''Flattens settings mapping into a sequence of keys.
+
+    Mapping is shaped like `gnome_gsettings` role variable:
+    ```
+    org.gnome.desktop.notifications.application:
+      path: '/org/gnome/desktop/notifications/application/org-gnome-software/'  # optional
+      keys:
+        enable: False
+    ```
+    Path might be a pattern (`/org/gnome/desktop/notifications/application/*/`) or be replaced with
+    `children_of: '/org/gnome/desktop/notifications/application/'`. Keys are yielded for every matching path then
+    (see `expand_schema_path`).
+
+    Args:
+        settings (dict): Schemas with optional `path` (or `children_of`) and `keys` mapping
+        dconf_db (:obj:`DconfDatabase`, optional): dconf database to expand path patterns with
+
+    Raises:
+        SchemaException: If settings mapping is malformed.
+
+    Yields:
+        tuple: (schema_id, schema_path, schema_key, schema_value)
+    '''
+    for schema_id, schema_settings in settings.items():
+        if not isinstance(schema_settings, dict) or not isinstance(schema_settings.get('keys'), dict):
+            raise SchemaException(f'Settings for schema \'{schema_id}\' must be a mapping with \'keys\' mapping inside')
+        pattern = path_pattern(schema_settings.get('path'), schema_settings.get('children_of'))
+        for schema_path in expand_schema_path(schema_id, pattern, dconf_db):
+            for schema_key, schema_value in schema_settings['keys'].items():
+                yield schema_id, schema_path, schema_key, schema_value
+
+
+def read_schema(schema_id, schema_path=None, dconf_db=None):
+    '''Reads all the keys of the schema in one pass.
+
+    Args:
+        schema_id (str): The ID of the schema
+        schema_path (:obj:`str`, optional): Schema path (required for relocatable schemas)
+        dconf_db (:obj:`DconfDatabase`, optional): Read values from dconf database files (without session D-Bus)
+
+    Raises:
+        SchemaException: If schema does not exist, schema path is incorrect or missing.
+
+    Returns:
+        dict: GLib.Variant values by key names (sorted)
+    '''
+    schema_obj = GsettingsCache.get_schema(schema_id)
+    schema_path = GsettingsWrapper._validate_schema_path(schema_path) or schema_obj.get_path()
+    if schema_path is None:
+        raise SchemaException(f'Schema \'{schema_id}\' is relocatable. Schema path is required.')
+    values = {}
+    if dconf_db is None:
+        settings_obj = GsettingsCache.get_settings(schema_id, schema_path)
+        for schema_key in sorted(schema_obj.list_keys()):
+            values[schema_key] = settings_obj.get_value(schema_key)
+        return values
+
+    for schema_key in sorted(schema_obj.list_keys()):
+        key_obj = schema_obj.get_key(schema_key)
+        value = dconf_db.read(schema_path + schema_key)
+        if value is None or not value.is_of_type(key_obj.get_value_type()):
+            # dconf ignores values of the wrong type too
+            value = key_obj.get_default_value()
+        values[schema_key] = value
+
+    return values
+
+
+def to_native(value):
+    '''Makes unpacked GLib.Variant JSON-friendly (tuples become lists, bytestrings - lists of ints).'''
+    if isinstance(value, (list, tuple)):
+        return [to_native(item) for item in value]
+    if isinstance(value, dict):
+        return {item_key: to_native(item) for item_key, item in value.items()}
+    if isinstance(value, bytes):
+        return list(value)
+
+    return value
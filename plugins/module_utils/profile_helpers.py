@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import contextlib
+import io
+import os
+import time
+
+
+PROFILE_ENV = 'SHIPILOVDS_WORKSTATION_PROFILE'
+PROFILE_MODES = ('timings', 'cprofile')
+CPROFILE_LINES = 40
+
+
+class Profiler():
+    '''Per-phase wall and CPU timings collector.
+
+    Disabled profiler costs almost nothing: `phase` returns a shared no-op context manager.
+    Phases might be nested (e.g. `coercion` inside `stage`), their times are accounted separately.
+
+    Attributes:
+        mode (:obj:`str`, optional): `timings`, `cprofile` or `None` if profiling is disabled
+        phases (dict): Accumulated `wall`, `cpu` (seconds) and `calls` by phase name
+    '''
+    _null_phase = contextlib.nullcontext()
+
+    def __init__(self):
+        self.mode = None
+        self.phases = {}
+        self._started = None
+        self._cprofile = None
+
+    def enable(self, mode=None):
+        '''Starts profiling.
+
+        Args:
+            mode (:obj:`str`, optional): `timings` or `cprofile`. Taken from `PROFILE_ENV` env if not set.
+                Profiling stays disabled if there is no mode.
+
+        Raises:
+            ValueError: If mode is unknown.
+        '''
+        mode = mode or os.environ.get(PROFILE_ENV) or None
+        if mode is None:
+            return
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'Unknown profile mode \'{mode}\'. Use one of: {", ".join(PROFILE_MODES)}')
+        self.mode = mode
+        self.phases = {}
+        self._started = (time.perf_counter(), time.process_time())
+        if mode == 'cprofile':
+            import cProfile  # not needed unless the module is profiled
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    def phase(self, name):
+        '''Returns context manager which accounts its body time to the phase.'''
+        if self.mode is None:
+            return self._null_phase
+        return self._measure(name)
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            phase = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            phase['wall'] += time.perf_counter() - wall
+            phase['cpu'] += time.process_time() - cpu
+            phase['calls'] += 1
+
+    def result(self):
+        '''Stops profiling and returns collected data for the module result.
+
+        Returns:
+            dict: `wall` and `cpu` totals, `phases` and `cprofile` (text report, for `cprofile` mode only).
+                `None` if profiling is disabled.
+        '''
+        if self.mode is None:
+            return None
+        profile = {
+            'wall': time.perf_counter() - self._started[0],
+            'cpu': time.process_time() - self._started[1],
+            'phases': self.phases,
+        }
+        if self._cprofile is not None:
+            import pstats
+            self._cprofile.disable()
+            report = io.StringIO()
+            pstats.Stats(self._cprofile, stream=report).sort_stats('cumulative').print_stats(CPROFILE_LINES)
+            profile['cprofile'] = report.getvalue()
+            self._cprofile = None
+
+        return profile
+
+    def report(self, result):
+        '''Adds collected data to the module result as `profile` field (does nothing if profiling is disabled).
+
+        Returns:
+            dict: The same result
+        '''
+        if self.mode is not None:
+            result['profile'] = self.result()
+
+        return result
+
+
+# Shared by the module and its helpers
+PROFILER = Profiler()
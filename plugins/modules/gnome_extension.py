@@ -16,13 +16,15 @@ short_description: Gnome shell extensions management
 description:
   - This module can install or enable/disable gnome shell extensions
   - You can install and then enable module by one task (use both arguments)
-  - You need to reload Gnome Session to make extension enabled.
+  - Extensions known to running Gnome Shell are enabled/disabled live (see 'live')
+  - Reload of Gnome Session is needed only if the shell is not running or does not know the extension yet (e.g. right after 'native' installation)
 version_added: '1.0.0'
 options:
     name:
         description:
           - Extension name (uuid)
-        required: true
+          - Required unless 'extensions' is used
+        required: false
         type: str
     state:
         description:
@@ -42,12 +44,110 @@ options:
           - Module file path or URL (to zip file)
         required: false
         type: path
+    sha256:
+        description:
+          - Expected sha256 of the bundle
+          - Verified bundle is kept in 'bundle_cache' (even if extension is installed already) and installed from there
+        required: false
+        type: str
+    bundle_cache:
+        description:
+          - Directory to keep extension bundles by their sha256 (as '<sha256>.zip')
+        required: false
+        type: path
+        default: '~/.cache/gnome-shell-extension-bundles/'
     force:
         description:
           - Force module installation
+          - Default for the items of 'extensions' list
         required: false
         type: bool
         default: false
+    installer:
+        description:
+          - How to install/uninstall extensions
+          - With 'native' the bundle is extracted into user extensions directory in-process (with 'metadata.json' validation)
+          - With 'cli' the 'gnome-extensions' tool is used
+          - With 'dbus' running Gnome Shell installs extension from extensions.gnome.org ('src' is not needed, user has to confirm installation)
+        required: false
+        type: str
+        choices: [ native, cli, dbus ]
+        default: native
+    live:
+        description:
+          - Enable/disable extensions in running Gnome Shell over D-Bus, so session restart is not needed
+          - Used only if session D-Bus and Gnome Shell are available. Otherwise (or if the shell does not know extension yet) 'enabled-extensions' and 'disabled-extensions' lists are changed
+        required: false
+        type: bool
+        default: true
+    index_cache:
+        description:
+          - JSON file to persist installed extensions index (uuids and their metadata)
+          - Extension directories are rescanned only when their mtime changes
+        required: false
+        type: path
+    extensions:
+        description:
+          - Bulk mode. List of extensions to manage in one module run
+          - Each item is a dict with 'name' (required), 'src' (or 'url'), 'sha256', 'state', 'enabled' and 'force' keys. They mean the same as module options
+          - Installed extensions are discovered once, 'enabled-extensions' and 'disabled-extensions' lists are written (at most) once
+          - Mutually exclusive with 'name', 'src', 'sha256' and 'enabled' ('state' of the module is ignored)
+        required: false
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                  - Extension name (uuid)
+                required: true
+                type: str
+            src:
+                description:
+                  - Module file path or URL (to zip file)
+                required: false
+                type: path
+            url:
+                description:
+                  - Alias of 'src'
+                required: false
+                type: str
+            sha256:
+                description:
+                  - Expected sha256 of the bundle
+                required: false
+                type: str
+            state:
+                description:
+                  - State of installation in the system
+                required: false
+                type: str
+                choices: [ present, absent ]
+                default: present
+            enabled:
+                description:
+                  - Enable module when true / disable when false
+                  - Changes nothing if not set
+                required: false
+                type: bool
+            force:
+                description:
+                  - Force module installation
+                  - Module 'force' is used if not set
+                required: false
+                type: bool
+    profile:
+        description:
+          - Collect per-phase wall and CPU timings and return them as 'profile' field of the result
+          - With 'cprofile' the result also has a cProfile report (top functions by cumulative time) of the module run
+          - Defaults to the value of SHIPILOVDS_WORKSTATION_PROFILE environment variable on the managed host
+        required: false
+        type: str
+        choices: ['timings', 'cprofile']
+notes:
+  - Companion action plugin downloads URL bundles ('http://', 'https://' or 'ftp://' 'src') once on the controller (in parallel, into '${XDG_CACHE_HOME:-~/.cache}/shipilovds.workstation/extension-bundles/'), verifies 'sha256' if it is set and transfers them to the host only if its 'bundle_cache' lacks the bundle
+  - Result has 'live' field set to true if extension has been enabled/disabled live
+  - In bulk mode per-extension results are returned in 'results' (each item has 'name' and 'changed' fields, plus 'operations', 'failed' and 'msg' if any)
+  - Profile phases are 'bus connect', 'index scan', 'lists read', 'bundle cache', 'install' (in-process), 'subprocess' ('cli' installer), 'dbus' and 'lists write' (plus gsettings phases of the lists)
 author:
     - Denis Shipilov (@shipilovds)
 '''
@@ -70,7 +170,13 @@ EXAMPLES = r'''
     src: 'https://extensions.gnome.org/extension-data/night-light-slider.timurlinux.com.v19.shell-extension.zip'
     enabled: True
 
-# And there is a way for a many:
+- name: Ensure that extension is installed from verified bundle
+  gnome_extension:
+    name: "night-light-slider.timurlinux.com"
+    src: 'https://extensions.gnome.org/extension-data/night-light-slider.timurlinux.com.v19.shell-extension.zip'
+    sha256: '0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef'
+
+# And there is a way for a many (one module run for the whole list):
 - set_fact:
     gnome_extensions:
       - name: 'dash-to-panel@jderose9.github.com'
@@ -81,14 +187,8 @@ EXAMPLES = r'''
 
 - name: 'Gnome Extensions : Install and Setup'
   shipilovds.workstation.gnome_extension:
-    name: "{{ item.name }}"
-    src: "{{ item.url | default(omit) }}"
-    enabled: "{{ item.enabled | default(omit) }}"
-    state: "{{ item.state | default(omit) }}"
+    extensions: "{{ gnome_extensions }}"
     force: True
-  loop: "{{ gnome_extensions }}"
-  loop_control:
-    label: "{{ item['name'].split('@')[0] }}"
 '''
 
 RETURN = r''' # '''  # TODO: write RETURN section and create doc generation model for it
@@ -96,19 +196,222 @@ RETURN = r''' # '''  # TODO: write RETURN section and create doc generation mode
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.common.text.converters import to_text
-from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsWrapper
-import yaml
+from ansible_collections.shipilovds.workstation.plugins.module_utils.dconf_helpers import DconfDatabase
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gi_helpers import GLib
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import BundleCache, ExtensionIndex, ExtensionInstaller, ExtensionInstallException
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_shell_helpers import ShellExtensionsBus
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsTransaction, GsettingsWrapper
+from ansible_collections.shipilovds.workstation.plugins.module_utils.profile_helpers import PROFILER
+import os
 import re
-from os import listdir
-from os.path import expanduser, isdir, join
 
-# 'Argument spec' is taken from 'DOCUMENTATION' ('options' block) as the primary source of truth
-ARGS_SPEC = yaml.safe_load(DOCUMENTATION)['options']
+# BEGIN ARGS_SPEC
+# Generated from DOCUMENTATION options by helpers/generate_md_docs.py (make docs). Do not edit by hand.
+ARGS_SPEC = {
+    'name': {'type': 'str', 'required': False},
+    'state': {'type': 'str', 'required': False, 'default': 'present', 'choices': ['present', 'absent']},
+    'enabled': {'type': 'bool', 'required': False},
+    'src': {'type': 'path', 'required': False},
+    'sha256': {'type': 'str', 'required': False},
+    'bundle_cache': {'type': 'path', 'required': False, 'default': '~/.cache/gnome-shell-extension-bundles/'},
+    'force': {'type': 'bool', 'required': False, 'default': False},
+    'installer': {'type': 'str', 'required': False, 'default': 'native', 'choices': ['native', 'cli', 'dbus']},
+    'live': {'type': 'bool', 'required': False, 'default': True},
+    'index_cache': {'type': 'path', 'required': False},
+    'extensions': {'type': 'list', 'required': False, 'elements': 'dict', 'options': {
+        'name': {'type': 'str', 'required': True},
+        'src': {'type': 'path', 'required': False},
+        'url': {'type': 'str', 'required': False},
+        'sha256': {'type': 'str', 'required': False},
+        'state': {'type': 'str', 'required': False, 'default': 'present', 'choices': ['present', 'absent']},
+        'enabled': {'type': 'bool', 'required': False},
+        'force': {'type': 'bool', 'required': False},
+    }},
+    'profile': {'type': 'str', 'required': False, 'choices': ['timings', 'cprofile']},
+}
+# END ARGS_SPEC
 GNOME_EXTENSION_EXECUTABLE = '/usr/bin/gnome-extensions'  # TODO: make this path an option for the module
-GNOME_EXTENSION_DIRS = ['/usr/share/gnome-shell/extensions/', '~/.local/share/gnome-shell/extensions/']
+GNOME_SHELL_SCHEMA = 'org.gnome.shell'
+EXTENSION_ITEM_KEYS = ('name', 'src', 'url', 'sha256', 'state', 'enabled', 'force')
 CHECK_MOD = True
 
 
+class ShellExtensionsState():
+    '''Snapshot of the state of all Gnome Shell Extensions.
+
+    Everything is read lazily and only once per run: installed extensions are taken from `ExtensionIndex`
+    on the first installation check, `enabled-extensions` and `disabled-extensions` lists are read together
+    on the first enabled check. Changes update the snapshot in memory and lists are written (at most) once by `save`.
+    If Gnome Shell is reachable over D-Bus, enabled state is taken from the shell (`ListExtensions`, once)
+    and `save` enables/disables extensions live. The lists are written only for the rest of the changes.
+    It can be shared by many `GnomeExtension` objects.
+
+    Args:
+        dconf_db (:obj:`DconfDatabase`, optional): Read gsettings from dconf database files (without session D-Bus)
+        index_cache (:obj:`str`, optional): File to persist installed extensions index
+        bus (:obj:`ShellExtensionsBus`, optional): Running Gnome Shell client
+
+    Attributes:
+        bus (:obj:`ShellExtensionsBus`, optional): Running Gnome Shell client (`None` if it is not available)
+        live (set): Names (uuids) of extensions which have been enabled/disabled live
+    '''
+    LISTS = {'enabled': 'enabled-extensions', 'disabled': 'disabled-extensions'}
+
+    def __init__(self, dconf_db=None, index_cache=None, bus=None):
+        self._dconf_db = dconf_db
+        self._index_cache = index_cache
+        self._index = None
+        self._gsettings = None
+        self._lists = None
+        self._sets = None
+        self._saved = None
+        self._shell_extensions = None
+        self._pending = {}
+        self.bus = bus
+        self.live = set()
+
+    @property
+    def index(self):
+        '''ExtensionIndex: Installed extensions index (built on first access)'''
+        if self._index is None:
+            with PROFILER.phase('index scan'):
+                self._index = ExtensionIndex(cache_file=self._index_cache)
+
+        return self._index
+
+    def _load_lists(self):
+        '''Reads enabled/disabled lists (only the first time).'''
+        if self._lists is not None:
+            return
+        with PROFILER.phase('lists read'):
+            self._gsettings = {name: GsettingsWrapper(GNOME_SHELL_SCHEMA, None, key, self._dconf_db) for name, key in self.LISTS.items()}
+            # lists keep the order for writing, sets are for lookups
+            self._lists = {name: gsettings.read().unpack() for name, gsettings in self._gsettings.items()}
+        self._sets = {name: set(items) for name, items in self._lists.items()}
+        self._saved = {name: list(items) for name, items in self._lists.items()}
+
+    def is_installed(self, uuid):
+        '''Checks if extension is installed.'''
+        return uuid in self.index
+
+    def update_installed(self, uuid, installed=None):
+        '''Updates installed state of the extension in the snapshot.
+
+        Args:
+            uuid (str): Extension name (uuid)
+            installed (:obj:`bool`, optional): New state. Re-read from extension directories if not set
+        '''
+        if installed is None:
+            with PROFILER.phase('index scan'):
+                self.index.update(uuid)
+        elif installed:
+            self.index.extensions.setdefault(uuid, {'path': None})
+        else:
+            self.index.extensions.pop(uuid, None)
+
+    def shell_info(self, uuid):
+        '''Returns extension info from running Gnome Shell (`None` if the shell does not know the extension).'''
+        if self.bus is None:
+            return None
+        if self._shell_extensions is None:
+            try:
+                with PROFILER.phase('dbus'):
+                    self._shell_extensions = self.bus.list_extensions()
+            except GLib.Error:
+                # the shell has gone - lists are the only source of truth then
+                self.bus = None
+                return None
+
+        return self._shell_extensions.get(uuid)
+
+    def get_enabled(self, uuid):
+        '''Returns `True` if extension is enabled, `False` if disabled and `None` if it is in neither list.
+
+        Running Gnome Shell (if it knows the extension) has priority over the lists.
+        '''
+        info = self.shell_info(uuid)
+        if info is not None:
+            return ShellExtensionsBus.is_enabled(info)
+        self._load_lists()
+        if uuid in self._sets['disabled']:
+            return False
+        if uuid in self._sets['enabled']:
+            return True
+
+        return None
+
+    def set_enabled(self, uuid, enabled):
+        '''Puts extension into enabled or disabled list (in memory) and removes it from another one.
+
+        Args:
+            uuid (str): Extension name (uuid)
+            enabled (:obj:`bool`, optional): `True` to enable, `False` to disable, `None` to remove from both lists
+        '''
+        self._load_lists()
+        for name, wanted in (('enabled', enabled is True), ('disabled', enabled is False)):
+            if wanted and uuid not in self._sets[name]:
+                self._lists[name].append(uuid)
+                self._sets[name].add(uuid)
+            elif not wanted and uuid in self._sets[name]:
+                self._lists[name] = [item for item in self._lists[name] if item != uuid]
+                self._sets[name].discard(uuid)
+        self._pending[uuid] = enabled
+        info = self.shell_info(uuid)
+        if info is not None and enabled is not None:
+            info['enabled'] = enabled
+
+    def mark_saved(self, uuid, enabled):
+        '''Marks enabled state as already persisted (Gnome Shell writes the lists by itself when it is changed live).'''
+        self.set_enabled(uuid, enabled)
+        self._pending.pop(uuid, None)
+        for name, wanted in (('enabled', enabled is True), ('disabled', enabled is False)):
+            if wanted and uuid not in self._saved[name]:
+                self._saved[name].append(uuid)
+            elif not wanted and uuid in self._saved[name]:
+                self._saved[name] = [item for item in self._saved[name] if item != uuid]
+
+    def _apply_live(self):
+        '''Enables/disables extensions known to running Gnome Shell over D-Bus.'''
+        for uuid, enabled in list(self._pending.items()):
+            if enabled is None or self.shell_info(uuid) is None:
+                continue
+            try:
+                with PROFILER.phase('dbus'):
+                    if enabled:
+                        done = self.bus.enable_extension(uuid)
+                    else:
+                        done = self.bus.disable_extension(uuid)
+            except GLib.Error:
+                done = False
+            if done:
+                self.mark_saved(uuid, enabled)
+                self.live.add(uuid)
+
+    def save(self):
+        '''Writes changed enabled/disabled lists (in one gsettings transaction).
+
+        Changes of extensions known to running Gnome Shell are applied live first.
+        Does nothing if the lists have never been read.
+
+        Returns:
+            list: Names of the written lists
+        '''
+        if self._lists is None:
+            return []
+        if self.bus is not None:
+            self._apply_live()
+        written = [name for name in self.LISTS if self._lists[name] != self._saved[name]]
+        if written:
+            with PROFILER.phase('lists write'), GsettingsTransaction() as transaction:
+                for name in written:
+                    transaction.stage(self._gsettings[name], self._lists[name])
+        for name in written:
+            self._saved[name] = list(self._lists[name])
+        self._pending = {}
+
+        return written
+
+
 class GnomeExtension():
     '''Class that helps to operate with Gnome Shell Extension.
 
@@ -118,28 +421,53 @@ class GnomeExtension():
         force (bool): `True` if force installation, `False` if not
         state (str): `present` or `absent`
         enabled (:obj:`bool`, optional): `True` if enabled, `False` if disabled, `None` if not set
+        dconf_db (:obj:`DconfDatabase`, optional): Read gsettings from dconf database files (without session D-Bus)
+        shell_state (:obj:`ShellExtensionsState`, optional): Shared state of all the extensions.
+            Enabled/disabled lists are saved by the owner of the shared state.
+            If not set - extension gets its own state and saves it immediately.
+        index_cache (:obj:`str`, optional): File to persist installed extensions index (if `shell_state` is not set)
+        sha256 (:obj:`str`, optional): Expected bundle hash
+        bundle_cache (:obj:`str`, optional): Directory of bundles cache
+        installer (str): `native` (in-process), `cli` (`gnome-extensions` tool) or `dbus` (running Gnome Shell)
+        bus (:obj:`ShellExtensionsBus`, optional): Running Gnome Shell client (if `shell_state` is not set)
 
     Attributes:
         uuid (str): Extension name (uuid)
         src (:obj:`str`, optional): Path of a bundle (might be None)
+        sha256 (:obj:`str`, optional): Expected bundle hash
+        bundle_cache (BundleCache): Bundles cache
+        installer (:obj:`ExtensionInstaller`, optional): In-process installer (`None` if `cli` or `dbus` is used)
+        installer_type (str): `native`, `cli` or `dbus`
         force (bool): True if force installation
         eventual_state (:obj:`dict` of :obj:`bool`): `installed` key with bool, `enabled` key with bool or `None`
         current_state (:obj:`dict` of :obj:`bool`): `installed` key with bool, `enabled` key with bool or `None`
+        shell_state (ShellExtensionsState): State of all the extensions
         result (:obj:`dict` of :obj:`bool`): Dict with data that ansible module returns
     '''
-    def __init__(self, name, src, force, state, enabled):
+    def __init__(self, name, src, force, state, enabled, dconf_db=None, shell_state=None, index_cache=None, sha256=None, bundle_cache=None, installer='native', bus=None):
         self.uuid = name
         self.src = src
+        self.sha256 = sha256
+        self.bundle_cache = BundleCache(bundle_cache)
+        self.installer = ExtensionInstaller() if installer == 'native' else None
+        self.installer_type = installer
         self.force = force
         self.eventual_state = self._describe_eventual_state(state, enabled)
         self.current_state = {}
         self.result = {}
+        self._save_immediately = shell_state is None
+        self.shell_state = shell_state or ShellExtensionsState(dconf_db, index_cache, bus)
         self._update_current_state()
 
     def _update_current_state(self):
-        ''' Describes current state (looks like self.eventual_state) '''
+        '''Describes current state (looks like self.eventual_state).
+
+        Enabled/disabled lists are not read at all if the task does not care about `enabled`.
+        '''
         installed = self._check_if_installed()
-        enabled = self._check_if_enabled()
+        enabled = None
+        if self.eventual_state['enabled'] is not None:
+            enabled = self._check_if_enabled()
 
         self.current_state = {'installed': installed, 'enabled': enabled}
 
@@ -152,70 +480,23 @@ class GnomeExtension():
 
         return {'installed': installed, 'enabled': enabled}
 
-    def _get_gsetting_value_with_key(self, key):
-        '''Helps to get gsettings value with a key.'''
-        gsettings = GsettingsWrapper('org.gnome.shell', None, key)
-        value = gsettings.read().unpack()
-
-        return value
-
     def _check_if_enabled(self):
         '''Checks if extension is enabled.'''
-        enabled = None
-        if self.uuid in self._get_gsetting_value_with_key('enabled-extensions'):
-            enabled = True
-        if self.uuid in self._get_gsetting_value_with_key('disabled-extensions'):
-            enabled = False
-
-        return enabled
+        return self.shell_state.get_enabled(self.uuid)
 
     def _change_enabled(self):
         ''' Changes 'enabled' state.
 
-        Gets enabled and disabled extensions lists through gsettings.
-        Changes their values according to desired state.
+        Changes enabled and disabled extensions lists (in memory) according to desired state.
         '''
-        enabled = GsettingsWrapper('org.gnome.shell', None, 'enabled-extensions')
-        enabled_list = enabled.read().unpack()
-        disabled = GsettingsWrapper('org.gnome.shell', None, 'disabled-extensions')
-        disabled_list = disabled.read().unpack()
-        if self.eventual_state['enabled'] and self.uuid not in enabled_list:
-            enabled_list.append(self.uuid)
-            operation = 'enable'
-        if self.eventual_state['enabled'] is False and self.uuid not in disabled_list:
-            disabled_list.append(self.uuid)
-            operation = 'disable'
-        if self.uuid in disabled_list:
-            if self.eventual_state['enabled'] is not False:
-                disabled_list.remove(self.uuid)
-        if self.uuid in enabled_list:
-            if self.eventual_state['enabled'] is not True:
-                enabled_list.remove(self.uuid)
-        if self.eventual_state['enabled'] is None:
-            operation = 'flush from enabled/disabled'
+        operations = {True: 'enable', False: 'disable', None: 'flush from enabled/disabled'}
+        self.shell_state.set_enabled(self.uuid, self.eventual_state['enabled'])
 
-        enabled.write(enabled_list)
-        disabled.write(disabled_list)
-        self.result['operations'].update({operation: 'success'})
+        self.result['operations'].update({operations[self.eventual_state['enabled']]: 'success'})
 
     def _check_if_installed(self):
         '''Checks if extension is installed.'''
-        installed = False
-        installed_extensions = []
-        for src in GNOME_EXTENSION_DIRS:
-            try:
-                src = expanduser(src)
-                for item in listdir(src):
-                    if isdir(join(src, item)):
-                        installed_extensions.append(item)
-            except FileNotFoundError:
-                # It means that local user extensions does not exist yet
-                # A little dirty hack: do nothing here
-                pass
-        if self.uuid in installed_extensions:
-            installed = True
-
-        return installed
+        return self.shell_state.is_installed(self.uuid)
 
     def _define_install_cmd(self):
         '''Helps to define install/uninstall command arguments.'''
@@ -234,7 +515,8 @@ class GnomeExtension():
         Does nothing if check_mode.
         '''
         if not ansible_module.check_mode:
-            rc, stdout, stderr = ansible_module.run_command([GNOME_EXTENSION_EXECUTABLE] + operation)
+            with PROFILER.phase('subprocess'):
+                rc, stdout, stderr = ansible_module.run_command([GNOME_EXTENSION_EXECUTABLE] + operation)
             self.result['operations'].update({operation[0]: {}})
             if stdout or stderr:
                 self.result['operations'][operation[0]]['stdout'] = stdout
@@ -245,26 +527,120 @@ class GnomeExtension():
                 msg = f'Gnome Extension Executable Error: {stderr}'
                 self.result.update({'failed': True, 'msg': msg})
 
+    def _run_installer(self, ansible_module):
+        '''Installs/uninstalls extension in-process.
+
+        Does nothing if check_mode.
+        '''
+        if ansible_module.check_mode:
+            return
+        operation = 'install' if self.eventual_state['installed'] else 'uninstall'
+        try:
+            with PROFILER.phase('install'):
+                if self.eventual_state['installed']:
+                    path = self.installer.install(self.src, self.uuid, self.force)
+                else:
+                    self.installer.uninstall(self.uuid)
+            if self.eventual_state['installed']:
+                self.result['operations'][operation] = {'path': path} if path else {'exists': True}
+            else:
+                self.result['operations'][operation] = {'path': os.path.join(self.installer.path, self.uuid)}
+        except ExtensionInstallException as ex:
+            self.result['operations'][operation] = {'error': ex.reason}
+            self.result.update({'failed': True, 'msg': f'Gnome Extension {operation} error: {ex}'})
+        except OSError as ex:
+            self.result['operations'][operation] = {'error': 'os-error'}
+            self.result.update({'failed': True, 'msg': f'Gnome Extension {operation} error: {ex}'})
+
+    def _run_bus(self, ansible_module):
+        '''Installs/uninstalls extension with running Gnome Shell.
+
+        Does nothing if check_mode.
+        '''
+        if ansible_module.check_mode:
+            return
+        operation = 'install' if self.eventual_state['installed'] else 'uninstall'
+        bus = self.shell_state.bus
+        if bus is None:
+            self.result.update({'failed': True, 'msg': f'Cannot {operation} extension over D-Bus: Gnome Shell is not available on session bus'})
+            return
+        try:
+            with PROFILER.phase('dbus'):
+                if self.eventual_state['installed']:
+                    reply = bus.install_remote_extension(self.uuid)
+                    done = reply == 'successful'
+                else:
+                    reply = done = bus.uninstall_extension(self.uuid)
+        except GLib.Error as ex:
+            self.result['operations'][operation] = {'error': ex.message}
+            self.result.update({'failed': True, 'msg': f'Gnome Extension {operation} error: {ex.message}'})
+            return
+        self.result['operations'][operation] = {'reply': reply}
+        if not done:
+            self.result.update({'failed': True, 'msg': f'Gnome Shell has not done extension {operation}: {reply}'})
+        elif self.eventual_state['installed']:
+            # the shell enables just installed extension by itself
+            self.shell_state.mark_saved(self.uuid, True)
+
+    def cache_bundle(self, ansible_module):
+        '''Puts verified bundle (`src` with `sha256`) into the bundle cache.
+
+        It is done even if extension is installed already, so the action plugin finds the bundle
+        in the cache and does not transfer it to the host again.
+        Does nothing if check_mode.
+
+        Args:
+            ansible_module (AnsibleModule): AnsibleModule object
+
+        Returns:
+            bool: `False` if the bundle cannot be used (result is marked as failed)
+        '''
+        if ansible_module.check_mode or not (self.eventual_state['installed'] and self.src and self.sha256):
+            return True
+        if self.current_state['installed'] and os.path.abspath(os.path.expanduser(self.src)) == self.bundle_cache.get_path(self.sha256):
+            # the bundle has been taken from the cache - no need to hash it again
+            return True
+        try:
+            with PROFILER.phase('bundle cache'):
+                self.src = self.bundle_cache.store(self.src, self.sha256)
+        except (OSError, ValueError) as ex:
+            self.result.update({'failed': True, 'msg': f'Cannot use extension bundle: {ex}'})
+            return False
+
+        return True
+
     def change_state(self, ansible_module):
         '''Changes a states of the extension.
 
         Method helps to set enabled/disabled and installed/uninstalled states.
         Removes from enabled/disabled lists if extension is uninstalled.
+        In check mode only the state in memory is changed.
 
         Args:
             ansible_module (AnsibleModule): AnsibleModule object
         '''
-        # TODO: I know - there is a better way to install/enable extension. And without session restart. I'll try it someday...
         self.result['operations'] = {}
+        if not self.cache_bundle(ansible_module):
+            return
         if self.current_state['installed'] != self.eventual_state['installed']:
-            if self.eventual_state['installed'] and self.src is None:
+            if self.eventual_state['installed'] and self.src is None and self.installer_type != 'dbus':
                 msg = 'Extension bundle path (\'src\' parameter) is missing! Cannot install extension without bundle path.'
                 self.result.update({'failed': True, 'msg': msg})
                 return
 
-            self._run_cmd(ansible_module, self._define_install_cmd())
+            if self.installer is not None:
+                self._run_installer(ansible_module)
+            elif self.installer_type == 'dbus':
+                self._run_bus(ansible_module)
+            else:
+                self._run_cmd(ansible_module, self._define_install_cmd())
             if bool(self.result.get('failed')):
                 return
+            if ansible_module.check_mode or self.installer_type == 'dbus':
+                # the shell has reported the result already - no need to look at the disk
+                self.shell_state.update_installed(self.uuid, self.eventual_state['installed'])
+            else:
+                self.shell_state.update_installed(self.uuid)
             self._update_current_state()
             if self.current_state['installed'] == self.eventual_state['installed']:
                 self.result['changed'] = True
@@ -278,25 +654,125 @@ class GnomeExtension():
 
         if self.current_state['enabled'] != self.eventual_state['enabled']:
             self._change_enabled()
+            if self._save_immediately and not ansible_module.check_mode:
+                self.shell_state.save()
+                if self.uuid in self.shell_state.live:
+                    self.result['live'] = True
             self._update_current_state()
             if self.current_state['enabled'] == self.eventual_state['enabled']:
                 self.result['changed'] = True
 
 
+def manage_extensions(ansible_module, extensions, force, dconf_db=None, index_cache=None, bundle_cache=None, installer='native', bus=None):
+    '''Manages a list of extensions in one pass.
+
+    All extensions share one `ShellExtensionsState` snapshot, so installed extensions are discovered once
+    and enabled/disabled lists are read (only if needed) once and written (at most) once at the end.
+
+    Args:
+        ansible_module (AnsibleModule): AnsibleModule object
+        extensions (list): Dicts with `name`, `src` (or `url`), `state`, `enabled` and `force` keys
+        force (bool): Default value for `force`
+        dconf_db (:obj:`DconfDatabase`, optional): Read gsettings from dconf database files (without session D-Bus)
+        index_cache (:obj:`str`, optional): File to persist installed extensions index
+        bundle_cache (:obj:`str`, optional): Directory of bundles cache
+        installer (str): `native` (in-process), `cli` (`gnome-extensions` tool) or `dbus` (running Gnome Shell)
+        bus (:obj:`ShellExtensionsBus`, optional): Running Gnome Shell client
+
+    Returns:
+        list: Per-extension results
+    '''
+    shell_state = ShellExtensionsState(dconf_db, index_cache, bus)
+    results = []
+    for item in extensions:
+        unknown_keys = set(item) - set(EXTENSION_ITEM_KEYS)
+        if 'name' not in item or unknown_keys:
+            results.append({'name': item.get('name'), 'changed': False, 'failed': True, 'msg': f'Extension item must have \'name\' key and might have only {EXTENSION_ITEM_KEYS} keys'})
+            continue
+        extension = GnomeExtension(
+            name=item['name'],
+            src=item.get('src') or item.get('url'),
+            sha256=item.get('sha256'),
+            bundle_cache=bundle_cache,
+            installer=installer,
+            force=force if item.get('force') is None else item['force'],
+            state=item.get('state') or 'present',
+            enabled=item.get('enabled'),
+            shell_state=shell_state,
+        )
+        try:
+            if extension.current_state != extension.eventual_state:
+                extension.change_state(ansible_module)
+            else:
+                extension.cache_bundle(ansible_module)
+        except Exception as ex:
+            extension.result.update({'failed': True, 'msg': str(ex)})
+        results.append(dict({'name': extension.uuid, 'changed': False}, **extension.result))
+
+    if not ansible_module.check_mode:
+        shell_state.save()
+        for result in results:
+            if result['name'] in shell_state.live:
+                result['live'] = True
+
+    return results
+
+
 def main():
-    module = AnsibleModule(argument_spec=ARGS_SPEC, supports_check_mode=CHECK_MOD)
+    module = AnsibleModule(
+        argument_spec=ARGS_SPEC,
+        supports_check_mode=CHECK_MOD,
+        required_one_of=[('name', 'extensions')],
+        mutually_exclusive=[('extensions', 'name'), ('extensions', 'src'), ('extensions', 'sha256'), ('extensions', 'enabled')],
+    )
+    params = dict(module.params)
     try:
-        extension = GnomeExtension(**module.params)
+        PROFILER.enable(params.pop('profile'))
+    except ValueError as ex:
+        module.fail_json(msg=str(ex))
+    dconf_db = None
+    if module.check_mode and DconfDatabase.is_available():
+        # no need in session D-Bus and GIO backend to check the state
+        dconf_db = DconfDatabase()
+
+    extensions = params.pop('extensions')
+    live = params.pop('live')
+    if extensions is not None:
+        toggles = any(isinstance(item, dict) and item.get('enabled') is not None for item in extensions)
+    else:
+        toggles = params['enabled'] is not None
+    bus = None
+    if params['installer'] == 'dbus' or (live and toggles):
+        # session bus (and GIO) is needed only to install over it or to enable/disable extensions live
+        with PROFILER.phase('bus connect'):
+            bus = ShellExtensionsBus.connect()
+    if extensions is not None:
+        result = {'changed': False}
+        try:
+            result['results'] = manage_extensions(module, extensions, params['force'], dconf_db, params['index_cache'], params['bundle_cache'], params['installer'], bus)
+        except Exception as ex:
+            module.fail_json(msg=str(ex), **PROFILER.report(result))
+        result['changed'] = any(item['changed'] for item in result['results'])
+        failed = [item for item in result['results'] if item.get('failed')]
+        if failed:
+            module.fail_json(msg=f'Failed to manage {len(failed)} of {len(result["results"])} extensions', **PROFILER.report(result))
+        module.exit_json(**PROFILER.report(result))
+
+    extension = None
+    try:
+        extension = GnomeExtension(dconf_db=dconf_db, bus=bus, **params)
     except Exception as ex:
-        module.fail_json(msg=str(ex), **extension.result)
+        module.fail_json(msg=str(ex), **PROFILER.report({}))
 
-    if extension.current_state != extension.eventual_state:
-        try:
+    try:
+        if extension.current_state != extension.eventual_state:
             extension.change_state(module)
-        except Exception as ex:
-            module.fail_json(msg=str(ex), **extension.result)
+        else:
+            extension.cache_bundle(module)
+    except Exception as ex:
+        module.fail_json(msg=str(ex), **PROFILER.report(extension.result))
 
-    module.exit_json(**extension.result)
+    module.exit_json(**PROFILER.report(extension.result))
 
 
 if __name__ == '__main__':
@@ -20,24 +20,113 @@ options:
     schema:
         description:
           - The name of the schema for this Gsettings object
-        required: true
+          - Required unless 'settings' is used
+        required: false
         type: str
     path:
         description:
           - The path within the backend where the settings are
           - A valid path begins and ends with '/' and does not contain two consecutive '/' characters.
+          - Might be a pattern with wildcards ('*', '?', '[...]') matching whole path components, e.g. '/org/gnome/desktop/notifications/application/*/'. The keys are set for every matching path
         required: False
         type: str
+    children_of:
+        description:
+          - Set the keys for every child of this directory (the same as 'path' ending with '*/')
+          - Mutually exclusive with 'path'
+        required: false
+        type: str
     key:
         description:
           - Gsettings schema key
-        required: true
+          - Required unless 'settings' is used
+        required: false
         type: str
     value:
         description:
           - Gsettings schema value
-        required: true
+          - Required unless 'settings' is used
+        required: false
         type: raw
+    settings:
+        description:
+          - Batch mode. Mapping of schemas to their (optional) path (or 'children_of') and keys, shaped like the 'gnome_gsettings' role variable
+          - All keys are converged in one module run. Per-key details are returned in 'results'
+          - Mutually exclusive with 'schema', 'path', 'key' and 'value'
+        required: false
+        type: dict
+    schema_dirs:
+        description:
+          - Extra directories with compiled schemas ('gschemas.compiled'). They are searched before the system ones
+        required: false
+        type: list
+        elements: path
+        default: []
+    extension_schemas:
+        description:
+          - Find schemas of installed Gnome Shell extensions in their 'schemas' directories, so they do not have to be installed system-wide
+        required: false
+        type: bool
+        default: true
+    drift_report:
+        description:
+          - Report mode for 'settings'. Nothing is changed, all the keys are compared with their desired values in one pass
+          - Mismatching keys are returned in 'drift' as [schema, path, key, current, desired] items
+        required: false
+        type: bool
+        default: false
+    offline:
+        description:
+          - Write the keys straight into dconf database file, without user session, D-Bus and dconf service (e.g. when building an image or before the first login)
+          - The values are checked against the schemas as usual. Current values are read from the same database
+        required: false
+        type: bool
+        default: false
+    dconf_user:
+        description:
+          - User whose database is written in offline mode (the current user by default)
+          - New database file and directories are given to this user if the module runs as root
+        required: false
+        type: str
+    dconf_profile:
+        description:
+          - dconf profile (name or path) whose first database is written in offline mode. DCONF_PROFILE environment variable or 'user' by default
+          - Locks of system databases from the profile are respected
+        required: false
+        type: str
+    users:
+        description:
+          - Multi-user mode for 'settings'. Apply them to the database of every listed user (offline, see 'offline'), in parallel
+          - Each user is served by its own worker process, which drops privileges to the user first. Per-user results are returned in 'users'
+          - The module must run as root to serve users other than the current one. Mutually exclusive with 'dconf_user'
+        required: false
+        type: list
+        elements: str
+    workers:
+        description:
+          - Number of worker processes in multi-user mode. Number of CPUs by default
+        required: false
+        type: int
+    profile:
+        description:
+          - Collect per-phase wall and CPU timings and return them as 'profile' field of the result
+          - With 'cprofile' the result also has a cProfile report (top functions by cumulative time) of the module run
+          - Defaults to the value of SHIPILOVDS_WORKSTATION_PROFILE environment variable on the managed host
+        required: false
+        type: str
+        choices: ['timings', 'cprofile']
+notes:
+  - In batch mode each item of 'results' has 'schema', 'path', 'key' and 'changed' fields (plus 'failed' and 'msg' if the key was not set)
+  - In check mode current values are read from dconf database files directly, so it does not need a session D-Bus
+  - In batch mode all the keys are validated first and written together. Nothing is written if any of them has failed
+  - Companion action plugin runs batch mode as one remote module call and expands 'results' into loop-like items (with 'item' holding 'schema', 'path', 'key' and 'value'), so there is no need to loop over the keys with 'include_tasks'
+  - Schema directories are opened only if a schema is looked up, and they are reopened only when their compiled schemas change
+  - Path patterns are expanded with dconf directory listing (like 'dconf list', if dconf is the GSettings backend) and with '<name>-children' key of the parent schema, if there is one (e.g. 'application-children' of 'org.gnome.desktop.notifications'). All matching paths are written in one transaction
+  - In report mode ('drift_report') current values are read from dconf database files directly if dconf is the GSettings backend. Keys which cannot be checked are returned in 'results' (with 'failed' and 'msg'), and the module fails
+  - With path pattern (or 'children_of') the result has 'paths' field with changed paths
+  - In multi-user mode ('users') each item of 'users' has 'user' and 'changed' fields plus 'results' (or 'drift' with 'drift_report'), and 'failed' and 'msg' if the user has failed. Extension schemas are looked up in the home directory of every user
+  - In offline mode ('offline') all the keys land in the database file with one write. Other keys of the database are kept. The user should not be logged in, because running dconf service does not notice the new file
+  - Profile phases are 'schema lookup', 'settings init', 'read', 'coercion', 'gvariant build', 'range check', 'stage', 'commit', 'apply' and 'sync'. Some of them are nested ('coercion' is a part of 'stage')
 author:
     - Denis Shipilov (@shipilovds)
 '''
@@ -50,10 +139,10 @@ EXAMPLES = r'''
     key: 'default-folder-viewer'
     value: 'list-view'
 
-### a little more complicated:
-## tasks/main.yml:
-- set_fact:
-    gsettings:
+### batch mode (all keys in one module run):
+- name: "Gsettings : Setup all schemas"
+  shipilovds.workstation.gsettings:
+    settings:
       org.gnome.desktop.wm.keybindings:
         keys:
           switch-input-source: ['<Alt>Shift_L']
@@ -69,21 +158,46 @@ EXAMPLES = r'''
         keys:
           enable: False
 
-- name: Gsettings management
-  include_tasks: gsettings.yml
-  loop: "{{ env_gsettings | dict2items }}"
-  loop_control:
-    loop_var: _schema
-    label: "{{ _schema.key }}"
+### every application (path pattern):
+- name: "Gsettings : Disable notification banners"
+  shipilovds.workstation.gsettings:
+    schema: 'org.gnome.desktop.notifications.application'
+    path: '/org/gnome/desktop/notifications/application/*/'
+    key: 'show-banners'
+    value: False
+
+### image build (no user session):
+- name: "Gsettings : Bake settings into user database"
+  shipilovds.workstation.gsettings:
+    settings: "{{ gnome_gsettings }}"
+    offline: True
+    dconf_user: 'user'
+  become: True
+
+### the same settings for many local users (in parallel, one worker process per user):
+- name: "Gsettings : Setup lab accounts"
+  shipilovds.workstation.gsettings:
+    settings: "{{ gnome_gsettings }}"
+    users: ['student1', 'student2', 'student3']
+  become: True
+  register: _gsettings_users
 
-## tasks/gsettings.yml:
-- name: "Gsettings : Setup '{{ _schema.key }}'"
+### drift report (nothing is changed, mismatching keys only):
+- name: "Gsettings : Show drift"
   shipilovds.workstation.gsettings:
-    schema: "{{ _schema.key }}"
-    path: "{{ _schema.value['path'] | default(omit) }}"
-    key: "{{ item.key }}"
-    value: "{{ item.value }}"
-  loop: "{{ _schema.value['keys'] | dict2items }}"
+    settings: "{{ gnome_gsettings }}"
+    drift_report: True
+  register: _gsettings_drift
+
+### per-key results (companion action plugin makes them look like results of a loop):
+- name: "Gsettings : Setup all schemas"
+  shipilovds.workstation.gsettings:
+    settings: "{{ gnome_gsettings }}"
+  register: _gsettings
+
+- name: "Gsettings : Show changed keys"
+  debug:
+    msg: "{{ _gsettings.results | selectattr('changed') | map(attribute='item.key') | list }}"
 
 '''
 
@@ -91,33 +205,293 @@ RETURN = r''' # '''
 
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsWrapper, ValueProcessor
-import yaml
+from ansible_collections.shipilovds.workstation.plugins.module_utils.dconf_helpers import DconfDatabase, DconfWriter
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import extension_schema_dirs
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import DconfTransaction, GsettingsCache, GsettingsTransaction, GsettingsWrapper, expand_schema_path, iterate_settings, path_pattern, to_native
+from ansible_collections.shipilovds.workstation.plugins.module_utils.profile_helpers import PROFILER
+import os
+import pwd
 
 
-ARGS_SPEC = yaml.safe_load(DOCUMENTATION)['options']
+# BEGIN ARGS_SPEC
+# Generated from DOCUMENTATION options by helpers/generate_md_docs.py (make docs). Do not edit by hand.
+ARGS_SPEC = {
+    'schema': {'type': 'str', 'required': False},
+    'path': {'type': 'str', 'required': False},
+    'children_of': {'type': 'str', 'required': False},
+    'key': {'type': 'str', 'required': False},
+    'value': {'type': 'raw', 'required': False},
+    'settings': {'type': 'dict', 'required': False},
+    'schema_dirs': {'type': 'list', 'required': False, 'default': [], 'elements': 'path'},
+    'extension_schemas': {'type': 'bool', 'required': False, 'default': True},
+    'drift_report': {'type': 'bool', 'required': False, 'default': False},
+    'offline': {'type': 'bool', 'required': False, 'default': False},
+    'dconf_user': {'type': 'str', 'required': False},
+    'dconf_profile': {'type': 'str', 'required': False},
+    'users': {'type': 'list', 'required': False, 'elements': 'str'},
+    'workers': {'type': 'int', 'required': False},
+    'profile': {'type': 'str', 'required': False, 'choices': ['timings', 'cprofile']},
+}
+# END ARGS_SPEC
 CHECK_MOD = True
+# Environment of the module user, which must not leak into workers of other users
+USER_SESSION_ENV = ('XDG_CONFIG_HOME', 'XDG_DATA_HOME', 'XDG_CACHE_HOME', 'XDG_RUNTIME_DIR', 'DBUS_SESSION_BUS_ADDRESS', 'DCONF_PROFILE')
+
+
+def new_transaction(dconf_db=None):
+    '''Returns transaction writing into `dconf_db` if it is a `DconfWriter` (offline mode), or into GSettings backend.'''
+    if isinstance(dconf_db, DconfWriter):
+        return DconfTransaction(dconf_db)
+
+    return GsettingsTransaction()
+
+
+def stage_key(transaction, schema_id, schema_path, schema_key, schema_value, dconf_db=None):
+    '''Stages a single Gsettings key write if current value differs from the desired one.
+
+    Args:
+        transaction (GsettingsTransaction): Transaction to stage the write in
+        schema_id (str): The ID of the schema
+        schema_path (:obj:`str`, optional): Schema path
+        schema_key (str): Schema key
+        schema_value: Desired value (as it comes from ansible)
+        dconf_db (:obj:`DconfDatabase`, optional): Read current value from dconf database files
+
+    Returns:
+        dict: Per-key result with `schema`, `path`, `key` and `changed` fields
+    '''
+    result = {'schema': schema_id, 'path': schema_path, 'key': schema_key, 'changed': False}
+    gsettings = GsettingsWrapper(schema_id, schema_path, schema_key, dconf_db)
+    schema_eventual_value = gsettings.to_variant(schema_value)
+    if not gsettings.equals(schema_eventual_value):
+        transaction.stage(gsettings, schema_eventual_value)
+        result['changed'] = True
+
+    return result
+
+
+def set_keys(settings, check_mode, dconf_db=None):
+    '''Converges all the keys from `settings` mapping in one transaction.
+
+    All the keys are validated first. Nothing is written if any of them has failed.
+
+    Args:
+        settings (dict): Schemas with optional `path` and `keys` (see `iterate_settings`)
+        check_mode (bool): Do not write anything if `True`
+        dconf_db (:obj:`DconfDatabase`, optional): Read current values from dconf database files (and write into them if it is a `DconfWriter`)
+
+    Raises:
+        ValueException: If backend has rejected the changes (previous values are restored in such case)
+
+    Returns:
+        list: Per-key results (see `stage_key`)
+    '''
+    transaction = new_transaction(dconf_db)
+    results = []
+    for schema_id, schema_path, schema_key, schema_value in iterate_settings(settings, dconf_db):
+        try:
+            with PROFILER.phase('stage'):
+                key_result = stage_key(transaction, schema_id, schema_path, schema_key, schema_value, dconf_db)
+        except Exception as ex:
+            key_result = {'schema': schema_id, 'path': schema_path, 'key': schema_key, 'changed': False, 'failed': True, 'msg': str(ex)}
+        results.append(key_result)
+
+    if any(item.get('failed') for item in results):
+        for item in results:
+            item['changed'] = False
+    elif not check_mode:
+        with PROFILER.phase('commit'):
+            transaction.commit()
+
+    return results
+
+
+def report_drift(settings, dconf_db=None):
+    '''Compares all the keys from `settings` mapping with their current values in one pass.
+
+    Args:
+        settings (dict): Schemas with optional `path` and `keys` (see `iterate_settings`)
+        dconf_db (:obj:`DconfDatabase`, optional): Read current values from dconf database files
+
+    Returns:
+        tuple: Mismatching keys as [schema, path, key, current, desired] lists and
+            per-key results of the keys which cannot be checked (see `stage_key`)
+    '''
+    drift = []
+    failed = []
+    for schema_id, schema_path, schema_key, schema_value in iterate_settings(settings, dconf_db):
+        try:
+            with PROFILER.phase('compare'):
+                gsettings = GsettingsWrapper(schema_id, schema_path, schema_key, dconf_db)
+                desired = gsettings.to_variant(schema_value)
+                if gsettings.equals(desired):
+                    continue
+            drift.append([schema_id, schema_path, schema_key, to_native(gsettings.value.unpack()), to_native(desired.unpack())])
+        except Exception as ex:
+            failed.append({'schema': schema_id, 'path': schema_path, 'key': schema_key, 'changed': False, 'failed': True, 'msg': str(ex)})
+
+    return drift, failed
+
+
+def drop_privileges(user):
+    '''Switches the process to the user (with its groups and home directory).
+
+    Args:
+        user (str): User name
+
+    Raises:
+        ValueError: If there is no such user.
+        PermissionError: If the process cannot switch to the user (it is not root).
+    '''
+    try:
+        user_info = pwd.getpwnam(user)
+    except KeyError:
+        raise ValueError(f'User \'{user}\' does not exist')
+    if os.geteuid() != user_info.pw_uid:
+        if os.geteuid() != 0:
+            raise PermissionError(f'Cannot switch to user \'{user}\': module must run as root')
+        os.setgroups(os.getgrouplist(user, user_info.pw_gid))
+        os.setgid(user_info.pw_gid)
+        os.setuid(user_info.pw_uid)
+    for name in USER_SESSION_ENV:
+        os.environ.pop(name, None)
+    os.environ.update(HOME=user_info.pw_dir, USER=user, LOGNAME=user)
+
+
+def converge_user(job):
+    '''Worker of multi-user mode. Applies (or reports) settings for one user.
+
+    Runs in its own process, because privileges are dropped for good.
+
+    Args:
+        job (tuple): User name, module params and check mode flag
+
+    Returns:
+        dict: Per-user result with `user`, `changed` and `results` (or `drift`) fields (plus `failed` and `msg` on failure)
+    '''
+    user, params, check_mode = job
+    user_result = {'user': user, 'changed': False}
+    try:
+        drop_privileges(user)
+        GsettingsCache.schema_dirs = (extension_schema_dirs() if params['extension_schemas'] else []) + params['schema_dirs']
+        dconf_db = DconfWriter(params['dconf_profile'], user)
+        if params['drift_report']:
+            user_result['drift'], failed = report_drift(params['settings'], dconf_db)
+            if failed:
+                user_result['results'] = failed
+                user_result.update(failed=True, msg=f'Failed to check {len(failed)} keys')
+        else:
+            user_result['results'] = set_keys(params['settings'], check_mode, dconf_db)
+            user_result['changed'] = any(item['changed'] for item in user_result['results'])
+            failed = [item for item in user_result['results'] if item.get('failed')]
+            if failed:
+                user_result.update(failed=True, msg=f'Failed to set {len(failed)} of {len(user_result["results"])} keys. Nothing has been changed.')
+    except Exception as ex:
+        user_result.update(failed=True, msg=str(ex))
+
+    return user_result
+
+
+def converge_users(users, params, check_mode, workers=None):
+    '''Applies settings for every user in a pool of worker processes (one process per user).
+
+    Workers are forked before GI is loaded, and every worker serves one user only (privileges cannot be restored).
+
+    Args:
+        users (list): User names
+        params (dict): Module params (`settings`, `drift_report`, `dconf_profile`, `schema_dirs` and `extension_schemas` are used)
+        check_mode (bool): Do not write anything if `True`
+        workers (:obj:`int`, optional): Number of worker processes (number of CPUs by default)
+
+    Returns:
+        list: Per-user results (see `converge_user`) in the order of `users`
+    '''
+    import multiprocessing  # not needed (and not imported) in other modes
+
+    users = list(dict.fromkeys(users))
+    if not users:
+        return []
+    processes = min(workers or os.cpu_count() or 1, len(users))
+    jobs = [(user, params, check_mode) for user in users]
+    with multiprocessing.get_context('fork').Pool(processes, maxtasksperchild=1) as pool:
+        return pool.map(converge_user, jobs, chunksize=1)
 
 
 def main():
-    module = AnsibleModule(argument_spec=ARGS_SPEC, supports_check_mode=CHECK_MOD)
-    schema_id = module.params.get('schema')
-    schema_key = module.params.get('key')
-    schema_path = module.params.get('path')
-    schema_eventual_value = ValueProcessor.process_unknown(module.params.get('value'))
+    module = AnsibleModule(
+        argument_spec=ARGS_SPEC,
+        supports_check_mode=CHECK_MOD,
+        required_one_of=[('key', 'settings')],
+        mutually_exclusive=[('settings', 'schema'), ('settings', 'path'), ('settings', 'children_of'), ('settings', 'key'), ('settings', 'value'), ('path', 'children_of'), ('users', 'dconf_user')],
+        required_by={'key': ('schema', 'value'), 'users': ('settings',)},
+        required_if=[('drift_report', True, ('settings',))],
+    )
     result = {'changed': False}
     try:
-        gsettings = GsettingsWrapper(schema_id, schema_path, schema_key)
-    except Exception as ex:
+        PROFILER.enable(module.params.get('profile'))
+    except ValueError as ex:
         module.fail_json(msg=str(ex), **result)
-    if gsettings.value.unpack() != schema_eventual_value and not module.check_mode:
+    if module.params['users'] is not None:
+        if module.params['workers'] is not None and module.params['workers'] < 1:
+            module.fail_json(msg='workers must be a positive number', **result)
+        with PROFILER.phase('users'):
+            result['users'] = converge_users(module.params['users'], module.params, module.check_mode, module.params['workers'])
+        result['changed'] = any(user_result['changed'] for user_result in result['users'])
+        failed = [user_result['user'] for user_result in result['users'] if user_result.get('failed')]
+        if failed:
+            module.fail_json(msg=f'Failed for {len(failed)} of {len(result["users"])} users: {", ".join(failed)}', **PROFILER.report(result))
+        module.exit_json(**PROFILER.report(result))
+    GsettingsCache.schema_dirs = (extension_schema_dirs() if module.params['extension_schemas'] else []) + module.params['schema_dirs']
+    dconf_db = None
+    try:
+        if module.params['offline']:
+            dconf_db = DconfWriter(module.params['dconf_profile'], module.params['dconf_user'])
+        elif (module.check_mode or module.params['drift_report']) and DconfDatabase.is_available():
+            # no need in session D-Bus and GIO backend to check the values
+            dconf_db = DconfDatabase()
+    except Exception as ex:
+        module.fail_json(msg=f'Cannot open dconf database: {ex}', **result)
+    settings = module.params.get('settings')
+    if module.params['drift_report']:
         try:
-            gsettings.write(schema_eventual_value)
-            result['changed'] = True
+            result['drift'], failed = report_drift(settings, dconf_db)
         except Exception as ex:
-            module.fail_json(msg=str(ex), **result)
+            module.fail_json(msg=str(ex), **PROFILER.report(result))
+        if failed:
+            result['results'] = failed
+            module.fail_json(msg=f'Failed to check {len(failed)} keys', **PROFILER.report(result))
+        module.exit_json(**PROFILER.report(result))
+    if settings is not None:
+        try:
+            result['results'] = set_keys(settings, module.check_mode, dconf_db)
+        except Exception as ex:
+            module.fail_json(msg=str(ex), **PROFILER.report(result))
+        result['changed'] = any(item['changed'] for item in result['results'])
+        failed = [item for item in result['results'] if item.get('failed')]
+        if failed:
+            module.fail_json(msg=f'Failed to set {len(failed)} of {len(result["results"])} keys. Nothing has been changed.', **PROFILER.report(result))
+        module.exit_json(**PROFILER.report(result))
+
+    transaction = new_transaction(dconf_db)
+    try:
+        schema_id = module.params.get('schema')
+        pattern = path_pattern(module.params.get('path'), module.params.get('children_of'))
+        schema_paths = expand_schema_path(schema_id, pattern, dconf_db)
+        with PROFILER.phase('stage'):
+            key_results = [
+                stage_key(transaction, schema_id, schema_path, module.params.get('key'), module.params.get('value'), dconf_db)
+                for schema_path in schema_paths
+            ]
+        if not module.check_mode:
+            with PROFILER.phase('commit'):
+                transaction.commit()
+    except Exception as ex:
+        module.fail_json(msg=str(ex), **PROFILER.report(result))
+    result['changed'] = any(key_result['changed'] for key_result in key_results)
+    if schema_paths != [pattern]:
+        result['paths'] = [key_result['path'] for key_result in key_results if key_result['changed']]
 
-    module.exit_json(**result)
+    module.exit_json(**PROFILER.report(result))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Make coding more python3-ish, this is required for contributions to Ansible
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+DOCUMENTATION = r'''
+---
+module: gsettings_facts
+short_description: Gnome applications settings facts
+description:
+  - Reads all the keys of given schemas in one pass and returns them as 'gsettings' fact
+  - Fact is shaped like 'settings' option of gsettings module (and 'gnome_gsettings' role variable) plus key types
+version_added: '1.1.0'
+options:
+    schemas:
+        description:
+          - Schemas to read
+          - Each item is a schema ID or a dict with 'schema' and 'path' keys (path is required for relocatable schemas)
+        required: true
+        type: list
+        elements: raw
+    cache:
+        description:
+          - JSON file to cache the fact on the host
+          - Cache is valid while dconf database files and compiled schemas in use are not changed (their mtimes are the same) and the same schemas are requested, so repeated gathering costs just a few 'stat' calls
+          - Caching works only if dconf is the GSettings backend
+        required: false
+        type: path
+        default: '~/.cache/ansible-gsettings-facts.json'
+    schema_dirs:
+        description:
+          - Extra directories with compiled schemas ('gschemas.compiled'). They are searched before the system ones
+        required: false
+        type: list
+        elements: path
+        default: []
+    extension_schemas:
+        description:
+          - Find schemas of installed Gnome Shell extensions in their 'schemas' directories, so they do not have to be installed system-wide
+        required: false
+        type: bool
+        default: true
+notes:
+  - Values are read from dconf database files directly if dconf is the GSettings backend, so it does not need a session D-Bus
+  - Relocatable schemas are returned as '<schema>:<path>' items (like gsettings tool takes them)
+  - Each 'gsettings' item has 'path', 'keys' (values) and 'types' (GVariant type strings of the keys) fields
+author:
+    - Denis Shipilov (@shipilovds)
+'''
+
+EXAMPLES = r'''
+- name: "Gsettings : Gather facts"
+  shipilovds.workstation.gsettings_facts:
+    schemas:
+      - 'org.gnome.desktop.interface'
+      - schema: 'org.gnome.desktop.notifications.application'
+        path: '/org/gnome/desktop/notifications/application/org-gnome-software/'
+
+- debug:
+    msg: "{{ ansible_facts.gsettings['org.gnome.desktop.interface']['keys']['gtk-theme'] }}"
+'''
+
+RETURN = r''' # '''
+
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.shipilovds.workstation.plugins.module_utils.dconf_helpers import DconfDatabase
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import COMPILED_SCHEMAS_FILE, extension_schema_dirs
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsCache, read_schema, to_native
+import json
+import os
+
+
+# BEGIN ARGS_SPEC
+# Generated from DOCUMENTATION options by helpers/generate_md_docs.py (make docs). Do not edit by hand.
+ARGS_SPEC = {
+    'schemas': {'type': 'list', 'required': True, 'elements': 'raw'},
+    'cache': {'type': 'path', 'required': False, 'default': '~/.cache/ansible-gsettings-facts.json'},
+    'schema_dirs': {'type': 'list', 'required': False, 'default': [], 'elements': 'path'},
+    'extension_schemas': {'type': 'bool', 'required': False, 'default': True},
+}
+# END ARGS_SPEC
+CHECK_MOD = True
+
+
+def files_stamp(paths):
+    '''Returns mtimes of the files (missing files have `None`).'''
+    stamp = []
+    for path in paths:
+        try:
+            stamp.append([path, os.stat(path).st_mtime_ns])
+        except FileNotFoundError:
+            stamp.append([path, None])
+
+    return stamp
+
+
+def schema_dirs_in_use():
+    '''Returns directories of compiled schemas the same way GIO looks for them, plus `GsettingsCache.schema_dirs`.'''
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    data_dirs = (os.environ.get('XDG_DATA_DIRS') or '/usr/local/share/:/usr/share/').split(':')
+    schema_dirs = [os.path.join(data_dir, 'glib-2.0', 'schemas') for data_dir in [data_home] + data_dirs if data_dir]
+    schema_dirs.extend(schema_dir for schema_dir in os.environ.get('GSETTINGS_SCHEMA_DIR', '').split(os.pathsep) if schema_dir)
+
+    return schema_dirs + list(GsettingsCache.schema_dirs)
+
+
+def cache_stamp(requested):
+    '''Returns the state the cache is valid for: mtimes of dconf databases and compiled schemas, requested schemas.'''
+    return {
+        'dconf': files_stamp(db_path for _, db_path in DconfDatabase.db_paths()),
+        'schemas': files_stamp(os.path.join(schema_dir, COMPILED_SCHEMAS_FILE) for schema_dir in schema_dirs_in_use()),
+        'requested': [name for name, _, _ in requested],
+    }
+
+
+def load_cache(cache_file, stamp):
+    '''Returns cached schemas if the cache is still valid (empty dict otherwise).'''
+    try:
+        with open(cache_file, 'r') as cache:
+            content = json.load(cache)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(content, dict) or content.get('stamp') != stamp or not isinstance(content.get('schemas'), dict):
+        return {}
+
+    return content['schemas']
+
+
+def save_cache(cache_file, stamp, schemas):
+    '''Persists schemas (atomically). Cache is optional - errors are ignored.'''
+    try:
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+        tmp_file = f'{cache_file}.tmp'
+        with open(tmp_file, 'w') as cache:
+            json.dump({'stamp': stamp, 'schemas': schemas}, cache)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+
+def describe_schema(item):
+    '''Parses `schemas` item.
+
+    Returns:
+        tuple: (fact name, schema ID, schema path)
+    '''
+    if isinstance(item, str):
+        return item, item, None
+    if isinstance(item, dict) and isinstance(item.get('schema'), str):
+        schema_path = item.get('path')
+        name = f'{item["schema"]}:{schema_path}' if schema_path else item['schema']
+        return name, item['schema'], schema_path
+
+    raise ValueError(f'Schema item must be a schema ID or a dict with \'schema\' and \'path\' keys: {item!r}')
+
+
+def read_facts(schema_id, schema_path, dconf_db=None):
+    '''Reads the schema into fact item (`path`, `keys` and `types`).'''
+    values = read_schema(schema_id, schema_path, dconf_db)
+
+    return {
+        'path': schema_path,
+        'keys': {schema_key: to_native(value.unpack()) for schema_key, value in values.items()},
+        'types': {schema_key: value.get_type_string() for schema_key, value in values.items()},
+    }
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=ARGS_SPEC,
+        supports_check_mode=CHECK_MOD,
+    )
+    result = {'changed': False, 'cached': False}
+    try:
+        requested = [describe_schema(item) for item in module.params['schemas']]
+    except ValueError as ex:
+        module.fail_json(msg=str(ex), **result)
+
+    GsettingsCache.schema_dirs = (extension_schema_dirs() if module.params['extension_schemas'] else []) + module.params['schema_dirs']
+    dconf_db = None
+    cache_file = None
+    stamp = None
+    cached = {}
+    if DconfDatabase.is_available():
+        dconf_db = DconfDatabase()
+        cache_file = module.params['cache']
+        stamp = cache_stamp(requested)
+        cached = load_cache(cache_file, stamp)
+
+    facts = {}
+    missing = False
+    for name, schema_id, schema_path in requested:
+        if name in cached:
+            facts[name] = cached[name]
+            continue
+        missing = True
+        try:
+            facts[name] = read_facts(schema_id, schema_path, dconf_db)
+        except Exception as ex:
+            module.fail_json(msg=f'Failed to read schema \'{name}\': {ex}', **result)
+    if cache_file is not None and missing:
+        save_cache(cache_file, stamp, dict(cached, **facts))
+    result['cached'] = cache_file is not None and not missing
+
+    module.exit_json(ansible_facts={'gsettings': facts}, **result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Make coding more python3-ish, this is required for contributions to Ansible
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+DOCUMENTATION = r'''
+---
+module: gsettings_schemas
+short_description: Gnome Shell Extensions gschemas installation
+description:
+  - Installs gschemas of Gnome Shell Extensions into global schemas directory and compiles them
+  - Schemas are compared with installed ones by content hash, only the changed ones are copied
+  - Schemas are compiled once and only if anything has been changed
+  - Schemas are compiled also if 'gschemas.compiled' is missing or older than any installed schema (e.g. previous compilation has failed)
+version_added: '1.1.0'
+options:
+    src:
+        description:
+          - Directories with Gnome Shell Extensions
+          - Every '<extension>/schemas/*.xml' file is installed
+        required: false
+        type: list
+        elements: path
+        default: [ '~/.local/share/gnome-shell/extensions/' ]
+    dest:
+        description:
+          - Global schemas directory
+        required: false
+        type: path
+        default: '/usr/share/glib-2.0/schemas/'
+    compile:
+        description:
+          - Run 'glib-compile-schemas' for 'dest' if any schema has been changed (or compiled schemas are stale)
+        required: false
+        type: bool
+        default: true
+notes:
+  - Changed schema file names are returned in 'schemas', 'compiled' is true if schemas have been compiled
+  - If a few extensions have the schema with the same file name - the last one wins
+author:
+    - Denis Shipilov (@shipilovds)
+'''
+
+EXAMPLES = r'''
+- name: 'Gnome Extensions : Ensure that gschemas are installed'
+  shipilovds.workstation.gsettings_schemas:
+    src: "{{ ansible_env.HOME }}/.local/share/gnome-shell/extensions/"
+  become: True
+'''
+
+RETURN = r''' # '''
+
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import COMPILED_SCHEMAS_FILE, file_sha256
+import glob
+import os
+import shutil
+
+
+# BEGIN ARGS_SPEC
+# Generated from DOCUMENTATION options by helpers/generate_md_docs.py (make docs). Do not edit by hand.
+ARGS_SPEC = {
+    'src': {'type': 'list', 'required': False, 'default': ['~/.local/share/gnome-shell/extensions/'], 'elements': 'path'},
+    'dest': {'type': 'path', 'required': False, 'default': '/usr/share/glib-2.0/schemas/'},
+    'compile': {'type': 'bool', 'required': False, 'default': True},
+}
+# END ARGS_SPEC
+CHECK_MOD = True
+SCHEMA_FILES_PATTERN = '*/schemas/*.xml'
+
+
+def find_schemas(src_dirs):
+    '''Discovers extension schemas.
+
+    Args:
+        src_dirs (list): Extension directories
+
+    Returns:
+        dict: Schema file path by file name
+    '''
+    schemas = {}
+    for src in src_dirs:
+        for path in sorted(glob.glob(os.path.join(glob.escape(os.path.expanduser(src)), SCHEMA_FILES_PATTERN))):
+            schemas[os.path.basename(path)] = path
+
+    return schemas
+
+
+def is_changed(src, dest):
+    '''Checks if the installed schema differs from the source one (size first, then content hash).'''
+    try:
+        if os.path.getsize(src) != os.path.getsize(dest):
+            return True
+    except FileNotFoundError:
+        return True
+
+    return file_sha256(src) != file_sha256(dest)
+
+
+def is_stale(dest):
+    '''Checks if compiled schemas are missing or older than any installed schema (e.g. compilation has failed).'''
+    mtimes = [os.stat(path).st_mtime_ns for path in glob.glob(os.path.join(glob.escape(dest), '*.xml'))]
+    if not mtimes:
+        return False
+    try:
+        return os.stat(os.path.join(dest, COMPILED_SCHEMAS_FILE)).st_mtime_ns < max(mtimes)
+    except FileNotFoundError:
+        return True
+
+
+def install_schema(src, dest):
+    '''Copies the schema atomically (readable by everyone).'''
+    tmp_file = os.path.join(os.path.dirname(dest), f'.{os.path.basename(dest)}.tmp')
+    shutil.copyfile(src, tmp_file)
+    os.chmod(tmp_file, 0o644)
+    os.replace(tmp_file, dest)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=ARGS_SPEC,
+        supports_check_mode=CHECK_MOD,
+    )
+    dest = module.params['dest']
+    result = {'changed': False, 'schemas': [], 'compiled': False}
+
+    schemas = find_schemas(module.params['src'])
+    changed = [name for name, path in schemas.items() if is_changed(path, os.path.join(dest, name))]
+    stale = module.params['compile'] and is_stale(dest)
+    result['schemas'] = changed
+    result['changed'] = bool(changed) or stale
+    if not result['changed'] or module.check_mode:
+        module.exit_json(**result)
+
+    try:
+        os.makedirs(dest, exist_ok=True)
+        for name in changed:
+            install_schema(schemas[name], os.path.join(dest, name))
+    except OSError as ex:
+        module.fail_json(msg=f'Failed to install schema: {ex}', **result)
+
+    if module.params['compile']:
+        compiler = module.get_bin_path('glib-compile-schemas', required=True)
+        rc, stdout, stderr = module.run_command([compiler, dest])
+        if rc != 0:
+            module.fail_json(msg=f'glib-compile-schemas error: {stderr}', rc=rc, stdout=stdout, stderr=stderr, **result)
+        result['compiled'] = True
+
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,9 +19,20 @@ extra_files = [
 ]
 
 py_files = [
+    'gsettings_agent',  # not a part of the collection (see console_scripts)
+    collection_path + '/plugins/action/gnome_extension',
+    collection_path + '/plugins/action/gsettings',
+    collection_path + '/plugins/callback/workstation_profile',
+    collection_path + '/plugins/module_utils/dconf_helpers',
+    collection_path + '/plugins/module_utils/gi_helpers',
+    collection_path + '/plugins/module_utils/gnome_extension_helpers',
+    collection_path + '/plugins/module_utils/gnome_shell_helpers',
     collection_path + '/plugins/module_utils/gsettings_helpers',
+    collection_path + '/plugins/module_utils/profile_helpers',
     collection_path + '/plugins/modules/gnome_extension',
-    collection_path + '/plugins/modules/gsettings'
+    collection_path + '/plugins/modules/gsettings',
+    collection_path + '/plugins/modules/gsettings_facts',
+    collection_path + '/plugins/modules/gsettings_schemas'
 ]
 
 
@@ -57,6 +68,11 @@ setup(
     long_description_content_type='text/markdown',
     py_modules=py_files,
     cmdclass={"build_py": BuildCommand},
+    entry_points={
+        'console_scripts': [
+            'gsettings-agent = gsettings_agent:main',
+        ],
+    },
     install_requires=[
         'ansible-core>=2.12.0',
     ],
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import os
+import sys
+
+
+# `ansible_collections/shipilovds/workstation/plugins` is a symlink to `plugins`,
+# so the collection is importable from the project root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# tests must never touch settings of the user running them
+os.environ['GSETTINGS_BACKEND'] = 'memory'
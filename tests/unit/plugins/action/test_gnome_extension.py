@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.action.gnome_extension import BundleFetcher
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import collections
+import hashlib
+import pytest
+import threading
+import time
+
+BUNDLES = {'/a.zip': b'bundle a', '/b.zip': b'bundle b'}
+
+
+@pytest.fixture
+def server():
+    '''Serves `BUNDLES` over HTTP on localhost and counts requests by path.'''
+    requests = collections.Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests[self.path] += 1
+            time.sleep(0.05)  # let parallel fetches meet
+            body = BUNDLES.get(self.path)
+            self.send_response(404 if body is None else 200)
+            self.end_headers()
+            if body is not None:
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.requests = requests
+    httpd.url = f'http://127.0.0.1:{httpd.server_port}'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_fetch_downloads_once(server, tmp_path):
+    url = f'{server.url}/a.zip'
+    # hosts are served by separate workers, each of them fetches the same URL
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        fetched = list(executor.map(lambda _: BundleFetcher(str(tmp_path)).fetch(url), range(4)))
+
+    assert fetched == [sha256(BUNDLES['/a.zip'])] * 4
+    assert server.requests['/a.zip'] == 1
+    fetcher = BundleFetcher(str(tmp_path))
+    assert sha256(BUNDLES['/a.zip']) in fetcher.cache
+    with open(fetcher.cache.get_path(sha256(BUNDLES['/a.zip'])), 'rb') as bundle:
+        assert bundle.read() == BUNDLES['/a.zip']
+    # next runs use the cache: by the known URL and by the expected hash
+    assert fetcher.fetch(url) == sha256(BUNDLES['/a.zip'])
+    assert fetcher.fetch(f'{server.url}/a.zip?mirror', sha256(BUNDLES['/a.zip']).upper()) == sha256(BUNDLES['/a.zip'])
+    assert server.requests['/a.zip'] == 1
+
+
+def test_fetch_all(server, tmp_path):
+    fetcher = BundleFetcher(str(tmp_path))
+    urls = {
+        f'{server.url}/a.zip': sha256(BUNDLES['/a.zip']),
+        f'{server.url}/b.zip': None,
+        f'{server.url}/missing.zip': None,
+    }
+
+    fetched, errors = fetcher.fetch_all(urls)
+
+    assert fetched == {f'{server.url}/a.zip': sha256(BUNDLES['/a.zip']), f'{server.url}/b.zip': sha256(BUNDLES['/b.zip'])}
+    assert list(errors) == [f'{server.url}/missing.zip']
+
+
+def test_fetch_checks_hash(server, tmp_path):
+    fetcher = BundleFetcher(str(tmp_path))
+    url = f'{server.url}/a.zip'
+    with pytest.raises(ValueError, match='sha256 mismatch'):
+        fetcher.fetch(url, sha256(b'other bundle'))
+    # the downloaded bundle is kept, but the expected hash is the source of truth: it is downloaded again
+    with pytest.raises(ValueError, match='sha256 mismatch'):
+        fetcher.fetch(url, sha256(b'other bundle'))
+
+    assert server.requests['/a.zip'] == 2
+    assert fetcher.fetch(url) == sha256(BUNDLES['/a.zip'])
+    assert server.requests['/a.zip'] == 2
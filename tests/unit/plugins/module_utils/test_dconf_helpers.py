@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.dconf_helpers import DconfDatabase, DconfWriter, GvdbBuilder, GvdbTable
+import pytest
+
+
+VALUES = {
+    '/org/example/flag': ('b', True),
+    '/org/example/count': ('i', -42),
+    '/org/example/big': ('t', 2 ** 63 + 1),
+    '/org/example/ratio': ('d', 0.25),
+    '/org/example/name': ('s', 'ünïcode'),
+    '/org/example/list': ('as', ['a', 'bb', '']),
+    '/org/example/nested/deeper/pair': ('(sx)', ('key', -2 ** 40)),
+    '/org/example/nested/dict': ('a{ss}', {'a': 'one', 'b': 'two'}),
+    '/org/other/maybe': ('mi', 7),
+}
+
+
+@pytest.fixture
+def glib(tmp_path, monkeypatch):
+    '''GLib (skips without `gi`) and dconf user database of `tmp_path`.'''
+    pytest.importorskip('gi')
+    from gi.repository import GLib
+
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    monkeypatch.setenv('DCONF_PROFILE', str(tmp_path / 'no-such-profile'))
+
+    return GLib
+
+
+def variants(glib):
+    return {key: glib.Variant(type_string, value) for key, (type_string, value) in VALUES.items()}
+
+
+def test_writer_round_trip(glib, tmp_path):
+    writer = DconfWriter()
+    assert writer.db_path == str(tmp_path / 'dconf' / 'user')
+    for key, value in variants(glib).items():
+        writer.write(key, value)
+    writer.commit()
+
+    database = DconfDatabase()
+    for key, value in variants(glib).items():
+        assert database.read(key).equal(value), key
+    assert database.read('/org/example/missing') is None
+    assert database.list('/') == ['org/']
+    assert database.list('/org/example/') == ['big', 'count', 'flag', 'list', 'name', 'nested/', 'ratio']
+    assert database.list('/org/example/nested/') == ['deeper/', 'dict']
+
+    # values written before are kept
+    writer = DconfWriter()
+    writer.write('/org/example/count', glib.Variant('i', 1))
+    writer.commit()
+    database = DconfDatabase()
+    assert database.read('/org/example/count').unpack() == 1
+    assert database.read('/org/other/maybe').equal(variants(glib)['/org/other/maybe'])
+
+
+def test_builder_round_trip(glib):
+    builder = GvdbBuilder()
+    for key, value in variants(glib).items():
+        builder.set_value(key, value, parents=True)
+    locks = GvdbBuilder()
+    locks.set_value('/org/example/flag', glib.Variant('b', True))
+    builder.set_table('.locks', locks)
+    data = builder.serialize()
+
+    table = GvdbTable.from_bytes(data)
+    assert dict((key, value.unpack()) for key, value in table.values()) == {key: value.unpack() for key, value in variants(glib).items()}
+    assert table.get_table('.locks').has_value('/org/example/flag')
+    assert not table.get_table('.locks').has_value('/org/example/count')
+    assert [key for key, _ in table.tables()] == ['.locks']
+    # the same input gives the same bytes
+    assert GvdbTable.from_bytes(builder.serialize()).list('/org/') == ['example/', 'other/']
+    assert builder.serialize() == data
+
+
+def test_builder_output_is_read_by_glib(glib):
+    from gi.repository import Gio
+
+    builder = GvdbBuilder()
+    for key, value in variants(glib).items():
+        builder.set_value(key, value, parents=True)
+
+    # GResource files are GVDB files too: GLib walks the same hash table and directory lists
+    resource = Gio.Resource.new_from_data(glib.Bytes.new(builder.serialize() + b'\0'))
+
+    assert sorted(resource.enumerate_children('/org/', Gio.ResourceLookupFlags.NONE)) == ['example/', 'other/']
+    assert sorted(resource.enumerate_children('/org/example/nested/', Gio.ResourceLookupFlags.NONE)) == ['deeper/', 'dict']
+    assert resource.enumerate_children('/org/example/nested/deeper/', Gio.ResourceLookupFlags.NONE) == ['pair']
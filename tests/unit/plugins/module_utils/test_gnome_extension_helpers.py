@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_extension_helpers import ExtensionIndex, ExtensionInstaller
+import json
+import os
+import pytest
+import zipfile
+
+
+def make_extension(extensions_dir, name, uuid=None, metadata=True):
+    '''Creates extension directory (with `metadata.json` of `uuid`, directory name by default).'''
+    path = extensions_dir / name
+    path.mkdir(parents=True)
+    if metadata:
+        (path / 'metadata.json').write_text(json.dumps({'uuid': uuid or name, 'name': name, 'shell-version': ['42']}))
+
+    return path
+
+
+def test_index_skips_non_extensions(tmp_path):
+    make_extension(tmp_path, 'good@example.com')
+    make_extension(tmp_path, '.good@example.com.abc123')
+    make_extension(tmp_path, 'no-metadata@example.com', metadata=False)
+    make_extension(tmp_path, 'renamed@example.com', uuid='other@example.com')
+    (tmp_path / 'file.txt').write_text('not a directory')
+
+    index = ExtensionIndex([str(tmp_path)])
+
+    assert list(index.extensions) == ['good@example.com']
+    assert index.get('good@example.com')['shell-version'] == ['42']
+
+
+def test_index_update_checks_metadata(tmp_path):
+    index = ExtensionIndex([str(tmp_path)])
+    make_extension(tmp_path, 'renamed@example.com', uuid='other@example.com')
+    index.update('renamed@example.com')
+    assert 'renamed@example.com' not in index
+
+    make_extension(tmp_path, 'new@example.com')
+    index.update('new@example.com')
+    assert 'new@example.com' in index
+
+
+def test_index_rebuilds_old_cache(tmp_path):
+    extensions_dir = tmp_path / 'extensions'
+    make_extension(extensions_dir, 'good@example.com')
+    make_extension(extensions_dir, '.good@example.com.abc123')
+    cache_file = tmp_path / 'index.json'
+    # index persisted by a version which indexed everything
+    src = str(extensions_dir)
+    cache_file.write_text(json.dumps({src: {'mtime': extensions_dir.stat().st_mtime_ns, 'extensions': {
+        'good@example.com': {'path': str(extensions_dir / 'good@example.com')},
+        '.good@example.com.abc123': {'path': str(extensions_dir / '.good@example.com.abc123')},
+    }}}))
+
+    index = ExtensionIndex([src], str(cache_file))
+
+    assert list(index.extensions) == ['good@example.com']
+    assert ExtensionIndex([src], str(cache_file)).refresh() is False
+
+
+def make_bundle(path, uuid):
+    '''Creates extension bundle (zip file).'''
+    with zipfile.ZipFile(path, 'w') as bundle:
+        bundle.writestr('metadata.json', json.dumps({'uuid': uuid, 'name': uuid, 'description': '', 'shell-version': ['42']}))
+        bundle.writestr('extension.js', '// extension')
+
+    return str(path)
+
+
+def test_installer_stages_outside_extensions_dir(tmp_path, monkeypatch):
+    extensions_dir = tmp_path / 'extensions'
+    installer = ExtensionInstaller(str(extensions_dir))
+    staged = []
+    real_replace = installer._replace
+
+    def replace(src, target):
+        staged.append((src, sorted(os.listdir(extensions_dir))))
+        real_replace(src, target)
+
+    monkeypatch.setattr(installer, '_replace', replace)
+    bundle = make_bundle(tmp_path / 'bundle.zip', 'test@example.com')
+
+    assert installer.install(bundle) == str(extensions_dir / 'test@example.com')
+    assert installer.install(bundle, force=True) == str(extensions_dir / 'test@example.com')
+    installer.uninstall('test@example.com')
+
+    assert installer.staging == str(tmp_path / '.extensions-staging')
+    for src, extensions in staged:
+        assert os.path.dirname(src) == installer.staging
+        assert all(not name.startswith('.') for name in extensions)
+    assert os.listdir(extensions_dir) == []
+    assert os.listdir(installer.staging) == []
+
+
+def test_installer_removes_leftovers(tmp_path):
+    extensions_dir = tmp_path / 'extensions'
+    staging = tmp_path / '.extensions-staging'
+    # a process with such pid does not exist (pid_max is at most 2^22)
+    (staging / '99999999.test@example.com.abc123' / 'extension').mkdir(parents=True)
+    (staging / 'garbage').mkdir()
+    running = staging / f'{os.getppid()}.other@example.com.def456'
+    running.mkdir()
+
+    ExtensionInstaller(str(extensions_dir)).install(make_bundle(tmp_path / 'bundle.zip', 'test@example.com'))
+
+    assert os.listdir(staging) == [running.name]
+
+
+def test_installer_restores_extension_if_replace_fails(tmp_path, monkeypatch):
+    extensions_dir = tmp_path / 'extensions'
+    installer = ExtensionInstaller(str(extensions_dir))
+    target = installer.install(make_bundle(tmp_path / 'bundle.zip', 'test@example.com'))
+    (extensions_dir / 'test@example.com' / 'old.js').write_text('// old')
+    real_rename = os.rename
+
+    def rename(src, dst):
+        if dst == target and os.path.basename(src).startswith(f'{os.getpid()}.test@example.com.'):
+            raise OSError('rename has failed')
+        real_rename(src, dst)
+
+    monkeypatch.setattr(os, 'rename', rename)
+    with pytest.raises(OSError, match='rename has failed'):
+        installer.install(make_bundle(tmp_path / 'bundle.zip', 'test@example.com'), force=True)
+
+    assert sorted(os.listdir(target)) == ['extension.js', 'metadata.json', 'old.js']
+    assert os.listdir(installer.staging) == []
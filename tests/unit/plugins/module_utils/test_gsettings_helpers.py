@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsCache, GsettingsTransaction, GsettingsWrapper, GVariant, SchemaException, ValueException, ValueProcessor
+import os
+import pytest
+import shutil
+import subprocess
+import sys
+
+
+SCHEMA_TEMPLATE = '''<schemalist>
+  <schema id="{schema_id}" path="/org/example/cache/">
+    <key name="{key}" type="b"><default>false</default></key>
+  </schema>
+</schemalist>
+'''
+
+
+def compile_schema(schema_dir, schema_id, key):
+    '''Compiles schema with a single boolean key into the directory.'''
+    schema_dir.mkdir(parents=True, exist_ok=True)
+    (schema_dir / f'{schema_id}.gschema.xml').write_text(SCHEMA_TEMPLATE.format(schema_id=schema_id, key=key))
+    subprocess.run(['glib-compile-schemas', str(schema_dir)], check=True)
+
+
+@pytest.fixture
+def schema_cache():
+    pytest.importorskip('gi')
+    if shutil.which('glib-compile-schemas') is None:
+        pytest.skip('glib-compile-schemas is not installed')
+    GsettingsCache.invalidate()
+    yield GsettingsCache
+    GsettingsCache.invalidate()
+
+
+@pytest.mark.parametrize('string, expected', [
+    ('(xkb, us)', ('xkb', 'us')),
+    ("[('xkb', 'us'), ('xkb', 'ru')]", [('xkb', 'us'), ('xkb', 'ru')]),
+    ('{a: 1, b: [x, y]}', {'a': '1', 'b': ['x', 'y']}),
+    ('[]', []),
+    # `:` ends dict keys only
+    ('[a:b]', ['a:b']),
+    ('(a:b)', ('a:b',)),
+    ('[(ibus, m17n:hi:inscript)]', [('ibus', 'm17n:hi:inscript')]),
+    ('{layout: m17n:hi:inscript}', {'layout': 'm17n:hi:inscript'}),
+])
+def test_parse_literal(string, expected):
+    assert ValueProcessor.parse_literal(string) == expected
+
+
+@pytest.mark.parametrize('string', [
+    '{a, b}',
+    '{a: 1, b}',
+    '(a]',
+    '[a',
+    "['a",
+    '[a) b]',
+    'not a literal',
+])
+def test_parse_literal_malformed(string):
+    assert ValueProcessor.parse_literal(string) == string
+
+
+@pytest.mark.parametrize('obj, type_string, expected', [
+    (['(ibus, m17n:hi:inscript)'], 'a(ss)', [('ibus', 'm17n:hi:inscript')]),
+    ('[(xkb, us), (ibus, m17n:hi:inscript)]', 'a(ss)', [('xkb', 'us'), ('ibus', 'm17n:hi:inscript')]),
+    ('(1, 2, 3)', '(iii)', (1, 2, 3)),
+    ('{a: 1}', 'a{si}', {'a': 1}),
+    # not a dict - it is left for GVariant to complain about
+    ('{a, b}', 'a{ss}', '{a, b}'),
+    (['a', ('b', 'c')], 'a{ss}', ['a', ('b', 'c')]),
+])
+def test_process(obj, type_string, expected):
+    assert ValueProcessor.process(obj, type_string) == expected
+
+
+def test_schema_cache_respects_schema_dirs(tmp_path, schema_cache):
+    compile_schema(tmp_path / 'extension', 'org.example.cache', 'first')
+    schema_dirs = [str(tmp_path / 'extension')]
+
+    assert schema_cache.get_schema('org.example.cache', schema_dirs).has_key('first')
+    with pytest.raises(SchemaException):
+        schema_cache.get_schema('org.example.cache', [])
+
+
+def test_schema_cache_drops_schemas_of_rebuilt_chain(tmp_path, schema_cache):
+    schema_dir = tmp_path / 'extension'
+    compile_schema(schema_dir, 'org.example.cache', 'first')
+    schema_dirs = [str(schema_dir)]
+    assert schema_cache.get_schema('org.example.cache', schema_dirs).has_key('first')
+
+    compile_schema(schema_dir, 'org.example.cache', 'second')
+    compiled = schema_dir / 'gschemas.compiled'
+    os.utime(compiled, ns=(compiled.stat().st_atime_ns, compiled.stat().st_mtime_ns + 10 ** 9))
+    schema_cache.get_source(schema_dirs)
+
+    schema_obj = schema_cache.get_schema('org.example.cache', schema_dirs)
+    assert schema_obj.has_key('second')
+    assert not schema_obj.has_key('first')
+
+
+@pytest.mark.parametrize('value, type_string', [
+    (['x' * 10] * 30, 'as'),  # 2-byte framing offsets
+    ([('a', -2, 3, 2 ** 40, 1.5)] * 2, 'a(snuxd)'),
+    ({'k': ('v', 7)}, 'a{s(sq)}'),
+])
+def test_variant_build(value, type_string, monkeypatch):
+    pytest.importorskip('gi')
+    from gi.repository import GLib
+
+    expected = GLib.Variant(type_string, value)
+    assert GVariant.build(value, type_string).equal(expected)
+    # serialized data is little-endian whatever the host byte order is
+    if sys.byteorder != 'little':
+        expected = expected.byteswap()
+    _, _, serialize = GVariant.get_builder(type_string)
+    monkeypatch.setattr(sys, 'byteorder', 'big' if sys.byteorder == 'little' else 'little')
+    assert serialize(value) == expected.get_data_as_bytes().get_data()
+
+
+def test_transaction_rollback_resets_default_keys(tmp_path, schema_cache, monkeypatch):
+    schema_dir = tmp_path / 'schemas'
+    schema_dir.mkdir()
+    (schema_dir / 'org.example.transaction.gschema.xml').write_text('''<schemalist>
+  <schema id="org.example.transaction" path="/org/example/transaction/">
+    <key name="s" type="s"><default>'default'</default></key>
+    <key name="i" type="i"><default>0</default></key>
+  </schema>
+</schemalist>
+''')
+    subprocess.run(['glib-compile-schemas', str(schema_dir)], check=True)
+    monkeypatch.setattr(GsettingsCache, 'schema_dirs', [str(schema_dir)])
+    settings_obj = GsettingsCache.get_settings('org.example.transaction', None)
+    settings_obj.set_int('i', 5)
+    real_apply = GsettingsTransaction._apply
+    applied = []
+
+    def apply(transaction, writes):
+        real_apply(transaction, writes)
+        if not applied:
+            # backend has not taken the value
+            settings_obj.set_int('i', 7)
+        applied.append(writes)
+
+    monkeypatch.setattr(GsettingsTransaction, '_apply', apply)
+    transaction = GsettingsTransaction()
+    transaction.stage(GsettingsWrapper('org.example.transaction', None, 's'), 'changed')
+    transaction.stage(GsettingsWrapper('org.example.transaction', None, 'i'), 6)
+
+    with pytest.raises(ValueException, match='org.example.transaction.i'):
+        transaction.commit()
+
+    assert len(applied) == 2
+    assert settings_obj.get_user_value('s') is None
+    assert settings_obj.get_user_value('i').unpack() == 5
+    settings_obj.reset('i')
+
+
+def test_wrapper_settings_respect_schema_dirs(tmp_path, schema_cache):
+    compile_schema(tmp_path / 'extension', 'org.example.cache', 'first')
+    schema_dirs = [str(tmp_path / 'extension')]
+    gsettings = GsettingsWrapper('org.example.cache', None, 'first', schema_dirs=schema_dirs)
+
+    with GsettingsTransaction() as transaction:
+        transaction.stage(gsettings, True)
+
+    assert gsettings.read().unpack() is True
+    assert schema_cache.get_settings('org.example.cache', None, schema_dirs).get_boolean('first')
+    with pytest.raises(SchemaException):
+        schema_cache.get_settings('org.example.cache', None)
+    schema_cache.get_settings('org.example.cache', None, schema_dirs).reset('first')
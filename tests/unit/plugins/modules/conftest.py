@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+import os
+import pytest
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+
+@pytest.fixture
+def run_module(tmp_path):
+    '''Runs the module as ansible does (arguments in a JSON file) and returns its result.
+
+    Extra environment variables are passed with `env` keyword argument.
+    '''
+    def run(module_name, env=None, **args):
+        args_file = tmp_path / f'{module_name}-args.json'
+        args_file.write_text(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+        module_env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')])))
+        module_env.update(env or {})
+        module_file = os.path.join(ROOT_DIR, 'plugins', 'modules', f'{module_name}.py')
+        process = subprocess.run([sys.executable, module_file, str(args_file)], env=module_env, capture_output=True, text=True)
+
+        return json.loads(process.stdout)
+
+    return run
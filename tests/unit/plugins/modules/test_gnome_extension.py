@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.modules.gnome_extension import GnomeExtension
+import hashlib
+import json
+import pytest
+import types
+
+
+def test_installed_extension_bundle_is_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    extension_dir = tmp_path / '.local' / 'share' / 'gnome-shell' / 'extensions' / 'test@example.com'
+    extension_dir.mkdir(parents=True)
+    (extension_dir / 'metadata.json').write_text(json.dumps({'uuid': 'test@example.com', 'name': 'test'}))
+    bundle = tmp_path / 'bundle.zip'
+    bundle.write_bytes(b'bundle')
+    sha256 = hashlib.sha256(b'bundle').hexdigest()
+    module = types.SimpleNamespace(check_mode=False)
+
+    extension = GnomeExtension(
+        name='test@example.com', src=str(bundle), sha256=sha256, force=False, state='present', enabled=None,
+        bundle_cache=str(tmp_path / 'cache'),
+    )
+
+    assert extension.current_state == extension.eventual_state
+    assert sha256 not in extension.bundle_cache
+    assert extension.cache_bundle(module) is True
+    assert sha256 in extension.bundle_cache
+    assert extension.src == extension.bundle_cache.get_path(sha256)
+    assert 'changed' not in extension.result
+
+
+@pytest.mark.parametrize('item, message', [
+    ({'name': 'test@example.com', 'enabled': 'maybe'}, 'enabled'),
+    ({'name': 'test@example.com', 'state': 'installed'}, 'state'),
+    ({'name': 'test@example.com', 'typo': True}, 'typo'),
+    ({'src': '/tmp/bundle.zip'}, 'name'),
+])
+def test_extension_items_are_validated(tmp_path, run_module, item, message):
+    result = run_module('gnome_extension', {'HOME': str(tmp_path)}, extensions=[item], _ansible_check_mode=True)
+
+    assert result['failed']
+    assert message in result['msg']
+
+
+def test_extension_items_are_coerced(tmp_path, run_module):
+    # module 'state' default does not conflict with 'extensions'
+    result = run_module('gnome_extension', {'HOME': str(tmp_path)}, extensions=[{'name': 'test@example.com', 'state': 'absent', 'force': 'no'}], state='present', _ansible_check_mode=True)
+
+    assert not result.get('failed'), result.get('msg')
+    assert result['results'] == [{'name': 'test@example.com', 'changed': False}]
+    assert result['invocation']['module_args']['extensions'][0]['force'] is False
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gnome_shell_helpers import ShellExtensionsBus
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsCache, GsettingsWrapper
+from ansible_collections.shipilovds.workstation.plugins.modules.gnome_extension import manage_extensions
+import json
+import os
+import pytest
+import shutil
+import subprocess
+import sys
+import time
+import types
+
+
+SHELL_SCHEMA = '''<schemalist>
+  <schema id="org.gnome.shell" path="/org/gnome/shell/">
+    <key name="enabled-extensions" type="as"><default>[]</default></key>
+    <key name="disabled-extensions" type="as"><default>[]</default></key>
+  </schema>
+</schemalist>
+'''
+
+# `org.gnome.Shell.Extensions` service which knows `live@example.com` (disabled)
+# and `broken@example.com` (it cannot be enabled)
+MOCK_SHELL = '''
+from gi.repository import Gio, GLib
+
+XML = """<node><interface name="org.gnome.Shell.Extensions">
+<method name="ListExtensions"><arg type="a{sa{sv}}" direction="out"/></method>
+<method name="EnableExtension"><arg type="s" direction="in"/><arg type="b" direction="out"/></method>
+<method name="DisableExtension"><arg type="s" direction="in"/><arg type="b" direction="out"/></method>
+</interface></node>"""
+extensions = {'live@example.com': False, 'broken@example.com': False}
+
+
+def call(connection, sender, path, interface, method, parameters, invocation):
+    if method == 'ListExtensions':
+        info = {uuid: {'enabled': GLib.Variant('b', enabled), 'state': GLib.Variant('d', 1 if enabled else 2)} for uuid, enabled in extensions.items()}
+        invocation.return_value(GLib.Variant('(a{sa{sv}})', (info,)))
+        return
+    uuid = parameters.unpack()[0]
+    done = uuid == 'live@example.com'
+    if done:
+        extensions[uuid] = method == 'EnableExtension'
+    invocation.return_value(GLib.Variant('(b)', (done,)))
+
+
+def bus_acquired(connection, name):
+    connection.register_object('/org/gnome/Shell', Gio.DBusNodeInfo.new_for_xml(XML).interfaces[0], call, None, None)
+
+
+Gio.bus_own_name(Gio.BusType.SESSION, 'org.gnome.Shell', Gio.BusNameOwnerFlags.NONE, bus_acquired, None, None)
+GLib.MainLoop().run()
+'''
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    '''Private session bus, `org.gnome.shell` schema and user extensions directory.'''
+    gi = pytest.importorskip('gi')
+    if shutil.which('dbus-daemon') is None or shutil.which('glib-compile-schemas') is None:
+        pytest.skip('dbus-daemon and glib-compile-schemas are needed')
+    gi.require_version('Gio', '2.0')
+    from gi.repository import Gio
+
+    schema_dir = tmp_path / 'schemas'
+    schema_dir.mkdir()
+    (schema_dir / 'org.gnome.shell.gschema.xml').write_text(SHELL_SCHEMA)
+    subprocess.run(['glib-compile-schemas', str(schema_dir)], check=True)
+    GsettingsCache.invalidate()
+    monkeypatch.setattr(GsettingsCache, 'schema_dirs', [str(schema_dir)])
+    for key in ('enabled-extensions', 'disabled-extensions'):
+        GsettingsCache.get_settings('org.gnome.shell', None).reset(key)
+
+    monkeypatch.setenv('HOME', str(tmp_path))
+    extensions_dir = tmp_path / '.local' / 'share' / 'gnome-shell' / 'extensions'
+    for uuid in ('live@example.com', 'broken@example.com', 'unknown@example.com'):
+        (extensions_dir / uuid).mkdir(parents=True)
+        (extensions_dir / uuid / 'metadata.json').write_text(json.dumps({'uuid': uuid, 'name': uuid}))
+
+    test_bus = Gio.TestDBus.new(Gio.TestDBusFlags.NONE)
+    test_bus.up()
+    monkeypatch.setenv('DBUS_SESSION_BUS_ADDRESS', test_bus.get_bus_address())
+    shell = subprocess.Popen([sys.executable, '-c', MOCK_SHELL], env=dict(os.environ))
+    try:
+        deadline = time.monotonic() + 10
+        bus = ShellExtensionsBus.connect()
+        while bus is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+            bus = ShellExtensionsBus.connect()
+        assert bus is not None, 'mock Gnome Shell has not appeared on the bus'
+        yield bus
+    finally:
+        shell.terminate()
+        shell.wait()
+        test_bus.down()
+        GsettingsCache.invalidate()
+
+
+def read_list(key):
+    return GsettingsWrapper('org.gnome.shell', None, key).read().unpack()
+
+
+def test_enable_live_with_lists_fallback(session):
+    module = types.SimpleNamespace(check_mode=False)
+    extensions = [{'name': uuid, 'enabled': True} for uuid in ('live@example.com', 'broken@example.com', 'unknown@example.com')]
+
+    results = manage_extensions(module, extensions, False, bus=session)
+
+    assert [(result['name'], result['changed'], result.get('live', False)) for result in results] == [
+        ('live@example.com', True, True),
+        ('broken@example.com', True, False),
+        ('unknown@example.com', True, False),
+    ]
+    assert ShellExtensionsBus.is_enabled(session.list_extensions()['live@example.com'])
+    # the extensions the shell has not enabled are written to the list
+    assert read_list('enabled-extensions') == ['live@example.com', 'broken@example.com', 'unknown@example.com']
+    assert read_list('disabled-extensions') == []
+
+
+def test_disable_live(session):
+    module = types.SimpleNamespace(check_mode=False)
+    assert session.enable_extension('live@example.com')
+
+    results = manage_extensions(module, [{'name': 'live@example.com', 'enabled': False}], False, bus=session)
+
+    assert results == [{'name': 'live@example.com', 'changed': True, 'operations': {'disable': 'success'}, 'live': True}]
+    assert not ShellExtensionsBus.is_enabled(session.list_extensions()['live@example.com'])
+    # the shell keeps the lists by itself - the module does not write them
+    assert read_list('disabled-extensions') == []
+
+
+def test_lists_without_shell(session):
+    module = types.SimpleNamespace(check_mode=False)
+
+    results = manage_extensions(module, [{'name': 'live@example.com', 'enabled': True}], False)
+
+    assert 'live' not in results[0]
+    assert not ShellExtensionsBus.is_enabled(session.list_extensions()['live@example.com'])
+    assert read_list('enabled-extensions') == ['live@example.com']
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import os
+import pytest
+import shutil
+import subprocess
+
+SCHEMA_TEMPLATE = '''<schemalist>
+  <schema id="org.example.facts" path="/org/example/facts/">
+    {keys}
+  </schema>
+  <schema id="org.example.other" path="/org/example/other/">
+    <key name="b" type="b"><default>false</default></key>
+  </schema>
+</schemalist>
+'''
+
+
+def compile_schema(schema_dir, keys):
+    (schema_dir / 'org.example.facts.gschema.xml').write_text(SCHEMA_TEMPLATE.format(keys=keys))
+    subprocess.run(['glib-compile-schemas', str(schema_dir)], check=True)
+    # make mtime change visible whatever the file system timestamp granularity is
+    compiled = schema_dir / 'gschemas.compiled'
+    stat = compiled.stat()
+    os.utime(compiled, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_cache_follows_schemas(tmp_path, run_module):
+    if shutil.which('glib-compile-schemas') is None:
+        pytest.skip('glib-compile-schemas is not installed')
+    schema_dir = tmp_path / '.local' / 'share' / 'gnome-shell' / 'extensions' / 'facts@example.com' / 'schemas'
+    schema_dir.mkdir(parents=True)
+    compile_schema(schema_dir, '<key name="i" type="i"><default>4</default></key>')
+    # dconf backend: values are read from (missing) database files, no session is needed
+    env = {'HOME': str(tmp_path), 'XDG_CONFIG_HOME': str(tmp_path / 'config'), 'GSETTINGS_BACKEND': 'dconf', 'DCONF_PROFILE': str(tmp_path / 'profile')}
+    args = {'schemas': ['org.example.facts'], 'cache': str(tmp_path / 'cache.json')}
+
+    result = run_module('gsettings_facts', env, **args)
+    assert (result['cached'], result['ansible_facts']['gsettings']['org.example.facts']['types']) == (False, {'i': 'i'})
+    assert run_module('gsettings_facts', env, **args)['cached']
+
+    # upgraded schema
+    compile_schema(schema_dir, '<key name="i" type="x"><default>4</default></key><key name="s" type="s"><default>""</default></key>')
+    result = run_module('gsettings_facts', env, **args)
+    assert (result['cached'], result['ansible_facts']['gsettings']['org.example.facts']['types']) == (False, {'i': 'x', 's': 's'})
+    assert run_module('gsettings_facts', env, **args)['cached']
+
+    # another schemas list
+    result = run_module('gsettings_facts', env, **dict(args, schemas=['org.example.facts', 'org.example.other']))
+    assert not result['cached']
+    assert sorted(result['ansible_facts']['gsettings']) == ['org.example.facts', 'org.example.other']
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import os
+import pytest
+import shutil
+
+SCHEMA = '''<schemalist>
+  <schema id="org.example.schemas" path="/org/example/schemas/">
+    <key name="b" type="b"><default>false</default></key>
+  </schema>
+</schemalist>
+'''
+
+
+def test_failed_compilation_is_retried(tmp_path, run_module):
+    compiler = shutil.which('glib-compile-schemas')
+    if compiler is None:
+        pytest.skip('glib-compile-schemas is not installed')
+    schemas_dir = tmp_path / 'extensions' / 'test@example.com' / 'schemas'
+    schemas_dir.mkdir(parents=True)
+    (schemas_dir / 'org.example.schemas.gschema.xml').write_text(SCHEMA)
+    broken_bin = tmp_path / 'broken-bin'
+    broken_bin.mkdir()
+    (broken_bin / 'glib-compile-schemas').write_text('#!/bin/sh\nexit 1\n')
+    (broken_bin / 'glib-compile-schemas').chmod(0o755)
+    dest = tmp_path / 'dest'
+    args = {'src': [str(tmp_path / 'extensions')], 'dest': str(dest)}
+
+    result = run_module('gsettings_schemas', {'PATH': f'{broken_bin}:{os.environ["PATH"]}'}, **args)
+    assert result['failed'] and not result['compiled']
+    assert (dest / 'org.example.schemas.gschema.xml').exists()
+
+    # schemas are installed already, but they have never been compiled
+    path = f'{os.path.dirname(compiler)}:{os.environ["PATH"]}'
+    result = run_module('gsettings_schemas', {'PATH': path}, **args)
+    assert (result['changed'], result['schemas'], result['compiled']) == (True, [], True)
+    assert (dest / 'gschemas.compiled').exists()
+
+    result = run_module('gsettings_schemas', {'PATH': path}, **args)
+    assert (result['changed'], result['compiled']) == (False, False)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2022, Denis Shipilov <shipilovds@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.shipilovds.workstation.plugins.module_utils.gsettings_helpers import GsettingsCache
+import json
+import os
+import pytest
+import shutil
+import subprocess
+
+
+AGENT_SCHEMA = '''<schemalist>
+  <schema id="org.example.agent" path="/org/example/agent/">
+    <key name="s" type="s"><default>'default'</default></key>
+    <key name="i" type="i"><default>0</default></key>
+    <key name="b" type="b"><default>false</default></key>
+  </schema>
+</schemalist>
+'''
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    '''Agent with a schema of a user extension (memory GSettings backend, see conftest).'''
+    pytest.importorskip('gi')
+    if shutil.which('glib-compile-schemas') is None:
+        pytest.skip('glib-compile-schemas is not installed')
+    import gsettings_agent
+
+    monkeypatch.setenv('HOME', str(tmp_path))
+    schema_dir = tmp_path / '.local' / 'share' / 'gnome-shell' / 'extensions' / 'agent@example.com' / 'schemas'
+    schema_dir.mkdir(parents=True)
+    (schema_dir / 'org.example.agent.gschema.xml').write_text(AGENT_SCHEMA)
+    subprocess.run(['glib-compile-schemas', str(schema_dir)], check=True)
+    monkeypatch.setattr(GsettingsCache, 'schema_dirs', [])
+    GsettingsCache.invalidate()
+    agent = gsettings_agent.GsettingsAgent(debounce=50)
+    yield agent
+    agent.stop()
+    for key in ('s', 'i', 'b'):
+        settings_obj().reset(key)
+    GsettingsCache.invalidate()
+
+
+def settings_obj():
+    '''Another writer of the managed schema (e.g. user with Gnome Settings).'''
+    from gi.repository import Gio
+
+    return Gio.Settings.new_full(GsettingsCache.get_schema('org.example.agent'), None, None)
+
+
+def run_loop(milliseconds, *actions):
+    '''Runs main loop, `actions` are (delay, function) pairs.'''
+    from gi.repository import GLib
+
+    loop = GLib.MainLoop()
+    for delay, action in actions:
+        GLib.timeout_add(delay, lambda action=action: action() and False)
+    GLib.timeout_add(milliseconds, loop.quit)
+    loop.run()
+
+
+def test_agent_reasserts_drifted_keys(agent, tmp_path):
+    agent.load({'org.example.agent': {'keys': {'s': 'desired', 'i': 3, 'unknown': 1}}})
+    other = settings_obj()
+    assert (other.get_string('s'), other.get_int('i')) == ('desired', 3)
+    assert sorted(key for _, _, key in agent.keys) == ['i', 's']
+
+    def drift():
+        # a burst of changes is re-asserted once, unmanaged keys are left alone
+        other.set_string('s', 'first')
+        other.set_string('s', 'second')
+        other.set_int('i', 9)
+        other.set_boolean('b', True)
+
+    run_loop(500, (10, drift))
+
+    assert (other.get_string('s'), other.get_int('i'), other.get_boolean('b')) == ('desired', 3, True)
+    # one drift from the defaults (on load) and one for the burst
+    assert {key: managed_key.drifts for (_, _, key), managed_key in agent.keys.items()} == {'s': 2, 'i': 2}
+
+
+def test_agent_reloads_desired_state(agent, tmp_path):
+    state = tmp_path / 'desired-state.json'
+    state.write_text(json.dumps({'org.example.agent': {'keys': {'s': 'first'}}}))
+    assert agent.load_file(str(state))
+    agent.watch_file(str(state))
+    other = settings_obj()
+    assert other.get_string('s') == 'first'
+
+    def deploy():
+        tmp_file = tmp_path / 'desired-state.json.tmp'
+        tmp_file.write_text(json.dumps({'org.example.agent': {'keys': {'s': 'second', 'i': 5}}}))
+        os.replace(tmp_file, state)
+
+    run_loop(1000, (10, deploy))
+
+    assert (other.get_string('s'), other.get_int('i')) == ('second', 5)
+    # broken file does not drop the current state
+    state.write_text('{')
+    assert not agent.load_file(str(state))
+    assert len(agent.keys) == 2
+
+
+def test_agent_keeps_keys_of_broken_state(agent, tmp_path):
+    state = tmp_path / 'desired-state.json'
+    state.write_text(json.dumps({'org.example.agent': {'keys': {'s': 'desired'}}}))
+    assert agent.load_file(str(state))
+    # valid JSON, but malformed settings
+    state.write_text(json.dumps({'org.example.agent': {'keys': {'i': 3}}, 'org.example.other': {'keys': 'broken'}}))
+    assert not agent.load_file(str(state))
+    other = settings_obj()
+    assert other.get_int('i') == 0
+
+    run_loop(300, (10, lambda: other.set_string('s', 'drifted')))
+
+    assert list(agent.keys) == [('org.example.agent', None, 's')]
+    assert other.get_string('s') == 'desired'